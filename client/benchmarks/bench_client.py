@@ -0,0 +1,175 @@
+"""
+Micro-benchmarks for the client's hot paths.
+
+Runs a headless NetCafeClient offscreen, so it works on a Linux box without
+a display (QT_QPA_PLATFORM=offscreen). The client is started from a scratch
+directory holding a copy of config.json, which keeps the benchmark's log
+output out of the real client.log.
+
+Usage:
+    python bench_client.py                  # JSON results on stdout
+    python bench_client.py --save-baseline  # record baselines/client.json
+    python bench_client.py --compare        # exit 1 on >25% slowdowns
+"""
+
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+
+from harness import Suite, main
+
+
+def _setup():
+    workdir = tempfile.mkdtemp(prefix='netcafe-bench-')
+    shutil.copy(os.path.join(CLIENT_DIR, 'config.json'), workdir)
+    os.chdir(workdir)
+
+    from netcafe_client import NetCafeClient
+
+    client = NetCafeClient(headless=True)
+
+    # Keep file logging (it is part of what set_status costs), drop console spam
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if type(handler) is logging.StreamHandler:
+            root.removeHandler(handler)
+    client._workdir = workdir
+    return client
+
+
+def _teardown(client):
+    from structured_log import shutdown_logging
+
+    client._cleanup()
+    client.loop.close()
+    os.chdir(CLIENT_DIR)
+    # Before the rmtree: the exit report would reopen client.log in it
+    shutdown_logging()
+    shutil.rmtree(client._workdir, ignore_errors=True)
+
+
+suite = Suite('client', setup=_setup, teardown=_teardown)
+
+
+def _dispatch(client, data):
+    # Drive the handler coroutine by hand: the paths benchmarked here never
+    # suspend, so this measures dispatch without event loop overhead.
+    coro = client._process_ws_message(data)
+    try:
+        coro.send(None)
+    except StopIteration:
+        return
+    coro.close()
+    raise RuntimeError(f"handler for {data.get('type')} suspended")
+
+
+def _active_session(client):
+    client.session_active = True
+    client.session_deadline = None
+    client.remaining_time = 10 ** 9
+    client._arm_warnings(fresh=True)
+
+
+@suite.bench('ws_decode_dispatch[time_update]')
+def _(client):
+    _active_session(client)
+    frame = json.dumps({'type': 'time_update', 'minutes': 42, 'expires_at': 1.9e9})
+    return lambda: _dispatch(client, json.loads(frame))
+
+
+@suite.bench('ws_decode_dispatch[clock_sync]')
+def _(client):
+    frame = json.dumps({'type': 'clock_sync', 't0': 1.7e9, 't1': 1.7e9 + 0.002, 't2': 1.7e9 + 0.0021})
+    return lambda: _dispatch(client, json.loads(frame))
+
+
+@suite.bench('ws_decode_dispatch[unknown]')
+def _(client):
+    frame = json.dumps({'type': 'pricing_changed', 'rate': 2.5})
+    return lambda: _dispatch(client, json.loads(frame))
+
+
+def _session_update_bench(count):
+    def factory(client):
+        _active_session(client)
+        sessions = [{'computer_id': f'PC-{n:04d}', 'duration_minutes': 60, 'user': f'user{n}'}
+                    for n in range(count)]
+        sessions[-1]['computer_id'] = client.computer_id
+        frame = json.dumps({'type': 'session_update', 'sessions': sessions})
+        return lambda: _dispatch(client, json.loads(frame))
+    return factory
+
+
+for _count in (10, 100, 1000):
+    suite.bench(f'session_update_scan[n={_count}]')(_session_update_bench(_count))
+
+
+@suite.bench('tick[local_countdown]')
+def _(client):
+    _active_session(client)
+
+    def run():
+        # One real tick per second would keep the warning timers in step;
+        # back-to-back calls would restart them every time
+        client.remaining_time = 10 ** 9
+        client._tick()
+    return run
+
+
+@suite.bench('tick[server_deadline]')
+def _(client):
+    _active_session(client)
+    client.session_deadline = client.clock_sync.server_now() + 10 ** 6
+    return client._tick
+
+
+@suite.bench('update_timer')
+def _(client):
+    client.remaining_time = 3599
+    return client._update_timer
+
+
+@suite.bench('set_status[3 widgets + log]')
+def _(client):
+    states = [('Connected - Ready for gaming!', True), ('Disconnected', False)]
+    counter = iter(range(1 << 62))
+
+    def run():
+        status, connected = states[next(counter) & 1]
+        client.set_status(status, connected)
+    return run
+
+
+@suite.bench('load_config')
+def _(client):
+    return client._load_config
+
+
+@suite.bench('get_computer_id')
+def _(client):
+    return client._get_computer_id
+
+
+@suite.bench('repaint[TimerOverlay]')
+def _(client):
+    overlay = client.timer_overlay
+    overlay.set_time('59:59')
+    return overlay.grab
+
+
+@suite.bench('repaint[LockScreen 1920x1080]')
+def _(client):
+    lock = client.lock_screen
+    lock.resize(1920, 1080)
+    return lock.grab
+
+
+if __name__ == '__main__':
+    sys.exit(main(suite))
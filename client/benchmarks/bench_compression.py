@@ -0,0 +1,107 @@
+"""
+permessage-deflate CPU cost vs. bytes saved for session_update payloads.
+
+Compresses frames the way RFC 7692 does (raw deflate, sync flush, trailing
+0x00 0x00 0xff 0xff dropped) with the same zlib settings aiohttp uses.
+"ctx" keeps the compressor across messages (context takeover, aiohttp's
+default), "noctx" starts fresh per message. Each benchmark is one
+compress + inflate round trip; its metrics show the payload size, the
+compressed size and the ratio, which is what the compress_min_bytes
+threshold is tuned from.
+"""
+
+import json
+import os
+import random
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import Suite, main
+
+SEAT_COUNTS = (10, 50, 100, 250)
+_TAIL = b'\x00\x00\xff\xff'
+
+
+def session_update_frames(seats, rng, count=8):
+    """Successive snapshots of the same cafe, a minute apart"""
+    sessions = [{
+        'computer_id': f'DESKTOP-{rng.randrange(16 ** 7):07X}_{rng.randrange(2 ** 48)}',
+        'session_id': rng.randrange(10 ** 6),
+        'username': f'player{rng.randrange(10 ** 4)}',
+        'duration_minutes': rng.choice((30, 60, 120, 180)),
+        'remaining_minutes': rng.randrange(180),
+        'started_at': f'2025-06-04T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00',
+        'status': rng.choice(('active', 'paused', 'ending')),
+    } for _ in range(seats)]
+
+    frames = []
+    for _ in range(count):
+        for session in sessions:
+            session['remaining_minutes'] = max(0, session['remaining_minutes'] - 1)
+        frames.append(json.dumps({'type': 'session_update', 'sessions': sessions}).encode())
+    return frames
+
+
+def small_frames():
+    return {
+        'clock_sync': json.dumps({'type': 'clock_sync', 't0': 1.7e9, 't1': 1.7e9 + 0.002, 't2': 1.7e9 + 0.0021}),
+        'time_update': json.dumps({'type': 'time_update', 'minutes': 42, 'expires_at': 1.9e9}),
+    }
+
+
+class Deflate:
+    def __init__(self, context_takeover):
+        self.context_takeover = context_takeover
+        self._compress = self._new_compressor()
+        self._decompress = zlib.decompressobj(wbits=-15)
+
+    @staticmethod
+    def _new_compressor():
+        return zlib.compressobj(level=zlib.Z_BEST_SPEED, wbits=-15)
+
+    def round_trip(self, payload):
+        if not self.context_takeover:
+            self._compress = self._new_compressor()
+            self._decompress = zlib.decompressobj(wbits=-15)
+        wire = self._compress.compress(payload) + self._compress.flush(zlib.Z_SYNC_FLUSH)
+        wire = wire[:-4]
+        restored = self._decompress.decompress(wire + _TAIL)
+        return wire, restored
+
+
+suite = Suite('compression')
+
+
+def _deflate_bench(payloads, context_takeover):
+    def factory(ctx):
+        deflate = Deflate(context_takeover)
+        state = {'i': 0}
+
+        def run():
+            payload = payloads[state['i'] % len(payloads)]
+            state['i'] += 1
+            wire, _ = deflate.round_trip(payload)
+            return {
+                'payload_bytes': len(payload),
+                'wire_bytes': len(wire),
+                'saved_bytes': len(payload) - len(wire),
+                'ratio': round(len(wire) / len(payload), 3),
+            }
+        return run
+    return factory
+
+
+_rng = random.Random(42)
+for _seats in SEAT_COUNTS:
+    _payloads = session_update_frames(_seats, _rng)
+    suite.bench(f'deflate_ctx[session_update seats={_seats}]')(_deflate_bench(_payloads, True))
+    suite.bench(f'deflate_noctx[session_update seats={_seats}]')(_deflate_bench(_payloads, False))
+
+for _name, _text in small_frames().items():
+    suite.bench(f'deflate_noctx[{_name}]')(_deflate_bench([_text.encode()], False))
+
+
+if __name__ == '__main__':
+    sys.exit(main(suite))
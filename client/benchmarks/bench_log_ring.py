@@ -0,0 +1,101 @@
+"""
+Log ring overhead.
+
+Times one logger.info() call on a logger whose only other handler is a
+NullHandler, so the number is the logging call itself:
+
+- without a ring, the baseline
+- with a LogRing, the cost every log call in the client pays
+- with a LogRing and a following tail that filters the record out
+- with %-style arguments, which the ring stores unformatted
+
+The difference to the baseline is the ring's overhead per call. For
+scale, a last per-record benchmark formats the record the way the JSON
+file handler does. Tailing a full ring of 2000 records is timed once,
+with its raw and compressed sizes as metrics.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+import sys
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import Suite, main
+from log_ring import LogRing, LogTail, decode_chunk
+from structured_log import JSONFormatter
+
+
+def _logger(*handlers):
+    log = logging.getLogger(f'bench.{len(handlers)}.{id(handlers)}')
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    log.addHandler(logging.NullHandler())
+    for handler in handlers:
+        log.addHandler(handler)
+    return log
+
+
+suite = Suite('log_ring')
+
+
+@suite.bench('logger.info[no ring]')
+def _(_):
+    log = _logger()
+    return lambda: log.info("Status: Connected (Connected: True)")
+
+
+@suite.bench('logger.info[ring]')
+def _(_):
+    log = _logger(LogRing(2000))
+    return lambda: log.info("Status: Connected (Connected: True)")
+
+
+@suite.bench('logger.info[ring, tail following ERROR]')
+def _(_):
+    ring = LogRing(2000)
+    tail = LogTail(ring, 'bench', None, level='ERROR', follow=True)
+    ring.followers.append(tail._collect)
+    log = _logger(ring)
+    return lambda: log.info("Status: Connected (Connected: True)")
+
+
+@suite.bench('logger.info[ring, %-args]')
+def _(_):
+    log = _logger(LogRing(2000))
+    return lambda: log.info("Reconnecting in %ss (attempt %d)", 5.0, 3)
+
+
+@suite.bench('JSONFormatter.format[for scale]')
+def _(_):
+    formatter = JSONFormatter()
+    record = logging.makeLogRecord({'name': 'netcafe_client', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                    'msg': "Status: Connected (Connected: True)"})
+    return lambda: formatter.format(record)
+
+
+@suite.bench('tail[2000 records]')
+def _(_):
+    ring = LogRing(2000)
+    log = _logger(ring)
+    for i in range(2000):
+        log.info(f"Connecting to server: http://192.168.0.{i % 3}:8080 (attempt {i})")
+    frames = []
+
+    async def send(frame):
+        frames.append(frame)
+
+    def run():
+        frames.clear()
+        asyncio.run(LogTail(ring, 'bench', send).run())
+        raw = sum(len(zlib.decompress(base64.b64decode(f['data']))) for f in frames)
+        return {'chunks': len(frames), 'records': sum(len(decode_chunk(f['data'])) for f in frames),
+                'raw_bytes': raw, 'sent_bytes': sum(len(f['data']) for f in frames)}
+    return run
+
+
+if __name__ == '__main__':
+    sys.exit(main(suite))
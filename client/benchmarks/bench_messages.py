@@ -0,0 +1,143 @@
+"""
+Dispatch cost per message: typed registry vs. the old dict-and-get chain.
+
+The "legacy" side reproduces the if/elif dispatch the clients used before
+messages.py (json.loads, then data.get('type') comparisons and field
+lookups inside each branch). The "registry" side decodes through
+MessageDispatcher, which validates into a slotted dataclass and looks the
+handler up by class. Handlers are no-ops on both sides, so the numbers are
+decode + validation + dispatch only. Pure stdlib, no Qt needed.
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import Suite, main
+from messages import (
+    MessageDispatcher, ForceLogout, TimeUpdate, SessionDeadline, SessionUpdate, ClockSyncReply
+)
+
+COMPUTER_ID = 'DESKTOP-SEAT_190032518091308'
+
+
+class LegacyClient:
+    def __init__(self):
+        self.computer_id = COMPUTER_ID
+        self.session_active = True
+
+    async def _noop(self, *args):
+        pass
+
+    async def _process_ws_message(self, data):
+        msg_type = data.get('type')
+
+        if msg_type == 'force_logout':
+            await self._noop(data.get('message', 'Your session was ended by administrator.'))
+
+        elif msg_type == 'time_update':
+            minutes = data.get('minutes', 0)
+            if minutes > 0 and not self.session_active:
+                await self._noop(minutes, data.get('expires_at'))
+
+        elif msg_type == 'session_deadline':
+            expires_at = data.get('expires_at')
+            if expires_at is None:
+                return
+            await self._noop(data.get('minutes', 0), expires_at)
+
+        elif msg_type == 'session_update':
+            sessions = data.get('sessions', [])
+            for session in sessions:
+                if session['computer_id'] == self.computer_id:
+                    await self._noop(session['duration_minutes'])
+                    break
+
+        elif msg_type == 'clock_sync':
+            await self._noop(data.get('t0'), data.get('t1'), data.get('t2'))
+
+
+class RegistryClient:
+    def __init__(self):
+        self.computer_id = COMPUTER_ID
+        self.session_active = True
+        self.dispatcher = MessageDispatcher({
+            ForceLogout: self._noop,
+            TimeUpdate: self._on_time_update,
+            SessionDeadline: self._noop,
+            SessionUpdate: self._on_session_update,
+            ClockSyncReply: self._noop,
+        })
+
+    async def _noop(self, msg):
+        pass
+
+    async def _on_time_update(self, msg):
+        if msg.minutes > 0 and not self.session_active:
+            await self._noop(msg)
+
+    async def _on_session_update(self, msg):
+        session = msg.for_computer(self.computer_id)
+        if session:
+            await self._noop(session)
+
+
+def _drive(coro):
+    try:
+        coro.send(None)
+    except StopIteration:
+        return
+    raise RuntimeError('handler suspended')
+
+
+def _frames():
+    sessions = lambda n: [{'computer_id': f'PC-{i:04d}', 'duration_minutes': 60} for i in range(n - 1)] + \
+        [{'computer_id': COMPUTER_ID, 'duration_minutes': 60}]
+    return {
+        'time_update': {'type': 'time_update', 'minutes': 42, 'expires_at': 1.9e9},
+        'clock_sync': {'type': 'clock_sync', 't0': 1.7e9, 't1': 1.7e9 + 0.002, 't2': 1.7e9 + 0.0021},
+        'force_logout': {'type': 'force_logout', 'message': 'Closing time'},
+        'session_update[n=10]': {'type': 'session_update', 'sessions': sessions(10)},
+        'session_update[n=100]': {'type': 'session_update', 'sessions': sessions(100)},
+        'unknown': {'type': 'pricing_changed', 'rate': 2.5},
+    }
+
+
+def _setup():
+    import logging
+    logging.disable(logging.WARNING)  # unknown-type warning is logged once anyway
+    return {'legacy': LegacyClient(), 'registry': RegistryClient()}
+
+
+suite = Suite('messages', setup=_setup)
+
+
+def _legacy_bench(frame):
+    def factory(ctx):
+        client = ctx['legacy']
+        return lambda: _drive(client._process_ws_message(json.loads(frame)))
+    return factory
+
+
+def _registry_bench(frame):
+    def factory(ctx):
+        dispatcher = ctx['registry'].dispatcher
+
+        def run():
+            msg = dispatcher.decode(frame)
+            if msg is not None:
+                _drive(dispatcher.dispatch(msg))
+        return run
+    return factory
+
+
+for _name, _data in _frames().items():
+    _frame = json.dumps(_data)
+    suite.bench(f'legacy[{_name}]')(_legacy_bench(_frame))
+    suite.bench(f'registry[{_name}]')(_registry_bench(_frame))
+
+
+if __name__ == '__main__':
+    sys.exit(main(suite))
@@ -0,0 +1,91 @@
+"""
+Per-scan cost of the process watchdog with 500 extra running processes.
+
+Setup starts 500 idle ``sleep`` processes so the table is the size of a
+busy gaming seat. "full" re-enumerates everything and resolves every
+name, the way a naive poll would. "incremental" is ProcessTable.scan()
+with nothing changed (it still reads every start time), and "churn"
+forgets 5 cached processes before each scan so they are looked up again,
+like 5 processes starting between polls.
+Linux only (/proc backend).
+"""
+
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import Suite, main
+from process_watchdog import ProcProcessBackend, ProcessTable, ProcessPolicy, ProcessWatchdog
+
+EXTRA_PROCESSES = 500
+
+
+def _setup():
+    if not ProcProcessBackend.available():
+        sys.exit('bench_process_watchdog needs Linux /proc')
+    children = [subprocess.Popen(['sleep', '600']) for _ in range(EXTRA_PROCESSES)]
+    return {'backend': ProcProcessBackend(), 'children': children}
+
+
+def _teardown(ctx):
+    for child in ctx['children']:
+        child.kill()
+    for child in ctx['children']:
+        child.wait()
+
+
+suite = Suite('process_watchdog', setup=_setup, teardown=_teardown)
+
+
+@suite.bench('full_enumeration')
+def _(ctx):
+    backend = ctx['backend']
+
+    def run():
+        table = {pid: backend.process_name(pid) for pid in backend.list_pids()}
+        return {'processes': len(table)}
+    return run
+
+
+@suite.bench('incremental_scan[steady]')
+def _(ctx):
+    table = ProcessTable(ctx['backend'])
+    table.scan()
+
+    def run():
+        table.scan()
+        return {'processes': len(table.processes)}
+    return run
+
+
+@suite.bench('incremental_scan[churn 5/scan]')
+def _(ctx):
+    table = ProcessTable(ctx['backend'])
+    table.scan()
+    pids = {child.pid for child in ctx['children']}
+    keys = [key for key in table.processes if key[0] in pids]
+    state = {'i': 0}
+
+    def run():
+        for _ in range(5):
+            table.processes.pop(keys[state['i'] % len(keys)], None)
+            state['i'] += 1
+        started, _ = table.scan()
+        return {'processes': len(table.processes), 'started': len(started)}
+    return run
+
+
+@suite.bench('watchdog_scan[blacklist, steady]')
+def _(ctx):
+    watchdog = ProcessWatchdog(ctx['backend'], ProcessPolicy('blacklist', ['csgo.exe', 'sleep']))
+    watchdog.scan()
+
+    def run():
+        return {'violations': len(watchdog.scan())}
+    return run
+
+
+if __name__ == '__main__':
+    sys.exit(main(suite))
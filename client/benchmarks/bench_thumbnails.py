@@ -0,0 +1,140 @@
+"""
+Thumbnail capture + encode time and bytes per update.
+
+The tile diff benchmarks work on synthetic 480x270 RGB32 frames and need
+only the stdlib. When PySide6 is installed, the offscreen benchmarks
+render a real TimerOverlay and LockScreen instead of grabbing a screen
+(QT_QPA_PLATFORM=offscreen has no desktop to grab), change the clock text
+every frame and run the full grab -> scale -> diff -> JPEG pipeline. Their
+metrics report bytes per update and tiles per update.
+"""
+
+import os
+import random
+import sys
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import Suite, main
+from screen_stream import TileDiffer, TokenBucket, ThumbnailStreamer, QtScreenSource
+
+try:
+    import PySide6  # noqa: F401
+    HAVE_QT = True
+except ImportError:
+    HAVE_QT = False
+
+WIDTH, HEIGHT = 480, 270
+
+
+def _setup():
+    ctx = {'rng': random.Random(7)}
+    if HAVE_QT:
+        from PySide6.QtWidgets import QApplication
+        ctx['app'] = QApplication.instance() or QApplication(sys.argv)
+    return ctx
+
+
+suite = Suite('thumbnails', setup=_setup)
+
+
+def _frame(rng):
+    return bytearray(rng.getrandbits(8) for _ in range(WIDTH * HEIGHT * 4))
+
+
+@suite.bench('tile_checksums[480x270 tile=64]')
+def _(ctx):
+    differ = TileDiffer(64)
+    frame = bytes(_frame(ctx['rng']))
+
+    def run():
+        return {'tiles': len(differ.checksums(frame, WIDTH, HEIGHT, WIDTH * 4))}
+    return run
+
+
+@suite.bench('tile_diff[480x270, 1 region changed]')
+def _(ctx):
+    differ = TileDiffer(64)
+    frame = _frame(ctx['rng'])
+    differ.commit(differ.checksums(bytes(frame), WIDTH, HEIGHT, WIDTH * 4))
+    state = {'n': 0}
+
+    def run():
+        state['n'] += 1
+        # Clock digits in the top-left corner change every frame
+        for y in range(10, 40):
+            frame[y * WIDTH * 4 + 40:y * WIDTH * 4 + 48] = state['n'].to_bytes(8, 'little')
+        crcs = differ.checksums(frame, WIDTH, HEIGHT, WIDTH * 4)
+        changed = differ.changed(crcs)
+        differ.commit(crcs)
+        return {'changed_tiles': len(changed), 'tiles': len(crcs)}
+    return run
+
+
+@suite.bench('token_bucket_consume')
+def _(ctx):
+    bucket = TokenBucket(rate=32768, burst=131072)
+    return lambda: bucket.consume(1)
+
+
+class WidgetSource(QtScreenSource):
+    """Renders a widget instead of the (absent) offscreen desktop"""
+
+    def __init__(self, widget, **kwargs):
+        super().__init__(**kwargs)
+        self.widget = widget
+
+    def grab(self):
+        image = self.widget.grab().toImage()
+        self.image = image.scaledToWidth(self.width, self._Qt.SmoothTransformation) \
+            .convertToFormat(self._QImage.Format_RGB32)
+        return (bytes(self.image.constBits()), self.image.width(), self.image.height(),
+                self.image.bytesPerLine())
+
+
+def _widget_bench(make_widget, set_text):
+    def factory(ctx):
+        widget = make_widget()
+        streamer = ThumbnailStreamer(WidgetSource(widget), rate=10 ** 12, burst=10 ** 12)
+        streamer.start()
+        streamer.tick()
+        state = {'n': 0, 'last': None}
+
+        def run():
+            state['n'] += 1
+            set_text(widget, f"{(3599 - state['n']) // 60 % 60:02d}:{(3599 - state['n']) % 60:02d}")
+            update = streamer.tick()
+            if update:
+                state['last'] = update
+            last = state['last'] or {'tiles': []}
+            return {
+                'updates': streamer.sent_updates,
+                'avg_bytes_per_update': streamer.sent_bytes // max(streamer.sent_updates, 1),
+                'tiles_last_update': len(last['tiles']),
+            }
+        return run
+    return factory
+
+
+if HAVE_QT:
+    def _overlay():
+        from netcafe_client import TimerOverlay
+        widget = TimerOverlay()
+        widget.resize(1920, 1080)
+        return widget
+
+    def _lock():
+        from netcafe_client import LockScreen
+        widget = LockScreen()
+        widget.resize(1920, 1080)
+        return widget
+
+    suite.bench('capture_encode[TimerOverlay 1080p -> 480w]')(
+        _widget_bench(_overlay, lambda w, text: w.set_time(text)))
+    suite.bench('capture_encode[LockScreen 1080p -> 480w]')(
+        _widget_bench(_lock, lambda w, text: w.details_label.setText(f'Next slot in {text}')))
+
+
+if __name__ == '__main__':
+    sys.exit(main(suite))
@@ -0,0 +1,207 @@
+"""
+Timer wheel scheduling cost and wakeups.
+
+Timings, each with 10k timers pending:
+
+- asyncio loop.call_at + cancel, the baseline for one-shot timers
+- TimerWheel start + stop of a one-shot timer
+- one virtual second of a wheel running 10k periodic timers, with
+  intervals of 1 to 300 s started at random times; its metrics give the
+  timers fired per second
+- running a one-shot timer armed 1e9 s ahead (a session with a huge
+  expiry); its metrics give how far ahead the loop's call_at was ever
+  set, which must stay within the wheel's span, and how late it fired
+
+The wheels run on a virtual loop, so hours pass in the time it takes to
+run their callbacks. Wakeups per hour are metrics, wheel against one
+call_at per timer (a QTimer each, as the client had). For the baseline,
+a wakeup is a distinct time at which some timer fires:
+
+- the client's five periodic timers during a session: 1 s countdown, 15 s
+  heartbeat, 1 s telemetry, 5 s process scan and 2 s thumbnails, each
+  started at a random time
+- 10k periodic timers as above, over 10 virtual minutes, scaled to
+  the hour
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harness import Suite, main
+from timer_wheel import TimerWheel, SPAN
+
+COUNT = 10000
+INTERVALS = (1, 2, 5, 15, 30, 60, 300)
+CLIENT_TIMERS = (1, 15, 1, 5, 2)
+
+
+class _Handle:
+    __slots__ = ('callback', 'args', 'cancelled')
+
+    def __init__(self, callback, args):
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class VirtualLoop:
+    """time() and call_at() on a virtual clock that run_until moves"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+        self.wakeups = 0
+        self.max_ahead = 0.0
+        self._heap = []
+        self._seq = itertools.count()
+
+    def time(self):
+        return self.now
+
+    def call_at(self, when, callback, *args):
+        self.max_ahead = max(self.max_ahead, when - self.now)
+        handle = _Handle(callback, args)
+        heapq.heappush(self._heap, (when, next(self._seq), handle))
+        return handle
+
+    def run_until(self, end):
+        """Run everything due by end; handles due at the same time share a wakeup"""
+        heap = self._heap
+        while heap and heap[0][0] <= end:
+            when = heap[0][0]
+            self.now = max(self.now, when)
+            ran = False
+            while heap and heap[0][0] == when:
+                handle = heapq.heappop(heap)[2]
+                if not handle.cancelled:
+                    handle.callback(*handle.args)
+                    ran = True
+            self.wakeups += ran
+        self.now = end
+
+
+def _periodic(loop, interval):
+    """One call_at per timer, rescheduled from its due time"""
+    def fire(due):
+        loop.call_at(due + interval, fire, due + interval)
+    loop.call_at(loop.time() + interval, fire, loop.time() + interval)
+
+
+def _start_at_random_times(loop, intervals, start, seconds, rng):
+    """Call start(interval) for each interval at a random time within seconds"""
+    for when in sorted((loop.time() + rng.uniform(0, seconds), interval) for interval in intervals):
+        loop.run_until(when[0])
+        start(when[1])
+
+
+def _wakeups(intervals, seconds, rng_seed):
+    """Wakeups over seconds for both schedulers, timers started in the first minute"""
+    result = {}
+    for mode in ('call_at', 'wheel'):
+        loop = VirtualLoop()
+        rng = random.Random(rng_seed)
+        if mode == 'wheel':
+            wheel = TimerWheel(loop)
+            start = lambda interval: wheel.timer(lambda: None).start(interval)
+        else:
+            start = lambda interval: _periodic(loop, interval)
+        _start_at_random_times(loop, intervals, start, 60, rng)
+        loop.wakeups = 0
+        begin = loop.now
+        loop.run_until(begin + seconds)
+        result[mode] = loop.wakeups
+        if mode == 'wheel':
+            result['wheel_fired'] = wheel.fired
+            result['wheel_coalesced'] = wheel.coalesced
+    return result
+
+
+def _setup():
+    rng = random.Random(7)
+    intervals = [rng.choice(INTERVALS) for _ in range(COUNT)]
+    client = _wakeups(CLIENT_TIMERS, 3600, 1)
+    many = _wakeups(intervals, 600, 2)
+    return {
+        'intervals': intervals,
+        'client_per_hour': client,
+        '10k_per_hour': {key: value * 6 for key, value in many.items()},
+    }
+
+
+suite = Suite('timer_wheel', setup=_setup)
+
+
+@suite.bench('asyncio call_at+cancel[10k pending]')
+def _(context):
+    loop = asyncio.new_event_loop()
+    rng = random.Random(3)
+    now = loop.time()
+    for _ in range(COUNT):
+        loop.call_at(now + rng.uniform(1, 3600), lambda: None)
+    delays = [rng.uniform(1, 3600) for _ in range(1024)]
+    counter = itertools.count()
+
+    def run():
+        loop.call_at(now + delays[next(counter) & 1023], lambda: None).cancel()
+    return run
+
+
+@suite.bench('TimerWheel start+stop[10k pending]')
+def _(context):
+    loop = VirtualLoop()
+    wheel = TimerWheel(loop)
+    rng = random.Random(3)
+    for interval in context['intervals']:
+        wheel.timer(lambda: None).start(interval)
+    timer = wheel.timer(lambda: None)
+    delays = [rng.uniform(1, 3600) for _ in range(1024)]
+    counter = itertools.count()
+
+    def run():
+        timer.start(delays[next(counter) & 1023], single_shot=True)
+        timer.stop()
+        return {'wakeups_per_hour': {'client': context['client_per_hour'], '10k': context['10k_per_hour']}}
+    return run
+
+
+@suite.bench('TimerWheel 1 virtual second[10k periodic]')
+def _(context):
+    loop = VirtualLoop()
+    wheel = TimerWheel(loop)
+    _start_at_random_times(loop, context['intervals'], lambda interval: wheel.timer(lambda: None).start(interval),
+                           60, random.Random(4))
+    loop.run_until(loop.now + 300)
+
+    def run():
+        fired = wheel.fired
+        wakeups = wheel.wakeups
+        loop.run_until(loop.now + 1)
+        return {'fired_per_s': wheel.fired - fired, 'wakeups_per_s': wheel.wakeups - wakeups}
+    return run
+
+
+@suite.bench('TimerWheel far timer[1e9 s ahead]')
+def _(context):
+    def run():
+        loop = VirtualLoop()
+        wheel = TimerWheel(loop)
+        fired = []
+        wheel.call_later(1e9, lambda: fired.append(loop.now))
+        due = loop.now + 1e9
+        loop.run_until(due + 1)
+        return {'max_call_at_ahead_s': round(loop.max_ahead), 'span_s': SPAN * wheel.resolution,
+                'within_span': loop.max_ahead <= SPAN * wheel.resolution,
+                'late_s': round(fired[0] - due, 4) if fired else None, 'wakeups': wheel.wakeups}
+    return run
+
+
+if __name__ == '__main__':
+    sys.exit(main(suite))
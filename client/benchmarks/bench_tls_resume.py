@@ -0,0 +1,170 @@
+"""
+Full vs resumed TLS handshakes against a local self-signed server.
+
+Generates a throwaway self-signed certificate with the openssl CLI and
+runs an asyncio TLS echo server in this process. The client pins that
+certificate the way ``server.tls.pin_sha256`` does. The script times
+connect-to-first-reply, one request line and its answer, in two ways:
+
+- full:    a fresh context per connection, as a naive TLS switch does
+- resumed: one shared ResumingContext (tls.py), as the client's connector
+           uses, so every connection after the first resumes
+
+Both are measured for TLS 1.3 and TLS 1.2, directly and through a
+LatencyProxy at --rtt. The report also gives the CPU time per connection,
+client and server together since both run in this process, and checks
+that a wrong pin is refused, on a full handshake and on a resumed one.
+
+Usage: python bench_tls_resume.py [--trials N] [--rtt S] [--key rsa|ec]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from latency_proxy import LatencyProxy
+from tls import create_context
+
+VERSIONS = {'tls1.3': ssl.TLSVersion.TLSv1_3, 'tls1.2': ssl.TLSVersion.TLSv1_2}
+
+
+def make_certificate(directory, key_type):
+    cert, key = os.path.join(directory, 'server.pem'), os.path.join(directory, 'server.key')
+    if key_type == 'rsa':
+        newkey = ['-newkey', 'rsa:2048']
+    else:
+        newkey = ['-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:P-256']
+    subprocess.run(['openssl', 'req', '-x509', *newkey, '-nodes', '-keyout', key, '-out', cert,
+                    '-days', '1', '-subj', '/CN=netcafe-server'], check=True, capture_output=True)
+    with open(cert, encoding='ascii') as f:
+        der = ssl.PEM_cert_to_DER_cert(f.read())
+    return cert, key, hashlib.sha256(der).hexdigest()
+
+
+async def echo(reader, writer):
+    try:
+        while await reader.readline():
+            writer.write(b'ok\n')
+            await writer.drain()
+    except (ConnectionError, ssl.SSLError):
+        pass
+    finally:
+        writer.close()
+
+
+async def request(port, context):
+    """Seconds to the first reply, and whether the session was resumed"""
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, ssl=context,
+                                                   server_hostname='netcafe-server')
+    writer.write(b'status\n')
+    await writer.drain()
+    await reader.readline()
+    elapsed = time.perf_counter() - start
+    reused = writer.get_extra_info('ssl_object').session_reused
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, ssl.SSLError):
+        pass
+    return elapsed, reused
+
+
+async def measure(port, new_context, trials, rtt):
+    shared = new_context()
+    await request(port, shared)  # the first connection is always a full handshake
+    # Let the TLS 1.3 session tickets sent after the handshake arrive
+    await asyncio.sleep(0.01 + rtt)
+    results = {}
+    for name, context_for in (('full', lambda: new_context()), ('resumed', lambda: shared)):
+        wall, cpu, reused = [], 0.0, 0
+        for _ in range(trials):
+            context = context_for()
+            cpu_start = time.process_time()
+            elapsed, was_reused = await request(port, context)
+            cpu += time.process_time() - cpu_start
+            wall.append(elapsed)
+            reused += was_reused
+            await asyncio.sleep(0.005 + rtt)
+        median = statistics.median(wall)
+        results[name] = {'median_ms': round(median * 1000, 2), 'cpu_ms': round(cpu / trials * 1000, 3),
+                         'resumed': f"{reused}/{trials}"}
+        if rtt:
+            results[name]['rtts'] = round(median / rtt, 2)
+    return results
+
+
+async def pin_refused(port, new_context):
+    """A wrong pin must fail both a full and a resumed handshake"""
+    outcome = {}
+    context = new_context()
+    await request(port, context)
+    await asyncio.sleep(0.01)
+    for name in ('full', 'resumed'):
+        if name == 'full':
+            context = new_context(pins=['00' * 32])
+        else:
+            context.pins = frozenset(['00' * 32])
+        try:
+            await request(port, context)
+            outcome[name] = False
+        except ssl.SSLCertVerificationError:
+            outcome[name] = True
+    return outcome
+
+
+async def run(args, cert, key, fingerprint):
+    report = {'key': args.key, 'pin': fingerprint}
+    for version_name, version in VERSIONS.items():
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(cert, key)
+        server_context.maximum_version = version
+        server = await asyncio.start_server(echo, '127.0.0.1', 0, ssl=server_context)
+        port = server.sockets[0].getsockname()[1]
+
+        def new_context(pins=(fingerprint,)):
+            context = create_context(pins=pins)
+            context.maximum_version = version
+            return context
+
+        row = {'direct': await measure(port, new_context, args.trials, 0)}
+        async with LatencyProxy('127.0.0.1', port, args.rtt) as proxy:
+            row[f'rtt_{args.rtt * 1000:g}ms'] = await measure(proxy.port, new_context, args.trials, args.rtt)
+        row['wrong_pin_refused'] = await pin_refused(port, new_context)
+        report[version_name] = row
+        server.close()
+        await server.wait_closed()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full vs resumed TLS handshakes')
+    parser.add_argument('--trials', type=int, default=30)
+    parser.add_argument('--rtt', type=float, default=0.05)
+    parser.add_argument('--key', choices=('rsa', 'ec'), default='rsa', help='server key type')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='netcafe-tls-')
+    try:
+        cert, key, fingerprint = make_certificate(workdir, args.key)
+        report = asyncio.run(run(args, cert, key, fingerprint))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+    refused = all(all(report[v]['wrong_pin_refused'].values()) for v in VERSIONS)
+    return 0 if refused else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""
+Small benchmark harness shared by the bench_*.py suites.
+
+A suite registers benchmark factories: each one gets the suite's setup
+context and returns the zero-argument callable to time. The harness
+calibrates a loop count per benchmark, runs several repeats and records best
+and median time per call. If the callable returns a dict, the last one is
+kept as extra metrics (bytes, counts, ratios) next to the timings.
+
+Results go to stdout as JSON. ``--save-baseline`` stores them under
+baselines/<suite>.json and ``--compare`` fails the run when a benchmark's
+median got slower than the baseline by more than ``--tolerance``, or when
+there is no baseline to compare against. Baselines for the suites that
+need only the standard library are committed; they were taken on one
+machine, so a CI runner on other hardware should save its own first.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+class Suite:
+    def __init__(self, name, setup=None, teardown=None):
+        self.name = name
+        self.setup = setup
+        self.teardown = teardown
+        self.benchmarks = []
+
+    def bench(self, name):
+        """Decorator registering a benchmark factory under name"""
+        def register(factory):
+            self.benchmarks.append((name, factory))
+            return factory
+        return register
+
+    def run(self, pattern=None, min_time=0.2, repeat=5):
+        context = self.setup() if self.setup else None
+        results = {}
+        try:
+            for name, factory in self.benchmarks:
+                if pattern and pattern not in name:
+                    continue
+                results[name] = measure(factory(context), min_time, repeat)
+                print(f"{name:<48} {results[name]['median_us']:>12.2f} us", file=sys.stderr)
+        finally:
+            if self.teardown:
+                self.teardown(context)
+        return results
+
+
+def _time_loop(func, number):
+    result = None
+    start = time.perf_counter()
+    for _ in range(number):
+        result = func()
+    return time.perf_counter() - start, result
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """Per-call timings of func, each repeat running for about min_time"""
+    number = 1
+    while True:
+        elapsed, _ = _time_loop(func, number)
+        if elapsed >= min_time / 5 or number >= 1 << 24:
+            number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+            break
+        number *= 10
+
+    timings = []
+    metrics = None
+    for _ in range(repeat):
+        elapsed, result = _time_loop(func, number)
+        timings.append(elapsed / number)
+        if isinstance(result, dict):
+            metrics = result
+
+    entry = {
+        'number': number,
+        'repeat': repeat,
+        'best_us': round(min(timings) * 1e6, 3),
+        'median_us': round(statistics.median(timings) * 1e6, 3),
+        'stdev_us': round(statistics.pstdev(timings) * 1e6, 3),
+    }
+    if metrics is not None:
+        entry['metrics'] = metrics
+    return entry
+
+
+def compare(results, baseline, tolerance):
+    """List (name, baseline_us, current_us, ratio) for every regression"""
+    regressions = []
+    for name, entry in results.items():
+        base = baseline.get(name)
+        if not base or not base.get('median_us'):
+            continue
+        ratio = entry['median_us'] / base['median_us']
+        if ratio > 1 + tolerance:
+            regressions.append((name, base['median_us'], entry['median_us'], round(ratio, 3)))
+    return regressions
+
+
+def baseline_path(suite_name):
+    return os.path.join(BASELINE_DIR, f'{suite_name}.json')
+
+
+def main(suite, argv=None):
+    parser = argparse.ArgumentParser(description=f'{suite.name} benchmarks')
+    parser.add_argument('-k', '--filter', help='only run benchmarks whose name contains this')
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per repeat')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', metavar='PATH', help='also write results to PATH')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='compare against stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before --compare fails (0.25 = 25%%)')
+    args = parser.parse_args(argv)
+
+    results = suite.run(args.filter, args.min_time, args.repeat)
+    document = {
+        'suite': suite.name,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+    status = 0
+    if args.compare:
+        try:
+            with open(baseline_path(suite.name), 'r', encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+        except (OSError, ValueError, KeyError) as e:
+            # Nothing was compared, which must not pass as no regressions
+            print(f"No usable baseline for {suite.name}: {e}", file=sys.stderr)
+            baseline = {}
+            status = 1
+        regressions = compare(results, baseline, args.tolerance)
+        document['regressions'] = [
+            {'name': name, 'baseline_us': base, 'current_us': current, 'ratio': ratio}
+            for name, base, current, ratio in regressions
+        ]
+        for name, base, current, ratio in regressions:
+            print(f"REGRESSION {name}: {base}us -> {current}us (x{ratio})", file=sys.stderr)
+        if regressions:
+            status = 1
+
+    output = json.dumps(document, indent=2)
+    print(output)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write(output)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(suite.name), 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"Baseline saved to {baseline_path(suite.name)}", file=sys.stderr)
+    return status
@@ -0,0 +1,75 @@
+"""
+TCP proxy that adds a fixed round-trip time, for simulating WAN links.
+
+Every chunk is forwarded rtt/2 after it arrived, in each direction, in
+order. Bytes from a new client are held back for one extra RTT, which
+stands in for the TCP handshake that localhost completes instantly.
+Used as ``async with LatencyProxy(host, port, rtt) as proxy`` and then
+connecting to ``proxy.port``.
+"""
+
+import asyncio
+import time
+
+
+class LatencyProxy:
+    def __init__(self, target_host, target_port, rtt):
+        self.target = (target_host, target_port)
+        self.rtt = rtt
+        self.port = None
+        self.connections = 0
+        self._server = None
+
+    async def __aenter__(self):
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, client_reader, client_writer):
+        self.connections += 1
+        accepted = time.monotonic()
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        half = self.rtt / 2
+        try:
+            await asyncio.gather(
+                self._pipe(client_reader, upstream_writer, half, not_before=accepted + self.rtt),
+                self._pipe(upstream_reader, client_writer, half),
+                return_exceptions=True)
+        except asyncio.CancelledError:
+            # Event loop shutting down with the connection still open
+            client_writer.close()
+            upstream_writer.close()
+
+    @staticmethod
+    async def _pipe(reader, writer, delay, not_before=0.0):
+        queue = asyncio.Queue()
+
+        async def receive():
+            while True:
+                chunk = await reader.read(65536)
+                await queue.put((max(time.monotonic(), not_before) + delay, chunk))
+                if not chunk:
+                    return
+
+        receiver = asyncio.ensure_future(receive())
+        try:
+            while True:
+                due, chunk = await queue.get()
+                wait = due - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            receiver.cancel()
+            writer.close()
@@ -0,0 +1,110 @@
+"""
+Replay a recorded WebSocket session into a headless client.
+
+Runs the real NetCafeClient offscreen (QT_QPA_PLATFORM=offscreen) with modal
+dialogs and the keyboard hook disabled, feeds it the inbound frames of a
+recording and prints a JSON report with per-type handler latency and the
+final session state. The client runs in a temporary working directory
+holding a copy of config.json, so its client.log, seat identity, perf ring
+and HTTP cache don't land in the caller's directory. It takes the seat id
+from the recording's header.
+
+Usage:
+    python replay_ws.py recording.ndjson.gz [--speed 10] [--max-p95-us 500]
+    python replay_ws.py --synthetic 2000 --speed 0
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CLIENT_DIR)
+
+from ws_recorder import WSRecorder, WSReplayer, INBOUND, OUTBOUND
+
+
+def synthesize(path, frames, seed=1):
+    """Write a recording with a production-like message mix"""
+    rng = random.Random(seed)
+    recorder = WSRecorder(path, 'PC-001')
+    elapsed_ms = 0.0
+    now = time.time()
+    session_start = frames // 10
+
+    for i in range(frames):
+        elapsed_ms += rng.expovariate(1 / 50)
+        roll = rng.random()
+        if i == session_start:
+            data = {'type': 'session_deadline', 'minutes': 60, 'expires_at': now + 3600}
+        elif roll < 0.4:
+            t0 = now + elapsed_ms / 1000
+            recorder.record(OUTBOUND, json.dumps({'type': 'clock_sync', 't0': t0}), elapsed_ms)
+            data = {'type': 'clock_sync', 't0': t0, 't1': t0 + 0.002, 't2': t0 + 0.0021}
+        elif roll < 0.7:
+            data = {'type': 'time_update', 'minutes': 60 - i * 60 // frames,
+                    'expires_at': now + 3600}
+        else:
+            data = {'type': 'session_update', 'sessions': [
+                {'computer_id': f'PC-{n:03d}', 'duration_minutes': 60} for n in range(rng.randint(5, 50))
+            ]}
+        recorder.record(INBOUND, json.dumps(data), elapsed_ms)
+
+    recorder.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded WS traffic into a headless client')
+    parser.add_argument('recording', nargs='?')
+    parser.add_argument('--synthetic', type=int, metavar='FRAMES',
+                        help='replay a generated recording instead of a file')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='playback speed multiplier, 0 = as fast as possible')
+    parser.add_argument('--max-p95-us', type=float,
+                        help='exit non-zero if p95 handler latency exceeds this')
+    args = parser.parse_args()
+
+    if not args.synthetic and not args.recording:
+        parser.error('give a recording or --synthetic FRAMES')
+
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='netcafe-replay-')
+    try:
+        if args.synthetic:
+            path = synthesize(os.path.join(workdir, 'synthetic.ndjson.gz'), args.synthetic)
+        else:
+            path = os.path.abspath(args.recording)
+        shutil.copy(os.path.join(CLIENT_DIR, 'config.json'), workdir)
+        os.chdir(workdir)
+
+        from netcafe_client import NetCafeClient
+        from structured_log import shutdown_logging
+
+        client = NetCafeClient(headless=True)
+        report = client.loop.run_until_complete(WSReplayer(client, path, args.speed).run())
+        client._cleanup()
+        # Closing the loop shuts down its executor threads before the interpreter exits
+        client.loop.close()
+        # Before the rmtree: the exit report would reopen client.log in it
+        shutdown_logging()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+    if args.max_p95_us is not None and report['latency']['p95_us'] > args.max_p95_us:
+        print(f"p95 latency {report['latency']['p95_us']}us over budget {args.max_p95_us}us",
+              file=sys.stderr)
+        return 1
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
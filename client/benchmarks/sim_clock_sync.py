@@ -0,0 +1,117 @@
+"""
+Clock sync simulation: many seats with skewed and drifting clocks.
+
+Every seat runs the real ClockSync estimator against a simulated server over
+a jittery link (with occasional Wi-Fi style delay spikes). The server hands
+out one absolute session deadline; we then check, once per virtual second,
+how far each seat's countdown is from the server's own view. Halfway
+through the session every seat's wall clock is stepped by up to two
+minutes (Windows time sync, or someone changing it by hand), the
+monotonic clock the estimator samples keeps running.
+
+Usage: python sim_clock_sync.py [--seats N] [--hours H] [--seed S]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clock_sync import ClockSync
+
+HEARTBEAT_INTERVAL = 15
+CONNECT_BURST = 4
+SESSION_START = 60
+SESSION_LENGTH = 2 * 3600
+WALL_STEP_AT = SESSION_START + SESSION_LENGTH // 2
+
+
+class SimSeat:
+    def __init__(self, rng):
+        self.rng = rng
+        self.skew = rng.uniform(-600, 600)        # seat clock set wrong by up to 10 min
+        self.drift = rng.uniform(-200e-6, 200e-6)  # +-200 ppm oscillator error
+        self.base_delay = rng.uniform(0.0005, 0.020)
+        self.wall_step = rng.uniform(-120, 120)
+        self.now = 0.0
+        self.sync = ClockSync(clock=self.monotonic, wall=self.wall_time)
+
+    def monotonic(self):
+        return self.now + self.drift * self.now
+
+    def wall_time(self):
+        step = self.wall_step if self.now >= WALL_STEP_AT else 0.0
+        return self.monotonic() + self.skew + step
+
+    def one_way_delay(self):
+        delay = self.base_delay + self.rng.expovariate(1 / 0.005)
+        if self.rng.random() < 0.02:
+            delay += self.rng.uniform(0.1, 0.5)
+        return delay
+
+    def exchange(self, server_time):
+        self.now = server_time
+        t0 = self.sync.make_request()['t0']
+        t1 = server_time + self.one_way_delay()
+        t2 = t1 + 0.0001
+        self.now = t2 + self.one_way_delay()
+        self.sync.handle_response({'t0': t0, 't1': t1, 't2': t2})
+
+
+def run(seats, hours, seed):
+    rng = random.Random(seed)
+    fleet = [SimSeat(rng) for _ in range(seats)]
+    duration = int(hours * 3600)
+    expires_at = SESSION_START + SESSION_LENGTH
+
+    for seat in fleet:
+        for i in range(CONNECT_BURST):
+            seat.exchange(i * 0.05)
+
+    max_error = 0.0
+    total_error = 0.0
+    checks = 0
+    for t in range(1, duration + 1):
+        if t % HEARTBEAT_INTERVAL == 0:
+            for seat in fleet:
+                seat.exchange(float(t))
+
+        if t < SESSION_START or t > expires_at:
+            continue
+
+        true_remaining = expires_at - t
+        for seat in fleet:
+            seat.now = float(t)
+            error = abs((expires_at - seat.sync.server_now()) - true_remaining)
+            max_error = max(max_error, error)
+            total_error += error
+            checks += 1
+
+    return {
+        'seats': seats,
+        'hours': hours,
+        'seed': seed,
+        'max_error_s': round(max_error, 6),
+        'mean_error_s': round(total_error / max(checks, 1), 6),
+        'heartbeats_per_seat': duration // HEARTBEAT_INTERVAL,
+        'passed': max_error < 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seats', type=int, default=50)
+    parser.add_argument('--hours', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    result = run(args.seats, args.hours, args.seed)
+    print(json.dumps(result, indent=2))
+    return 0 if result['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Exactly-once delivery of server events across dropped connections.
+
+Runs the stand-in server with a 1000 events/s time_update stream
+(--events in total), aborting the seat's connection after any event
+with probability --drop-probability. The real client runs headless
+against it with a 50 ms reconnect delay, and its time_update handler is
+swapped for one that records each event's number.
+
+Every reconnect resumes from the client's last seq. The script checks
+that each event was handled exactly once and in order, and reports
+drops, replayed events, duplicates the client discarded, and how many
+acks it took: cumulative and batched, so far fewer than events. Exits
+non-zero on a lost, duplicated or reordered event. Needs PySide6 and
+aiohttp.
+
+Usage: python sim_event_replay.py [--events N] [--rate R] [--drop-probability P]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_DIR = os.path.dirname(BENCH_DIR)
+
+CHILD = f"""
+import asyncio, json, os, sys, time
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, {CLIENT_DIR!r})
+from netcafe_client import NetCafeClient
+from messages import TimeUpdate
+
+events, timeout = int(sys.argv[1]), float(sys.argv[2])
+client = NetCafeClient(headless=True)
+handled = []
+client.dispatcher.on(TimeUpdate, lambda msg: handled.append(msg.minutes))
+
+async def scenario():
+    asyncio.ensure_future(client.connect_to_server())
+    deadline = time.perf_counter() + timeout
+    while len(handled) < events and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(0.5)  # let the last ack go out
+    s = client.sequencer
+    return {{'handled': handled, 'duplicates_dropped': s.duplicates, 'missed': s.missed,
+             'last_seq': s.last_seq}}
+
+report = client.loop.run_until_complete(scenario())
+client._cleanup()
+client.loop.close()
+print(json.dumps(report))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Event replay across dropped connections')
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--rate', type=float, default=1000)
+    parser.add_argument('--drop-probability', type=float, default=0.002)
+    parser.add_argument('--ring-size', type=int, default=8192)
+    parser.add_argument('--port', type=int, default=18765)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='netcafe-events-')
+    server = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'), '--port', str(args.port),
+        '--event-rate', str(args.rate), '--event-count', str(args.events),
+        '--drop-probability', str(args.drop_probability), '--ring-size', str(args.ring_size)])
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{args.port}/api/status', timeout=1).read()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+
+        with open(os.path.join(CLIENT_DIR, 'config.json'), encoding='utf-8') as f:
+            config = json.load(f)
+        config['server'].update({'host': '127.0.0.1', 'fallback_hosts': [], 'port': args.port,
+                                 'reconnect_interval': 0.05, 'max_reconnect_attempts': 1000})
+        config['logging'] = {'file': 'client.log', 'console': False}
+        with open(os.path.join(workdir, 'config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+
+        timeout = args.events / args.rate * 3 + 10
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+        result = subprocess.run([sys.executable, '-c', CHILD, str(args.events), str(timeout)],
+                                cwd=workdir, env=env, capture_output=True, text=True, timeout=timeout + 30)
+        if result.returncode != 0:
+            sys.exit(result.stderr[-2000:])
+        child = json.loads(result.stdout.strip().splitlines()[-1])
+        stats = json.loads(urllib.request.urlopen(f'http://127.0.0.1:{args.port}/stats', timeout=5).read())
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    handled = child.pop('handled')
+    expected = list(range(1, args.events + 1))
+    counters = stats['counters']
+    report = {
+        'events': args.events,
+        'rate': args.rate,
+        'handled': len(handled),
+        'exactly_once_in_order': handled == expected,
+        'lost': len(set(expected) - set(handled)),
+        'handled_twice': len(handled) - len(set(handled)),
+        'drops': counters.get('drops', 0),
+        'connections': counters.get('connections', 0),
+        'events_replayed': counters.get('events_replayed', 0),
+        'resets': counters.get('resets', 0),
+        'acks_received': stats['received'].get('ack', 0),
+        'client': child,
+    }
+    report['events_per_ack'] = round(args.events / max(report['acks_received'], 1), 1)
+    print(json.dumps(report, indent=2))
+    return 0 if report['exactly_once_in_order'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Failover time with and without the warm standby.
+
+Starts two stand-in servers on the same port, one on 127.0.0.1 (primary)
+and one on 127.0.0.2 (fallback), and runs the real client headless
+against them. Once the session has settled, the primary is SIGKILLed.
+The client then sends 5 process_violations reports spaced 20 ms apart,
+into the gap. The script measures the time from the kill until the
+client is connected to the fallback and reports "Connected" again, and
+checks via the fallback's /stats that every report arrived. Reports
+written into the dead primary's socket buffer never got a client_ack,
+so they are sent again on the new connection.
+
+Each mode runs in its own interpreter with warm_standby on or off.
+Exits non-zero if the standby failover is slower than --max-failover-ms
+or a report was lost. Linux only (127.0.0.2 must be bindable); needs
+PySide6 and aiohttp.
+
+Usage: python sim_failover.py [--max-failover-ms MS]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_DIR = os.path.dirname(BENCH_DIR)
+PRIMARY, FALLBACK = '127.0.0.1', '127.0.0.2'
+REPORTS = 5
+
+CHILD = f"""
+import asyncio, json, os, signal, sys, time
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, {CLIENT_DIR!r})
+from netcafe_client import NetCafeClient
+
+primary_pid, warm_standby = int(sys.argv[1]), sys.argv[2] == 'on'
+client = NetCafeClient(headless=True)
+
+async def wait_for(predicate, timeout):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.001)
+
+def connected_to(index):
+    return (client.ws is not None and not client.ws.closed and client.current_host_index == index
+            and client._last_status == ('Connected - Ready for gaming!', True))
+
+async def scenario():
+    asyncio.ensure_future(client.connect_to_server())
+    await wait_for(lambda: connected_to(0), 10)
+    if warm_standby:
+        await wait_for(lambda: client.standby.healthy, 10)
+    await asyncio.sleep(0.5)
+
+    killed = time.perf_counter()
+    os.kill(primary_pid, signal.SIGKILL)
+    for i in range({REPORTS}):
+        await client._ws_send({{'type': 'process_violations', 'violations': [{{'pid': i, 'name': 'x.exe'}}]}})
+        await asyncio.sleep(0.02)
+    await wait_for(lambda: connected_to(1), 60)
+    failover = time.perf_counter() - killed
+    await asyncio.sleep(0.2)
+    return {{'failover_ms': round(failover * 1000, 2), 'outbox_dropped': client.outbox.dropped,
+            'outbox_unacked': len(client.outbox)}}
+
+report = client.loop.run_until_complete(scenario())
+client._cleanup()
+client.loop.close()
+print(json.dumps(report))
+"""
+
+
+def free_port():
+    for _ in range(50):
+        with socket.socket() as a, socket.socket() as b:
+            try:
+                a.bind((PRIMARY, 0))
+                port = a.getsockname()[1]
+                b.bind((FALLBACK, port))
+                return port
+            except OSError:
+                continue
+    raise RuntimeError('no port free on both loopback addresses')
+
+
+def start_server(host, port):
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'),
+                             '--host', host, '--port', str(port)])
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://{host}:{port}/api/status', timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f'stand-in server on {host}:{port} did not start')
+
+
+def run_mode(warm_standby):
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix='netcafe-failover-')
+    servers = []
+    try:
+        with open(os.path.join(CLIENT_DIR, 'config.json'), encoding='utf-8') as f:
+            config = json.load(f)
+        config['server'].update({'host': PRIMARY, 'fallback_hosts': [FALLBACK], 'port': port,
+                                 'warm_standby': warm_standby, 'standby_heartbeat': 1})
+        config['logging'] = {'file': 'client.log', 'console': False}
+        with open(os.path.join(workdir, 'config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+
+        servers = [start_server(PRIMARY, port), start_server(FALLBACK, port)]
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+        result = subprocess.run([sys.executable, '-c', CHILD, str(servers[0].pid), 'on' if warm_standby else 'off'],
+                                cwd=workdir, env=env, capture_output=True, text=True, timeout=120)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        stats = json.loads(urllib.request.urlopen(f'http://{FALLBACK}:{port}/stats', timeout=5).read())
+        report['reports_received'] = stats['received'].get('process_violations', 0)
+        report['fallback_counters'] = stats['counters']
+        return report
+    finally:
+        for proc in servers:
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGTERM)
+                proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Failover time with and without warm standby')
+    parser.add_argument('--max-failover-ms', type=float, default=500.0)
+    args = parser.parse_args()
+
+    report = {'reports_sent': REPORTS,
+              'cold_reconnect': run_mode(False),
+              'warm_standby': run_mode(True)}
+    print(json.dumps(report, indent=2))
+
+    warm = report['warm_standby']
+    ok = warm['failover_ms'] <= args.max_failover_ms and all(
+        report[mode]['reports_received'] == REPORTS for mode in ('cold_reconnect', 'warm_standby'))
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Connect-to-ready latency: legacy sequence vs the combined handshake.
+
+Runs the stand-in server behind a LatencyProxy at 1 ms and 50 ms RTT and
+times, with a fresh aiohttp session per trial (cold connections, like a
+client start or reconnect), the two request sequences the client uses to
+get from "not connected" to "knows its session":
+
+- legacy:    GET /api/status, WS upgrade, POST /api/login
+- handshake: WS upgrade carrying computer_id, caps and the resume token,
+             then the server's welcome frame with the session
+
+Both are timed up to the moment the session state is known. The time
+the user spends typing in the legacy login dialog is not included.
+Results are reported in ms and in RTTs. Needs aiohttp.
+
+Usage: python sim_handshake.py [--trials N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+
+from latency_proxy import LatencyProxy
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CAPS = 'welcome,event_seq,standby,telemetry,process_policy,thumbnails'
+
+
+async def legacy(base, computer_id):
+    async with aiohttp.ClientSession() as session:
+        start = time.perf_counter()
+        async with session.get(f'http://{base}/api/status') as response:
+            await response.read()
+        ws = await session.ws_connect(f'ws://{base}/ws?computer_id={computer_id}')
+        async with session.post(f'http://{base}/api/login',
+                                json={'username': 'bench', 'password': 'x', 'computer_id': computer_id}) as response:
+            data = await response.json()
+        elapsed = time.perf_counter() - start
+        await ws.close()
+    assert data['success']
+    return elapsed
+
+
+async def handshake(base, computer_id, token):
+    async with aiohttp.ClientSession() as session:
+        start = time.perf_counter()
+        ws = await session.ws_connect(f'ws://{base}/ws?computer_id={computer_id}&caps={CAPS}&resume={token}')
+        welcome = await ws.receive_json()
+        elapsed = time.perf_counter() - start
+        await ws.close()
+    assert welcome['type'] == 'welcome' and welcome['session'], welcome
+    return elapsed
+
+
+async def run(port, trials):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f'http://127.0.0.1:{port}/api/login',
+                                json={'username': 'bench', 'password': 'x', 'computer_id': 'seat-handshake'}) as r:
+            token = (await r.json())['resume_token']
+
+    results = {}
+    for rtt in (0.001, 0.05):
+        async with LatencyProxy('127.0.0.1', port, rtt) as proxy:
+            base = f'127.0.0.1:{proxy.port}'
+            timings = {'legacy': [], 'handshake': []}
+            for _ in range(trials):
+                timings['legacy'].append(await legacy(base, 'seat-legacy'))
+                timings['handshake'].append(await handshake(base, 'seat-handshake', token))
+        row = {}
+        for name, values in timings.items():
+            median = statistics.median(values)
+            row[name] = {'median_ms': round(median * 1000, 2), 'rtts': round(median / rtt, 2)}
+        row['saved_ms'] = round(row['legacy']['median_ms'] - row['handshake']['median_ms'], 2)
+        results[f'rtt_{rtt * 1000:g}ms'] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Legacy connect sequence vs combined handshake')
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--port', type=int, default=18766)
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'),
+                               '--port', str(args.port)])
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{args.port}/api/status', timeout=1).read()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+        report = asyncio.run(run(args.port, args.trials))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
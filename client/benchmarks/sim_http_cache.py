@@ -0,0 +1,200 @@
+"""
+Metadata cache: boot-to-rendered time and server requests, cold vs warm.
+
+A stand-in server (stdlib http.server, --latency-ms added to every
+response) serves the four metadata endpoints from config.json with ETags.
+Every "boot" builds a new HTTPCache over the same directory, so only the
+disk copy survives between boots, and follows the client's order:
+
+1. render whatever peek() finds on disk (the lock screen at boot)
+2. get() every endpoint once the server is reachable
+
+"rendered" is the moment the lock_screen and announcements bodies are
+decoded and ready to apply. On a cold boot that needs step 2; a warm
+boot has them after step 1 and step 2 only revalidates in the
+background. The script reports per-boot timings, request counts,
+304s and bytes on the wire, plus a warm boot with the server down. It
+exits non-zero if a warm boot waits on the network before rendering.
+
+Usage: python sim_http_cache.py [--boots N] [--latency-ms MS]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_cache import HTTPCache, CacheFetchError
+
+ENDPOINTS = {
+    'lock_screen': '/api/lock_screen',
+    'announcements': '/api/announcements',
+    'pricing': '/api/pricing',
+    'games': '/api/games',
+}
+RENDER = ('lock_screen', 'announcements')
+
+PAYLOADS = {
+    '/api/lock_screen': {'title': '🎮 NetCafe Pro 2.0', 'details': 'Please login to start your session...',
+                         'background': ['#0a0a0a', '#1a1a2e'], 'logo': 'x' * 2048},
+    '/api/announcements': [{'text': 'Tournament on Friday 18:00'}, {'text': 'Night pack: 5h for the price of 3'}],
+    '/api/pricing': {'currency': 'EUR', 'hourly': 2.5, 'packs': [{'hours': h, 'price': h * 2.2} for h in (1, 3, 5, 10)]},
+    '/api/games': [{'id': i, 'name': f'Game {i}', 'exe': f'game{i}.exe', 'category': 'action'} for i in range(300)],
+}
+
+
+class StandInServer:
+    def __init__(self, latency):
+        bodies = {path: json.dumps(data).encode('utf-8') for path, data in PAYLOADS.items()}
+        etags = {path: '"%s"' % hashlib.md5(body).hexdigest() for path, body in bodies.items()}
+        counters = self.counters = {'requests': 0, 'ok': 0, 'not_modified': 0, 'bytes': 0}
+        lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency)
+                body = bodies.get(self.path)
+                with lock:
+                    counters['requests'] += 1
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                if self.headers.get('If-None-Match') == etags[self.path]:
+                    self.send_response(304)
+                    self.send_header('ETag', etags[self.path])
+                    self.end_headers()
+                    with lock:
+                        counters['not_modified'] += 1
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etags[self.path])
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with lock:
+                    counters['ok'] += 1
+                    counters['bytes'] += len(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def take(self):
+        counts = dict(self.counters)
+        for key in self.counters:
+            self.counters[key] = 0
+        return counts
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def urllib_fetcher(base_url):
+    """Same contract as the client's aiohttp-based _http_fetch"""
+    def get(path, headers):
+        request = urllib.request.Request(base_url + path, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    async def fetch(path, headers):
+        return await asyncio.get_running_loop().run_in_executor(None, get, path, headers)
+    return fetch
+
+
+async def boot(directory, fetch):
+    cache = HTTPCache(fetch, directory=directory)
+    start = time.perf_counter()
+    rendered = {}
+
+    for name in RENDER:
+        entry = cache.peek(ENDPOINTS[name])
+        if entry is not None:
+            rendered[name] = entry.json()
+    rendered_at = time.perf_counter() if len(rendered) == len(RENDER) else None
+    rendered_from_disk = rendered_at is not None
+
+    async def refresh(name, path):
+        try:
+            rendered[name] = (await cache.get(path)).json()
+        except CacheFetchError:
+            pass
+    await asyncio.gather(*(refresh(name, path) for name, path in ENDPOINTS.items()))
+    if rendered_at is None and all(name in rendered for name in RENDER):
+        rendered_at = time.perf_counter()
+
+    await cache.drain()
+    return {
+        'boot_to_render_ms': round((rendered_at - start) * 1000, 3) if rendered_at else None,
+        'rendered_from_disk': rendered_from_disk,
+        'cache': dict(cache.stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Metadata cache cold vs warm boots')
+    parser.add_argument('--boots', type=int, default=10)
+    parser.add_argument('--latency-ms', type=float, default=40.0)
+    args = parser.parse_args()
+
+    server = StandInServer(args.latency_ms / 1000)
+    directory = tempfile.mkdtemp(prefix='netcafe-http-cache-')
+    fetch = urllib_fetcher(server.url)
+    try:
+        cold = asyncio.run(boot(directory, fetch))
+        cold['server'] = server.take()
+
+        warm_boots = []
+        for _ in range(args.boots):
+            result = asyncio.run(boot(directory, fetch))
+            result['server'] = server.take()
+            warm_boots.append(result)
+
+        offline = asyncio.run(boot(directory, urllib_fetcher('http://127.0.0.1:9')))
+    finally:
+        server.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    warm_render = [b['boot_to_render_ms'] for b in warm_boots]
+    report = {
+        'latency_ms': args.latency_ms,
+        'endpoints': len(ENDPOINTS),
+        'cold': cold,
+        'warm': {
+            'boots': args.boots,
+            'boot_to_render_ms_median': round(statistics.median(warm_render), 3),
+            'boot_to_render_ms_max': round(max(warm_render), 3),
+            'requests_per_boot': statistics.mean(b['server']['requests'] for b in warm_boots),
+            'not_modified_per_boot': statistics.mean(b['server']['not_modified'] for b in warm_boots),
+            'bytes_per_boot': statistics.mean(b['server']['bytes'] for b in warm_boots),
+        },
+        'warm_server_down': offline,
+    }
+    print(json.dumps(report, indent=2))
+
+    ok = all(b['rendered_from_disk'] for b in warm_boots) and offline['rendered_from_disk']
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
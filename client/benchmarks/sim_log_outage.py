@@ -0,0 +1,131 @@
+"""
+Log volume during a simulated server outage.
+
+Replays the client's reconnect loop against a virtual clock: one failed
+attempt every --retry-interval seconds, each writing the lines the client
+writes (connect, status changes, connection error, host switch,
+reconnect delay). Three configurations write to a temp directory:
+
+- legacy:    the old basicConfig FileHandler, plain text, every line kept
+- throttled: setup_logging() defaults (JSON lines, per-call-site dedup and
+             rate limiting, gzip rotation)
+- rotation:  setup_logging() with throttling effectively off and a small
+             max_bytes, showing that disk use stays bounded anyway
+
+Reports bytes written per simulated hour, bytes on disk at the end and
+the wall-clock cost per log call. It exits non-zero if the throttled log
+isn't at least 5x smaller than the legacy one.
+
+Usage: python sim_log_outage.py [--hours H] [--retry-interval S]
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from structured_log import setup_logging, _installed
+
+logger = logging.getLogger('netcafe_client')
+HOSTS = ['localhost', '127.0.0.1', '192.168.0.100']
+
+
+def attempt(n, host, next_host, delay):
+    logger.info(f"Connecting to server: http://{host}:8080", extra={'log_key': 'connect_to'})
+    logger.info(f"Status: Connecting to server... (Connected: False)", extra={'log_key': 'reconnect_status'})
+    logger.error(f"Connection error: Cannot connect to host {host}:8080 ssl:default "
+                 f"[Connect call failed ('{host}', 8080)]", extra={'log_key': 'connection_error'})
+    logger.info(f"Trying next host: {next_host}", extra={'log_key': 'next_host'})
+    logger.info(f"Status: Connection failed (attempt {n}) (Connected: False)", extra={'log_key': 'reconnect_status'})
+    logger.info(f"Reconnecting in {delay}s", extra={'log_key': 'reconnect_delay'})
+    logger.info("Attempting reconnection...", extra={'log_key': 'reconnect_attempt'})
+
+
+def run_outage(hours, retry_interval, clock):
+    calls = 0
+    start = time.perf_counter()
+    for n in range(1, int(hours * 3600 / retry_interval) + 1):
+        clock[0] += retry_interval
+        attempt(n, HOSTS[n % 3], HOSTS[(n + 1) % 3], min(5 + n * 3, 20))
+        calls += 7
+    return calls, time.perf_counter() - start
+
+
+def disk_usage(directory):
+    return sum(os.path.getsize(p) for p in glob.glob(os.path.join(directory, 'client.log*')))
+
+
+def measure(name, hours, retry_interval, configure):
+    directory = tempfile.mkdtemp(prefix=f'netcafe-log-{name}-')
+    clock = [0.0]
+    root = logging.getLogger()
+    try:
+        handler = configure(os.path.join(directory, 'client.log'), clock)
+        written = [0]
+        emit = handler.emit
+
+        def counting_emit(record):
+            # Bytes the handler writes, before rotation and gzip
+            written[0] += len(handler.format(record).encode('utf-8')) + 1
+            emit(record)
+        handler.emit = counting_emit
+
+        calls, elapsed = run_outage(hours, retry_interval, clock)
+        handler.flush()
+        return {
+            'log_calls': calls,
+            'bytes_written': written[0],
+            'bytes_per_hour': round(written[0] / hours),
+            'bytes_on_disk': disk_usage(directory),
+            'files': sorted(os.path.basename(p) for p in glob.glob(os.path.join(directory, 'client.log*'))),
+            'us_per_call': round(elapsed / calls * 1e6, 2),
+        }
+    finally:
+        for h in list(root.handlers):
+            root.removeHandler(h)
+            h.close()
+        _installed.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def legacy(path, clock):
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+    return handler
+
+
+def throttled(path, clock):
+    return setup_logging({'file': path, 'console': False}, clock=lambda: clock[0])
+
+
+def rotation(path, clock):
+    return setup_logging({'file': path, 'console': False, 'rate_per_minute': 10 ** 9, 'burst': 10 ** 9,
+                          'summary_interval': 0, 'max_bytes': 256 * 1024, 'backup_count': 3},
+                         clock=lambda: clock[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Log volume during a simulated outage')
+    parser.add_argument('--hours', type=float, default=64.0, help='default: a Friday-evening-to-Monday outage')
+    parser.add_argument('--retry-interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    report = {'hours': args.hours, 'retry_interval_s': args.retry_interval}
+    for name, configure in (('legacy', legacy), ('throttled', throttled), ('rotation', rotation)):
+        report[name] = measure(name, args.hours, args.retry_interval, configure)
+    report['reduction'] = round(report['legacy']['bytes_written'] / max(report['throttled']['bytes_written'], 1), 1)
+    print(json.dumps(report, indent=2))
+    return 0 if report['reduction'] >= 5 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Login-to-unlock latency: two-step login vs login_start.
+
+Runs the stand-in server behind a LatencyProxy at 1 ms and 50 ms RTT and
+times the requests between the user confirming the login dialog and
+the client having everything it needs to unlock the seat:
+
+- two_step:    POST /api/login, then POST /api/session/start with the
+               user_id from the first response
+- login_start: POST /api/session/login_start, which returns the session
+               id, absolute deadline and process policy at once
+
+The client is already connected by then, so both run over one warm
+keep-alive connection. Results are reported in ms and in RTTs. Exits
+non-zero if login_start isn't faster. Needs aiohttp.
+
+Usage: python sim_login_start.py [--trials N]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+
+from latency_proxy import LatencyProxy
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CREDENTIALS = {'username': 'bench', 'password': 'x', 'computer_id': 'seat-login'}
+
+
+async def two_step(session, base):
+    start = time.perf_counter()
+    async with session.post(f'{base}/api/login', json=CREDENTIALS) as response:
+        login = await response.json()
+    async with session.post(f'{base}/api/session/start',
+                            json={'user_id': login['user_id'], 'computer_id': CREDENTIALS['computer_id'],
+                                  'duration_minutes': login['minutes']}) as response:
+        data = await response.json()
+    elapsed = time.perf_counter() - start
+    assert data['success'] and data['expires_at'], data
+    return elapsed
+
+
+async def login_start(session, base):
+    start = time.perf_counter()
+    async with session.post(f'{base}/api/session/login_start', json=CREDENTIALS) as response:
+        data = await response.json()
+    elapsed = time.perf_counter() - start
+    assert data['success'] and data['expires_at'] and 'policy' in data, data
+    return elapsed
+
+
+async def run(port, trials):
+    results = {}
+    for rtt in (0.001, 0.05):
+        async with LatencyProxy('127.0.0.1', port, rtt) as proxy:
+            base = f'http://127.0.0.1:{proxy.port}'
+            connector = aiohttp.TCPConnector(limit=1)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                async with session.get(f'{base}/api/status') as response:
+                    await response.read()
+                timings = {'two_step': [], 'login_start': []}
+                for _ in range(trials):
+                    timings['two_step'].append(await two_step(session, base))
+                    timings['login_start'].append(await login_start(session, base))
+        row = {}
+        for name, values in timings.items():
+            median = statistics.median(values)
+            row[name] = {'median_ms': round(median * 1000, 2), 'rtts': round(median / rtt, 2)}
+        row['saved_ms'] = round(row['two_step']['median_ms'] - row['login_start']['median_ms'], 2)
+        results[f'rtt_{rtt * 1000:g}ms'] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Two-step login vs login_start')
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--port', type=int, default=18767)
+    args = parser.parse_args()
+
+    server = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'),
+                               '--port', str(args.port)])
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{args.port}/api/status', timeout=1).read()
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+        report = asyncio.run(run(args.port, args.trials))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+    print(json.dumps(report, indent=2))
+    faster = all(row['saved_ms'] > 0 for row in report.values())
+    return 0 if faster else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
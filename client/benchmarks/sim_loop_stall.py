@@ -0,0 +1,141 @@
+"""
+Stall attribution by the loop watchdog.
+
+Runs an asyncio loop with a LoopWatchdog (threshold --threshold) and
+injects known stalls from coroutines, the way a modal dialog or a slow
+write blocks the client's loop:
+
+- sleep:   time.sleep(--stall) in a coroutine
+- library: queue.Queue.get(timeout=--stall), which blocks inside the
+           standard library; the origin must still be the calling line
+- busy:    a pure-Python loop spinning for --stall seconds
+
+Each must produce exactly one stall, and its origin must be the
+injecting line (the loop's lines for busy). The reported duration is
+the loop lag. That is the stall minus what was left of the beat
+interval when it began, so it must fall between the injected time less
+one --interval and the injected time.
+
+Then come 40 callbacks of 20 ms each, which stay under the threshold
+and must produce no stall. Last, the watchdog's CPU cost on an idle
+loop is measured. Exits non-zero if any check fails.
+
+Usage: python sim_loop_stall.py [--stall S] [--threshold S]
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from loop_watchdog import LoopWatchdog
+
+HERE = os.path.abspath(__file__)
+
+
+def _next_line():
+    return inspect.currentframe().f_back.f_lineno + 1
+
+
+async def sleep_stall(seconds):
+    line = _next_line()
+    time.sleep(seconds)
+    return range(line, line + 1)
+
+
+async def library_stall(seconds):
+    line = _next_line() + 1
+    try:
+        queue.Queue().get(timeout=seconds)
+    except queue.Empty:
+        pass
+    return range(line, line + 1)
+
+
+async def busy_stall(seconds):
+    end = time.perf_counter() + seconds
+    first = _next_line()
+    while time.perf_counter() < end:
+        sum(range(100))
+    return range(first, first + 2)
+
+
+async def inject(watchdog, stalls, name, coroutine, seconds):
+    before = len(stalls)
+    expected = await coroutine(seconds)
+    # Let the next beat end the stall
+    await asyncio.sleep(watchdog.interval * 3)
+    got = stalls[before:]
+    result = {'stalls': len(got)}
+    if got:
+        stall = got[0]
+        origin = stall.origin
+        result.update(duration_ms=round(stall.duration * 1000, 1), origin=f'{origin.name}:{origin.lineno}',
+                      blocked_in=f'{os.path.basename(stall.blocked_in.filename)}:{stall.blocked_in.lineno} '
+                                 f'in {stall.blocked_in.name}')
+        # The duration is the loop lag: the stall minus what was left of
+        # the beat interval when it began
+        result['ok'] = (len(got) == 1 and origin.filename == HERE and origin.lineno in expected
+                        and seconds - watchdog.interval - 0.02 <= stall.duration <= seconds + 0.05)
+    else:
+        result['ok'] = False
+    return name, result
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    stalls = []
+    watchdog = LoopWatchdog(args.threshold, args.interval, stalls.append)
+    watchdog.start(loop)
+    report = {'threshold_ms': args.threshold * 1000, 'stall_ms': args.stall * 1000, 'scenarios': {}}
+    await asyncio.sleep(0.2)
+
+    for name, coroutine in (('sleep', sleep_stall), ('library', library_stall), ('busy', busy_stall)):
+        key, result = await inject(watchdog, stalls, name, coroutine, args.stall)
+        report['scenarios'][key] = result
+
+    before = len(stalls)
+    for _ in range(40):
+        end = time.perf_counter() + 0.02
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(0)
+    await asyncio.sleep(args.interval * 3)
+    report['scenarios']['short_blocks'] = {'stalls': len(stalls) - before, 'ok': len(stalls) == before}
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.sleep(args.idle)
+    with_watchdog = time.process_time() - cpu
+    elapsed = time.perf_counter() - wall
+    watchdog.stop()
+    cpu = time.process_time()
+    await asyncio.sleep(args.idle)
+    without = time.process_time() - cpu
+    report['idle_cpu_pct'] = {'with_watchdog': round(with_watchdog / elapsed * 100, 3),
+                              'without': round(without / elapsed * 100, 3)}
+    report['loop_wakeups_per_s'] = round(1 / args.interval, 1)
+    report['summary'] = watchdog.summary()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Loop watchdog stall attribution')
+    parser.add_argument('--stall', type=float, default=0.6)
+    parser.add_argument('--threshold', type=float, default=0.25)
+    parser.add_argument('--interval', type=float, default=0.1)
+    parser.add_argument('--idle', type=float, default=2.0, help='seconds of idle loop for the CPU cost')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    return 0 if all(s['ok'] for s in report['scenarios'].values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
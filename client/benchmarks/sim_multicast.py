@@ -0,0 +1,162 @@
+"""
+Cafe-wide broadcasts over localhost multicast, with loss recovery.
+
+Joins --receivers BroadcastReceivers to a multicast group on the loopback
+interface, all in this process, and sends --broadcasts signed frames at
+--rate per second from one MulticastSender. Each receiver drops an
+incoming datagram with probability --loss. Localhost never loses one
+itself, so this stands in for a busy LAN. Gaps are recovered through
+the resend path, with the WS round trip simulated as --ws-delay. A
+few heartbeats at the end let receivers notice a lost last broadcast.
+
+The script reports:
+- delivery latency from send to in-order delivery, for frames received
+  directly and for frames recovered through a resend
+- the datagrams the server sent and the resends it answered, compared
+  with one WS message per seat per broadcast
+
+Exits non-zero unless every receiver delivered every broadcast exactly
+once and in order. Runs on the standard library only.
+
+Usage: python sim_multicast.py [--receivers N] [--broadcasts N] [--loss P]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from broadcast import BroadcastReceiver, MulticastListener, MulticastSender, multicast_socket
+
+GROUP = '239.255.42.99'
+
+
+class LossyListener(MulticastListener):
+    def __init__(self, receiver, loss, rng):
+        super().__init__(receiver)
+        self.loss = loss
+        self.rng = rng
+        self.dropped = 0
+
+    def datagram_received(self, data, addr):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        super().datagram_received(data, addr)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(args):
+    loop = asyncio.get_event_loop()
+    rng = random.Random(args.seed)
+    sender = MulticastSender(GROUP, args.port, os.urandom(32), interface='127.0.0.1')
+    resend_requests = 0
+    seats = []
+
+    async def make_seat():
+        seat = {'delivered': [], 'direct_ms': [], 'recovered_ms': [], 'replayed': set()}
+
+        def deliver(seq, payload, sent_at):
+            latency = (time.time() - sent_at) * 1000
+            seat['delivered'].append(seq)
+            seat['recovered_ms' if seq in seat['replayed'] else 'direct_ms'].append(latency)
+
+        def request_resend(stream, first, last):
+            nonlocal resend_requests
+            resend_requests += 1
+            reply = sender.replay(first, last)
+
+            def answer():
+                frames = [(f['seq'], f['payload'], f['sent_at']) for f in reply['frames']]
+                seat['replayed'].update(seq for seq, _, _ in frames)
+                seat['receiver'].replay(reply['stream'], frames)
+                seat['listener'].schedule_expiry()
+            loop.call_later(args.ws_delay, answer)
+
+        receiver = BroadcastReceiver(sender.key, deliver, request_resend, resend_timeout=args.resend_timeout)
+        receiver.start(sender.stream, sender.seq)
+        _, listener = await loop.create_datagram_endpoint(
+            lambda: LossyListener(receiver, args.loss, rng),
+            sock=multicast_socket(GROUP, args.port, '127.0.0.1'))
+        seat.update(receiver=receiver, listener=listener)
+        return seat
+
+    for _ in range(args.receivers):
+        seats.append(await make_seat())
+
+    payload = {'type': 'announcement', 'text': 'Closing in 15 minutes', 'level': 'warning'}
+    send_seconds = 0.0
+    for _ in range(args.broadcasts):
+        start = time.perf_counter()
+        sender.send(payload)
+        send_seconds += time.perf_counter() - start
+        await asyncio.sleep(1 / args.rate)
+    # Heartbeats, as the server sends them every few seconds, so losing the
+    # last broadcast is noticed too
+    for _ in range(5):
+        await asyncio.sleep(0.1)
+        sender.heartbeat()
+    await asyncio.sleep(args.resend_timeout + args.ws_delay + 0.5)
+
+    for seat in seats:
+        seat['listener'].close()
+    sender.close()
+
+    expected = list(range(1, args.broadcasts + 1))
+    direct = [ms for seat in seats for ms in seat['direct_ms']]
+    recovered = [ms for seat in seats for ms in seat['recovered_ms']]
+    return {
+        'receivers': args.receivers,
+        'broadcasts': args.broadcasts,
+        'loss': args.loss,
+        'exactly_once_in_order': all(seat['delivered'] == expected for seat in seats),
+        'datagrams_dropped': sum(seat['listener'].dropped for seat in seats),
+        'recovered': sum(seat['receiver'].recovered for seat in seats),
+        'lost': sum(seat['receiver'].lost for seat in seats),
+        'latency_ms': {
+            'direct_p50': round(percentile(direct, 0.5), 3),
+            'direct_p99': round(percentile(direct, 0.99), 3),
+            'recovered_p50': round(percentile(recovered, 0.5), 3) if recovered else None,
+            'recovered_p99': round(percentile(recovered, 0.99), 3) if recovered else None,
+            'recovered_mean': round(statistics.mean(recovered), 3) if recovered else None,
+        },
+        'server': {
+            'datagrams_sent': sender.sent,
+            'resend_requests': resend_requests,
+            'ws_messages_without_multicast': args.receivers * args.broadcasts,
+            'send_us_per_broadcast': round(send_seconds / args.broadcasts * 1e6, 2),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Multicast broadcast delivery and loss recovery')
+    parser.add_argument('--receivers', type=int, default=200)
+    parser.add_argument('--broadcasts', type=int, default=300)
+    parser.add_argument('--rate', type=float, default=100)
+    parser.add_argument('--loss', type=float, default=0.01)
+    parser.add_argument('--ws-delay', type=float, default=0.002)
+    parser.add_argument('--resend-timeout', type=float, default=1.0)
+    parser.add_argument('--port', type=int, default=45999)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    return 0 if report['exactly_once_in_order'] and not report['lost'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
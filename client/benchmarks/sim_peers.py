@@ -0,0 +1,171 @@
+"""
+Peer mode convergence with in-process seats on localhost.
+
+Starts --peers PeerNodes on 127.0.0.1, all in this process. Each one is
+seeded with 3 random others, the way peer_config seeds them. Gossip
+runs every --interval seconds (the config default is 1 s; it is scaled
+down here, and so is the 1/16 s tick of each seat's timer wheel), and a
+peer counts as dead after 10 intervals of silence. The
+script times these phases:
+
+- election: every seat agrees on the seat with the lowest id as leader
+- snapshots: every seat writes its running session at once, until all
+  ledgers are identical
+- command: a staff top-up is sent to a seat that isn't the leader and
+  forwarded to it, until the target seat sees the new deadline and
+  every ledger has the entry
+- failover: the leader stops, until the rest agree on a new one
+
+Between the last two, the captured top-up datagram is sent again to the
+seat it went through and to the leader, as a customer replaying it from
+their seat would. No ledger may gain an entry from that.
+
+It then measures steady-state gossip traffic per seat at 10, 25 and
+--peers seats, to show that it doesn't grow with the number of seats.
+Times are also given in gossip intervals. Exits non-zero if a phase
+doesn't converge within 200 intervals or a replay adds an entry. Runs on the standard library
+only.
+
+Usage: python sim_peers.py [--peers N] [--interval S]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from peer_mode import PeerNode, seal_command
+from timer_wheel import TimerWheel
+
+KEY = os.urandom(32)
+
+
+async def start_peers(count, interval, base_port, rng):
+    ports = [base_port + i for i in range(count)]
+    ids = [f"seat-{i:03d}" for i in range(count)]
+    nodes = []
+    for i, node_id in enumerate(ids):
+        seeds = [(ids[j], '127.0.0.1', ports[j]) for j in rng.sample([j for j in range(count) if j != i], 3)]
+        node = PeerNode(node_id, KEY, port=ports[i], host='127.0.0.1', seeds=seeds, interval=interval,
+                        peer_timeout=interval * 10, rng=random.Random(rng.random()),
+                        timers=TimerWheel(resolution=interval / 16))
+        await node.start()
+        nodes.append(node)
+    return nodes
+
+
+async def wait_for(condition, limit, start=None):
+    start = start or time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > limit:
+            return None
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - start
+
+
+def agreed(nodes):
+    return {node.leader for node in nodes} == {min(node.node_id for node in nodes)}
+
+
+def view(nodes):
+    """Average share of the other seats each seat currently sees as alive"""
+    return round(sum(len(node.alive()) for node in nodes) / len(nodes) / (len(nodes) - 1), 3)
+
+
+def converged(nodes):
+    return len({tuple(node.ledger.digest) for node in nodes}) == 1
+
+
+async def traffic(count, interval, base_port, rng, seconds):
+    nodes = await start_peers(count, interval, base_port, rng)
+    await wait_for(lambda: agreed(nodes), interval * 200)
+    before = sum(n.sent for n in nodes), sum(n.bytes_sent for n in nodes)
+    await asyncio.sleep(seconds)
+    sent = sum(n.sent for n in nodes) - before[0], sum(n.bytes_sent for n in nodes) - before[1]
+    for node in nodes:
+        node.stop()
+    per_interval = seconds / interval
+    return {'datagrams_per_seat_per_interval': round(sent[0] / count / per_interval, 2),
+            'bytes_per_seat_per_interval': round(sent[1] / count / per_interval, 1)}
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    limit = args.interval * 200
+    nodes = await start_peers(args.peers, args.interval, args.port, rng)
+    phases = {}
+
+    def record(name, seconds):
+        phases[name] = None if seconds is None else {
+            'ms': round(seconds * 1000, 1), 'intervals': round(seconds / args.interval, 1)}
+
+    record('election', await wait_for(lambda: agreed(nodes), limit))
+    await asyncio.sleep(args.interval * 20)
+    membership_view = view(nodes)
+
+    now = time.time()
+    for node in nodes:
+        node.record('start', node.node_id, 60, now + 3600)
+    record('snapshots', await wait_for(lambda: converged(nodes) and len(nodes[0].ledger) == len(nodes), limit))
+
+    leader = nodes[0].leader
+    target = next(n for n in nodes if n.node_id != leader and n.node_id != nodes[1].node_id)
+    via = nodes[1] if nodes[1].node_id != leader else nodes[2]
+    command = seal_command(KEY, 'topup', target.node_id, 30)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.sendto(command, tuple(via.address))
+    sent = time.perf_counter()
+    expected = len(nodes) + 1
+    record('command_at_target', await wait_for(
+        lambda: (target.seat_state(target.node_id) or {}).get('minutes', 0) >= 89, limit, sent))
+    record('command_everywhere', await wait_for(
+        lambda: converged(nodes) and len(nodes[0].ledger) == expected, limit, sent))
+
+    leader_node = next(n for n in nodes if n.node_id == leader)
+    for address in (via.address, leader_node.address, via.address):
+        sock.sendto(command, tuple(address))
+    sock.close()
+    await asyncio.sleep(args.interval * 20)
+    replay = {'replays': 3, 'entries_added': max(len(n.ledger) for n in nodes) - expected}
+
+    old = next(n for n in nodes if n.node_id == leader)
+    old.stop()
+    rest = [n for n in nodes if n is not old]
+    record('failover', await wait_for(lambda: agreed(rest), limit))
+    for node in rest:
+        node.stop()
+
+    sizes = sorted({10, 25, args.peers})
+    scaling = {}
+    for i, count in enumerate(sizes):
+        scaling[count] = await traffic(count, args.interval, args.port + 1000 * (i + 1), rng,
+                                       args.interval * 20)
+
+    return {'peers': args.peers, 'interval_ms': args.interval * 1000, 'phases': phases,
+            'membership_view': membership_view, 'command_replay': replay,
+            'ledger_entries': len(rest[0].ledger),
+            'steady_state_traffic': scaling}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peer mode convergence')
+    parser.add_argument('--peers', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--port', type=int, default=47800)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    converged = all(v is not None for v in report['phases'].values())
+    return 0 if converged and not report['command_replay']['entries_added'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Seat identity: startup cost and stability across simulated reboots.
+
+Every "boot" is a fresh interpreter, so uuid's internal MAC cache is cold
+just like on a real start. The script measures what the id lookup costs
+per start before (hostname + uuid.getnode()) and after (persisted id +
+machine GUID check). It then reboots a seat whose getnode() finds no MAC
+and returns random values, to show the old ids drift and the new one
+doesn't. It exits non-zero if the persisted id ever changes.
+
+Usage: python sim_seat_identity.py [--boots N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PRELUDE = f"""
+import random, socket, sys, time, uuid
+sys.path.insert(0, {CLIENT_DIR!r})
+from seat_identity import load_computer_id
+no_mac = lambda: random.getrandbits(48) | (1 << 40)
+"""
+
+OLD_TIMED = _PRELUDE + """
+t = time.perf_counter()
+computer_id = f"{socket.gethostname()}_{uuid.getnode()}"
+print(time.perf_counter() - t)
+"""
+
+NEW_TIMED = _PRELUDE + """
+t = time.perf_counter()
+computer_id = load_computer_id(sys.argv[1])
+print(time.perf_counter() - t)
+"""
+
+OLD_NO_MAC = _PRELUDE + """
+print(f"{socket.gethostname()}_{no_mac()}")
+"""
+
+NEW_NO_MAC = _PRELUDE + """
+print(load_computer_id(sys.argv[1], getnode=no_mac))
+"""
+
+
+def boot(code, *args):
+    result = subprocess.run([sys.executable, '-c', code, *args],
+                            capture_output=True, text=True, check=True)
+    return result.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seat identity startup cost and stability')
+    parser.add_argument('--boots', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='netcafe-identity-')
+    timed_path = os.path.join(workdir, 'timed.json')
+    no_mac_path = os.path.join(workdir, 'no_mac.json')
+
+    boot(NEW_TIMED, timed_path)  # first boot derives and persists
+    old_times = [float(boot(OLD_TIMED)) for _ in range(args.boots)]
+    new_times = [float(boot(NEW_TIMED, timed_path)) for _ in range(args.boots)]
+
+    old_ids = {boot(OLD_NO_MAC) for _ in range(args.boots)}
+    new_ids = {boot(NEW_NO_MAC, no_mac_path) for _ in range(args.boots)}
+
+    # Hardware change: a stale fingerprint must trigger exactly one re-derive
+    with open(no_mac_path, 'r', encoding='utf-8') as f:
+        record = json.load(f)
+    record['fingerprint'] = '0' * 16
+    with open(no_mac_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f)
+    changed_ids = {boot(NEW_NO_MAC, no_mac_path) for _ in range(3)}
+    with open(no_mac_path, 'r', encoding='utf-8') as f:
+        rederived = json.load(f)['fingerprint'] != '0' * 16
+
+    result = {
+        'boots': args.boots,
+        'startup_us': {
+            'getnode_median': round(statistics.median(old_times) * 1e6, 1),
+            'persisted_median': round(statistics.median(new_times) * 1e6, 1),
+            'saved_median': round((statistics.median(old_times) - statistics.median(new_times)) * 1e6, 1),
+        },
+        'no_mac_reboots': {
+            'distinct_ids_getnode': len(old_ids),
+            'distinct_ids_persisted': len(new_ids),
+        },
+        'hardware_change': {
+            'rederived': rederived,
+            'stable_after': len(changed_ids) == 1,
+        },
+    }
+    result['passed'] = (len(new_ids) == 1 and result['hardware_change']['rederived']
+                        and result['hardware_change']['stable_after'])
+    print(json.dumps(result, indent=2))
+    return 0 if result['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+Memory soak: thousands of session cycles under a virtual clock.
+
+Seats run for days without a restart, and every reconnect builds new
+objects: a WebSocket and its reader task, now and then a new HTTP
+session, tray messages, timers. This script runs the real client
+headless against a stand-in server started with --virtual-clock, and
+drives it through --cycles cycles of:
+
+  reconnect -> login -> 5-minute warning -> 1-minute warning -> expiry
+  -> logout -> WebSocket closed
+
+Each cycle moves the server's clock and the client's clock_sync clock
+forward together by the session length, so an hour of session time
+passes in a few milliseconds (2000 cycles are about 83 days). Every
+tenth cycle also closes the HTTP session, as a failed attempt does, so
+the next reconnect opens a new one.
+
+After --warmup cycles (the log ring and other bounded buffers fill up
+in that time), a tracemalloc snapshot and a count of live objects by
+type are taken. Then every --every cycles, after a full gc, a
+checkpoint records the traced memory, the object total, the counts of a
+few watched types (ClientSession, Task, QAction, QMessageBox ...), the
+asyncio tasks, the Qt widgets and the open file descriptors. At the end,
+the script fits a line through each series and fails if:
+
+- traced memory grows by more than --max-bytes-per-cycle
+- a watched series grows by more than --max-objects-per-cycle
+- any type's live count grew by at least one per two measured cycles
+- a cycle missed a warning, or the server counted fewer logouts than
+  cycles
+
+The report lists the source lines that grew most between the first and
+last snapshot. Linux only (reads /proc/self/fd); needs PySide6 and
+aiohttp.
+
+Usage: python sim_soak.py [--cycles N] [--warmup N] [--every N]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLIENT_DIR = os.path.dirname(BENCH_DIR)
+HOST = '127.0.0.1'
+WATCHED = ('ClientSession', 'TCPConnector', 'ClientWebSocketResponse', 'Task', 'Future', 'TimerHandle',
+           'QAction', 'QMessageBox', 'Timer', 'LogTail')
+
+CHILD = """
+import asyncio, gc, json, os, sys, time, tracemalloc
+from collections import Counter
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+client_dir, cycles, warmup, every = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+watched = sys.argv[5].split(',')
+sys.path.insert(0, client_dir)
+from PySide6.QtWidgets import QApplication
+from netcafe_client import NetCafeClient
+
+client = NetCafeClient(headless=True)
+skew = [0.0]
+client.clock_sync.clock = lambda: time.monotonic() + skew[0]
+WARN_5MIN, WARN_1MIN = '\u26a0\ufe0f Time Warning', '\U0001f6a8 Final Warning'
+shown = Counter()
+show_message = client.tray.showMessage
+
+def counting(title, *args):
+    shown[title] += 1
+    return show_message(title, *args)
+client.tray.showMessage = counting
+
+async def wait_for(predicate, timeout=10):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.001)
+
+def connected():
+    return (client.ws is not None and not client.ws.closed
+            and client._last_status == ('Connected - Ready for gaming!', True))
+
+async def advance(seconds):
+    status, data = await client._post_json(client._get_current_server_url() + '/api/clock',
+                                           {'advance': seconds})
+    skew[0] = data['skew']
+    client._tick()
+
+async def cycle(n):
+    client._try_reconnect()
+    await wait_for(connected)
+    await client.authenticate('soak', 'soak')
+    await wait_for(lambda: client.session_active)
+    # The warnings are wheel timers, re-armed by the tick and fired on the next wakeup
+    await advance(client.remaining_time - 299)
+    await wait_for(lambda: shown[WARN_5MIN] == n + 1)
+    await advance(240)
+    await wait_for(lambda: shown[WARN_1MIN] == n + 1)
+    await advance(120)
+    await wait_for(lambda: not client.session_active)
+    await client.ws.close()
+    await wait_for(lambda: client.ws is None)
+    if n % 10 == 0:
+        await client.session.close()
+
+def type_counts():
+    return Counter(type(o).__name__ for o in gc.get_objects())
+
+def checkpoint(n):
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0]
+    counts = type_counts()
+    return {'cycle': n, 'traced_kb': round(traced / 1024, 1), 'objects': sum(counts.values()),
+            'tasks': len(asyncio.all_tasks()), 'qt_widgets': len(QApplication.allWidgets()),
+            'fds': len(os.listdir('/proc/self/fd')), **{name: counts[name] for name in watched}}
+
+async def soak():
+    started = time.perf_counter()
+    tracemalloc.start()
+    for n in range(warmup):
+        await cycle(n)
+    gc.collect()
+    first_types = type_counts()
+    first = tracemalloc.take_snapshot()
+    points = [checkpoint(warmup)]
+    for n in range(warmup, cycles):
+        await cycle(n)
+        if (n + 1 - warmup) % every == 0:
+            points.append(checkpoint(n + 1))
+    gc.collect()
+    last = tracemalloc.take_snapshot()
+    type_growth = type_counts()
+    type_growth.subtract(first_types)
+    ignore = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<string>'))
+    lines = last.filter_traces(ignore).compare_to(first.filter_traces(ignore), 'lineno')
+    return {
+        'wall_s': round(time.perf_counter() - started, 1),
+        'virtual_days': round(skew[0] / 86400, 1),
+        'warnings': {'5min': shown[WARN_5MIN], '1min': shown[WARN_1MIN]},
+        'checkpoints': points,
+        'type_growth': dict(type_growth.most_common(10)),
+        'top_lines': [{'line': str(s.traceback[0]), 'kb': round(s.size_diff / 1024, 1), 'blocks': s.count_diff}
+                      for s in lines[:10]],
+    }
+
+report = client.loop.run_until_complete(soak())
+client._cleanup()
+client.loop.close()
+print(json.dumps(report))
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def start_server(port):
+    proc = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, 'standin_server.py'),
+                             '--host', HOST, '--port', str(port), '--virtual-clock'])
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://{HOST}:{port}/api/status', timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f'stand-in server on {HOST}:{port} did not start')
+
+
+def slope(points, key):
+    """Least-squares growth of points[key] per cycle"""
+    xs = [p['cycle'] for p in points]
+    ys = [p[key] for p in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var if var else 0.0
+
+
+def run(args):
+    port = free_port()
+    workdir = tempfile.mkdtemp(prefix='netcafe-soak-')
+    server = None
+    try:
+        with open(os.path.join(CLIENT_DIR, 'config.json'), encoding='utf-8') as f:
+            config = json.load(f)
+        config['server'].update({'host': HOST, 'fallback_hosts': [], 'port': port, 'warm_standby': False})
+        config['logging'] = {'file': 'client.log', 'console': False}
+        with open(os.path.join(workdir, 'config.json'), 'w', encoding='utf-8') as f:
+            json.dump(config, f)
+
+        server = start_server(port)
+        env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+        result = subprocess.run([sys.executable, '-c', CHILD, CLIENT_DIR, str(args.cycles), str(args.warmup),
+                                 str(args.every), ','.join(WATCHED)],
+                                cwd=workdir, env=env, capture_output=True, text=True,
+                                timeout=60 + args.cycles * 0.5)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr[-2000:])
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        stats = json.loads(urllib.request.urlopen(f'http://{HOST}:{port}/stats', timeout=5).read())
+        report['server'] = stats['counters']
+        return report
+    finally:
+        if server is not None and server.poll() is None:
+            server.send_signal(signal.SIGTERM)
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory soak under a virtual clock')
+    parser.add_argument('--cycles', type=int, default=2000)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--every', type=int, default=100, help='cycles between checkpoints')
+    parser.add_argument('--max-bytes-per-cycle', type=float, default=512)
+    parser.add_argument('--max-objects-per-cycle', type=float, default=0.02)
+    args = parser.parse_args()
+    if args.cycles - args.warmup < args.every * 3:
+        parser.error('need at least three checkpoints after the warm-up')
+
+    report = run(args)
+    points = report['checkpoints']
+    measured = points[-1]['cycle'] - points[0]['cycle']
+    growth = {'traced_bytes': round(slope(points, 'traced_kb') * 1024, 1)}
+    for key in ('objects', 'tasks', 'qt_widgets', 'fds') + WATCHED:
+        growth[key] = round(slope(points, key), 4)
+    report['growth_per_cycle'] = growth
+
+    leaking = [key for key in ('tasks', 'qt_widgets', 'fds') + WATCHED
+               if growth[key] > args.max_objects_per_cycle and points[-1][key] > points[0][key]]
+    leaking += [name for name, count in report['type_growth'].items() if count >= measured / 2]
+    report['checks'] = {
+        'traced_memory_bounded': growth['traced_bytes'] <= args.max_bytes_per_cycle,
+        'objects_bounded': not leaking,
+        'every_warning_shown': report['warnings'] == {'5min': args.cycles, '1min': args.cycles},
+        'every_session_logged_out': report['server'].get('logouts', 0) == args.cycles,
+    }
+    report['leaking'] = sorted(set(leaking))
+    report['cycles_per_s'] = round(args.cycles / report['wall_s'], 1)
+    print(json.dumps(report, indent=2))
+    return 0 if all(report['checks'].values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
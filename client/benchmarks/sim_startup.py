@@ -0,0 +1,85 @@
+"""
+Start-up timeline and time-to-lock budget.
+
+Boots the real client --runs times, each in a fresh interpreter, from a
+scratch directory holding a copy of config.json. Runs are offscreen
+(QT_QPA_PLATFORM=offscreen) and headless, so there is no keyboard hook
+and no login dialog. Each boot reports how long the imports took and
+the client's StartupTimeline: the lock, tray, config, identity and
+network stages and the 'locked' and 'ready' marks, all relative to
+NetCafeClient() being called.
+
+Exits non-zero if the median time-to-lock ('locked' mark) is over
+--budget-ms, which makes it usable as a check in CI.
+
+Usage: python sim_startup.py [--runs N] [--budget-ms MS]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CLIENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOOT = f"""
+import json, logging, os, sys, time
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, {CLIENT_DIR!r})
+t = time.perf_counter()
+from netcafe_client import NetCafeClient
+imports = time.perf_counter() - t
+client = NetCafeClient(headless=True)
+timeline = client.startup.as_dict()
+timeline['imports_ms'] = round(imports * 1000, 2)
+client._cleanup()
+client.loop.close()
+print(json.dumps(timeline))
+"""
+
+
+def boot(workdir):
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    result = subprocess.run([sys.executable, '-c', BOOT], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Client start-up timeline and time-to-lock budget')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=250.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='netcafe-startup-')
+    try:
+        shutil.copy(os.path.join(CLIENT_DIR, 'config.json'), workdir)
+        boots = [boot(workdir) for _ in range(args.runs)]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    def median(values):
+        return round(statistics.median(values), 2)
+
+    stage_names = sorted({name for b in boots for name in b['stages']})
+    report = {
+        'runs': args.runs,
+        'budget_ms': args.budget_ms,
+        'imports_ms': median([b['imports_ms'] for b in boots]),
+        'time_to_lock_ms': median([b['marks']['locked'] for b in boots]),
+        'time_to_ready_ms': median([b['marks']['ready'] for b in boots]),
+        'stages_ms': {name: {'start': median([b['stages'][name]['start_ms'] for b in boots]),
+                             'end': median([b['stages'][name]['end_ms'] for b in boots])}
+                      for name in stage_names},
+    }
+    report['within_budget'] = report['time_to_lock_ms'] <= args.budget_ms
+    print(json.dumps(report, indent=2))
+    return 0 if report['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,401 @@
+"""
+Stand-in NetCafe server for client simulations.
+
+Implements just enough of the server side for the client to connect,
+run a session and be observed. It is not a reference implementation.
+
+- GET /api/status: reachability probe.
+- POST /api/login: starts a --session-minutes session for the seat and
+  returns it with a resume token and the user_id.
+- POST /api/session/start: (re)starts the seat's session for a user_id and
+  duration_minutes, the second request of the older two-step login.
+- POST /api/session/login_start: checks the credentials and starts the
+  session in one step, returning the session, its absolute deadline and
+  the seat's process policy.
+- GET /ws: seat connections (``?computer_id=``) and warm-standby
+  connections (``&standby=1``). It answers clock_sync pings and counts
+  every received message type. A ``standby_promote`` frame turns a
+  standby connection into the seat's connection.
+- A connection announcing ``caps`` gets a ``welcome`` first frame: status,
+  server time, and the seat's session if ``resume`` carries its token.
+  It announces ``client_acks``: a client message with ``cseq`` is
+  answered with ``client_ack``, and one whose cseq was already seen in
+  the connection's ``out_stream`` is counted as a duplicate and ignored.
+- Every seat connection opens with ``event_stream``. Events pushed to a
+  seat carry ``seq`` and are kept in a ring buffer of --ring-size, and a
+  reconnect with ``stream`` and ``last_seq`` gets the gap replayed.
+  With --event-rate, each seat gets a stream of time_update events
+  (--event-count in total). With --drop-probability, the connection is
+  aborted after any given event with that probability.
+- With --multicast GROUP:PORT, seats announcing the ``broadcast`` cap are
+  sent ``broadcast_channel`` and POST /api/broadcast goes out as one
+  signed datagram (see ../broadcast.py). ``broadcast_resend`` is answered
+  over the WS, and seats without the channel get broadcasts over the WS.
+- Seats announcing the ``peer`` cap get ``peer_config``: the peer key and
+  up to 8 other seats as seeds. POST /api/peer/reconcile takes a peer
+  ledger and returns the ids it hadn't seen before (see ../peer_mode.py).
+- With --tls-cert and --tls-key, everything is served over TLS, for
+  clients with ``server.tls`` on.
+- POST /api/profile: multipart profile upload from a seat (see
+  ../profiler.py); only counted.
+- POST /api/logout: ends the seat's session; counted.
+- With --virtual-clock, POST /api/clock ``{"advance": seconds}`` moves
+  the server's clock forward and returns the total ``skew``. Deadlines,
+  resumes, ``server_time`` and clock_sync replies all use that clock, so
+  a harness can let hours of session time pass in an instant.
+- GET /stats: counters as JSON, for the harness.
+
+Usage: python standin_server.py [--host 127.0.0.1] [--port 8080] [--session-minutes N]
+           [--event-rate N --event-count N --drop-probability P --ring-size N]
+           [--multicast 239.255.42.99:45999] [--tls-cert server.pem --tls-key server.key]
+           [--virtual-clock]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import ssl
+import sys
+import time
+import uuid
+from collections import Counter, deque
+
+from aiohttp import web, WSMsgType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from broadcast import MulticastSender
+
+
+class SeatEvents:
+    """One seat's event sequence and replay ring buffer"""
+
+    def __init__(self, ring_size):
+        self.ring = deque(maxlen=ring_size)
+        self.seq = 0
+        self.acked = 0
+        self.ws = None
+        self.transport = None
+        self.generator = None
+        self.multicast = False
+        self.out_stream = None
+        self.cseq = 0
+
+    def emit(self, data):
+        self.seq += 1
+        text = json.dumps(dict(data, seq=self.seq))
+        self.ring.append((self.seq, text))
+        return text
+
+    def since(self, last_seq):
+        """Events after last_seq, or None if the ring no longer has them all"""
+        if last_seq >= self.seq:
+            return []
+        if not self.ring or self.ring[0][0] > last_seq + 1:
+            return None
+        return [(seq, text) for seq, text in self.ring if seq > last_seq]
+
+
+class StandInServer:
+    def __init__(self, event_rate=0, event_count=0, drop_probability=0.0, ring_size=4096, session_minutes=60,
+                 multicast=None, virtual_clock=False):
+        self.session_minutes = session_minutes
+        self.virtual_clock = virtual_clock
+        self.skew = 0.0
+        self.sessions = {}
+        self.event_rate = event_rate
+        self.event_count = event_count
+        self.drop_probability = drop_probability
+        self.ring_size = ring_size
+        self.stream = uuid.uuid4().hex[:8]
+        self.received = Counter()
+        self.counters = Counter()
+        self.seats = {}
+        self.policy = {'mode': 'off', 'names': [], 'interval': None}
+        self.peer_key = os.urandom(32)
+        self.peer_addresses = {}
+        self.reconciled = {}
+        self.sender = None
+        if multicast:
+            group, port = multicast.rsplit(':', 1)
+            self.sender = MulticastSender(group, int(port), os.urandom(32), interface='127.0.0.1')
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/api/status', self.status)
+        app.router.add_post('/api/login', self.login)
+        app.router.add_post('/api/session/start', self.session_start)
+        app.router.add_post('/api/session/login_start', self.login_start)
+        app.router.add_get('/ws', self.websocket)
+        app.router.add_get('/stats', self.stats)
+        app.router.add_post('/api/broadcast', self.broadcast)
+        app.router.add_post('/api/peer/reconcile', self.reconcile)
+        app.router.add_post('/api/profile', self.profile_upload)
+        app.router.add_post('/api/logout', self.logout)
+        if self.virtual_clock:
+            app.router.add_post('/api/clock', self.advance_clock)
+        if self.sender:
+            app.on_startup.append(self._start_heartbeat)
+        return app
+
+    async def _start_heartbeat(self, app):
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(2)
+                self.sender.heartbeat()
+        asyncio.ensure_future(heartbeat())
+
+    async def broadcast(self, request):
+        """One datagram for the seats on the channel, WS for the rest"""
+        payload = await request.json()
+        self.counters['broadcasts'] += 1
+        if self.sender:
+            self.sender.send(payload)
+        for seat in self.seats.values():
+            if seat.ws is not None and not seat.multicast:
+                self.counters['broadcasts_unicast'] += 1
+                await seat.ws.send_json(payload)
+        return web.json_response({'success': True, 'seq': self.sender.seq if self.sender else None})
+
+    def now(self):
+        return time.time() + self.skew
+
+    async def advance_clock(self, request):
+        data = await request.json()
+        self.skew += float(data.get('advance', 0))
+        self.counters['clock_advances'] += 1
+        return web.json_response({'success': True, 'skew': self.skew, 'now': self.now()})
+
+    async def status(self, request):
+        return web.json_response({'status': 'ok', 'seats': sum(1 for s in self.seats.values() if s.ws)})
+
+    def _start_session(self, computer_id, minutes=None):
+        minutes = minutes or self.session_minutes
+        session = {
+            'session_id': uuid.uuid4().hex[:12],
+            'minutes': minutes,
+            'expires_at': self.now() + minutes * 60,
+            'resume_token': uuid.uuid4().hex,
+        }
+        self.sessions[computer_id] = session
+        return session
+
+    async def login(self, request):
+        data = await request.json()
+        self.counters['logins'] += 1
+        session = self._start_session(data.get('computer_id', ''))
+        return web.json_response(dict(session, success=True, user_id=data.get('username', '')))
+
+    async def logout(self, request):
+        data = await request.json()
+        self.counters['logouts'] += 1
+        for computer_id, session in list(self.sessions.items()):
+            if session['session_id'] == data.get('session_id'):
+                del self.sessions[computer_id]
+        return web.json_response({'success': True})
+
+    async def session_start(self, request):
+        data = await request.json()
+        self.counters['session_starts'] += 1
+        if not data.get('user_id'):
+            return web.json_response({'success': False, 'message': 'user_id required'})
+        session = self._start_session(data.get('computer_id', ''), int(data.get('duration_minutes') or 0))
+        return web.json_response(dict(session, success=True))
+
+    async def login_start(self, request):
+        data = await request.json()
+        self.counters['login_starts'] += 1
+        if not data.get('username'):
+            return web.json_response({'success': False, 'message': 'Invalid credentials'})
+        session = self._start_session(data.get('computer_id', ''))
+        return web.json_response(dict(session, success=True, user_id=data['username'], policy=self.policy))
+
+    def _welcome(self, computer_id, token):
+        session = self.sessions.get(computer_id)
+        resumed = session is not None and token == session['resume_token'] and session['expires_at'] > self.now()
+        if resumed:
+            self.counters['resumes'] += 1
+        return {
+            'type': 'welcome',
+            'status': 'ok',
+            'server_time': self.now(),
+            'session': {k: session[k] for k in ('session_id', 'minutes', 'expires_at')} if resumed else None,
+            'resume_token': session['resume_token'] if resumed else None,
+            'client_acks': True,
+        }
+
+    async def reconcile(self, request):
+        data = await request.json()
+        accepted = []
+        for entry in data.get('entries', []):
+            if entry.get('id') in self.reconciled:
+                self.counters['reconcile_duplicates'] += 1
+                continue
+            self.reconciled[entry['id']] = entry
+            accepted.append(entry['id'])
+        self.counters['reconciled'] += len(accepted)
+        return web.json_response({'success': True, 'accepted': accepted})
+
+    async def profile_upload(self, request):
+        """Counts the uploaded profile files and their bytes; keeps nothing"""
+        reader = await request.multipart()
+        async for part in reader:
+            size = len(await part.read())
+            if part.filename:
+                self.counters['profile_files'] += 1
+                self.counters['profile_bytes'] += size
+        return web.json_response({'success': True})
+
+    def _peer_config(self, computer_id, host):
+        self.peer_addresses[computer_id] = host
+        others = [cid for cid in self.peer_addresses if cid != computer_id]
+        seeds = [[cid, self.peer_addresses[cid], 47800] for cid in random.sample(others, min(8, len(others)))]
+        return {'type': 'peer_config', 'key': self.peer_key.hex(), 'port': 47800, 'seeds': seeds}
+
+    async def stats(self, request):
+        return web.json_response({
+            'received': dict(self.received),
+            'counters': dict(self.counters),
+            'events': {cid: {'seq': s.seq, 'acked': s.acked} for cid, s in self.seats.items()},
+        })
+
+    def _seat(self, computer_id):
+        seat = self.seats.get(computer_id)
+        if seat is None:
+            seat = self.seats[computer_id] = SeatEvents(self.ring_size)
+        return seat
+
+    async def _attach(self, seat, ws, transport, stream, last_seq):
+        """Make ws the seat's connection, replaying what it missed"""
+        resume = stream == self.stream and last_seq is not None
+        start = int(last_seq) if resume else seat.seq
+        replay = seat.since(start) if resume else []
+        if replay is None:
+            self.counters['resets'] += 1
+            start = seat.seq
+        await ws.send_json({'type': 'event_stream', 'stream': self.stream, 'since': start,
+                            'reset': replay is None})
+
+        # Events emitted while replaying are picked up by the next pass; the
+        # seat only goes live once there is nothing left to send
+        sent = start
+        while True:
+            pending = seat.since(sent)
+            if not pending:
+                break
+            for seq, text in pending:
+                await ws.send_str(text)
+                sent = seq
+                self.counters['events_replayed'] += 1
+        seat.ws, seat.transport = ws, transport
+
+        if self.event_rate and seat.generator is None:
+            seat.generator = asyncio.ensure_future(self._generate(seat))
+
+    async def _generate(self, seat):
+        tick = 0.01
+        emitted = 0
+        started = time.perf_counter()
+        while emitted < self.event_count:
+            await asyncio.sleep(tick)
+            due = min(int((time.perf_counter() - started) * self.event_rate), self.event_count)
+            while emitted < due:
+                emitted += 1
+                text = seat.emit({'type': 'time_update', 'minutes': emitted})
+                self.counters['events_emitted'] += 1
+                ws = seat.ws
+                if ws is None or ws.closed:
+                    continue
+                try:
+                    await ws.send_str(text)
+                except ConnectionError:
+                    seat.ws = None
+                    continue
+                if self.drop_probability and random.random() < self.drop_probability:
+                    self.counters['drops'] += 1
+                    seat.ws = None
+                    seat.transport.abort()
+
+    async def websocket(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        computer_id = request.query.get('computer_id', '')
+        standby = request.query.get('standby') == '1'
+        self.counters['standby_connections' if standby else 'connections'] += 1
+        seat = self._seat(computer_id)
+        out_stream = request.query.get('out_stream')
+        if not standby:
+            caps = request.query.get('caps', '')
+            if caps:
+                await ws.send_json(self._welcome(computer_id, request.query.get('resume')))
+            seat.multicast = self.sender is not None and 'broadcast' in caps.split(',')
+            if seat.multicast:
+                await ws.send_json(self.sender.channel_info())
+            if 'peer' in caps.split(','):
+                await ws.send_json(self._peer_config(computer_id, request.remote))
+            await self._attach(seat, ws, request.transport,
+                               request.query.get('stream'), request.query.get('last_seq'))
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                data = json.loads(msg.data)
+                kind = data.get('type')
+                cseq = data.get('cseq')
+                if cseq is not None:
+                    if seat.out_stream != out_stream:
+                        seat.out_stream, seat.cseq = out_stream, 0
+                    if cseq <= seat.cseq:
+                        self.counters['client_duplicates'] += 1
+                        await ws.send_json({'type': 'client_ack', 'cseq': seat.cseq})
+                        continue
+                    seat.cseq = cseq
+                    await ws.send_json({'type': 'client_ack', 'cseq': cseq})
+                self.received[kind] += 1
+                if kind == 'clock_sync':
+                    now = self.now()
+                    await ws.send_json({'type': 'clock_sync', 't0': data.get('t0'), 't1': now, 't2': now})
+                elif kind == 'ack':
+                    seat.acked = max(seat.acked, int(data.get('seq', 0)))
+                elif kind == 'broadcast_resend' and self.sender:
+                    self.counters['broadcast_resends'] += 1
+                    await ws.send_json(self.sender.replay(int(data.get('from', 0)), int(data.get('to', 0))))
+                elif kind == 'broadcast_leave':
+                    seat.multicast = False
+                elif kind == 'standby_promote' and standby:
+                    standby = False
+                    self.counters['promotions'] += 1
+                    await self._attach(seat, ws, request.transport, data.get('stream'), data.get('last_seq'))
+        finally:
+            if seat.ws is ws:
+                seat.ws = None
+        return ws
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in NetCafe server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--event-rate', type=float, default=0, help='events per second per seat')
+    parser.add_argument('--event-count', type=int, default=0)
+    parser.add_argument('--drop-probability', type=float, default=0.0)
+    parser.add_argument('--ring-size', type=int, default=4096)
+    parser.add_argument('--session-minutes', type=int, default=60)
+    parser.add_argument('--multicast', help='GROUP:PORT for the broadcast channel')
+    parser.add_argument('--tls-cert', help='serve over TLS with this certificate (PEM)')
+    parser.add_argument('--tls-key', help='private key for --tls-cert')
+    parser.add_argument('--virtual-clock', action='store_true', help='let POST /api/clock advance the clock')
+    args = parser.parse_args()
+    ssl_context = None
+    if args.tls_cert:
+        ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ssl_context.load_cert_chain(args.tls_cert, args.tls_key)
+    server = StandInServer(args.event_rate, args.event_count, args.drop_probability, args.ring_size,
+                           args.session_minutes, args.multicast, args.virtual_clock)
+    web.run_app(server.app(), host=args.host, port=args.port, ssl_context=ssl_context, print=None)
+
+
+if __name__ == '__main__':
+    main()
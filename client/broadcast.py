@@ -0,0 +1,321 @@
+"""
+LAN multicast channel for cafe-wide broadcasts.
+
+Admin broadcasts (closing time, price changes, config pushes) would
+otherwise go out as one WebSocket message per seat. On the multicast
+channel the server sends each broadcast once, as a single UDP datagram
+to a group every seat has joined, next to its WS connection. A frame is
+
+    magic(4) | stream(8) | seq(8) | sent_at(8) | payload JSON | HMAC-SHA256(32)
+
+The HMAC key is handed out over the seat's authenticated WS in
+``broadcast_channel`` together with the group, the port and the current
+position, so only frames from the server are trusted. seq increases by
+one per broadcast within a stream, and a new stream id (server restart)
+starts the numbering over. Only ``broadcast_channel`` switches a seat to
+a new stream: a signed frame can be captured and sent again by anyone on
+the LAN, so frames from any other stream are dropped, as are frames sent
+more than ``max_age`` seconds ago (by the server's clock) and, in the
+client, payloads of a type not in BROADCAST_TYPES. Every few seconds the server also sends a
+heartbeat frame with an empty payload and the latest seq, so a seat
+notices when it missed the most recent broadcast too.
+
+Multicast is best effort. A seat that sees a gap holds the frames after
+it and asks for the missing range over its WS (``broadcast_resend``).
+The server answers with ``broadcast_replay`` over unicast, and the held
+frames are delivered in order once the gap is filled. If no answer comes
+within resend_timeout, the gap is counted as lost and delivery goes on.
+
+Payloads are ordinary server messages, without a ``seq`` of their own:
+that belongs to the per-seat event stream (see event_seq.py).
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import socket
+import struct
+import time
+from collections import deque
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NCB1'
+HEADER = struct.Struct('!4sQQd')
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+# What a broadcast may carry: a replayed frame is still signed, so nothing
+# that acts on the seat or its session is accepted this way
+BROADCAST_TYPES = frozenset(('announcement', 'process_policy'))
+
+
+class BroadcastError(ValueError):
+    """Raised for a datagram that isn't a valid, correctly signed frame"""
+
+
+def encode_frame(key, stream, seq, payload, sent_at=None):
+    """Signed frame for payload (a dict), or a heartbeat for None"""
+    body = json.dumps(payload, separators=(',', ':')).encode() if payload is not None else b''
+    data = HEADER.pack(MAGIC, stream, seq, time.time() if sent_at is None else sent_at) + body
+    return data + hmac.new(key, data, hashlib.sha256).digest()
+
+
+def decode_frame(key, datagram):
+    """Verify a frame, returns (stream, seq, sent_at, payload or None)"""
+    if len(datagram) < HEADER.size + SIGNATURE_SIZE:
+        raise BroadcastError('frame too short')
+    data, signature = datagram[:-SIGNATURE_SIZE], datagram[-SIGNATURE_SIZE:]
+    if not hmac.compare_digest(signature, hmac.new(key, data, hashlib.sha256).digest()):
+        raise BroadcastError('bad signature')
+    magic, stream, seq, sent_at = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise BroadcastError(f"unknown frame version {magic!r}")
+    body = data[HEADER.size:]
+    if not body:
+        return stream, seq, sent_at, None
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise BroadcastError('payload is not JSON')
+    if not isinstance(payload, dict):
+        raise BroadcastError('payload is not an object')
+    return stream, seq, sent_at, payload
+
+
+class BroadcastReceiver:
+    """Verifies, orders and gap-fills one seat's broadcast frames
+
+    ``deliver(seq, payload, sent_at)`` is called once per broadcast, in
+    seq order. ``request_resend(stream, first, last)`` asks the server
+    for a missing range over the WS. Doesn't do any I/O itself; the
+    owner calls expire() once gap_deadline has passed. ``server_time``
+    is the server's clock, which frames' sent_at are checked against.
+    """
+
+    def __init__(self, key, deliver, request_resend, resend_timeout=2.0, max_held=1024, clock=time.monotonic,
+                 server_time=time.time, max_age=60.0):
+        self.key = key
+        self.deliver = deliver
+        self.request_resend = request_resend
+        self.resend_timeout = resend_timeout
+        self.max_held = max_held
+        self.clock = clock
+        self.server_time = server_time
+        self.max_age = max_age
+        self.stream = None
+        self.last_seq = 0
+        self.latest = 0
+        self.held = {}
+        self.gap_deadline = None
+        self.delivered = 0
+        self.duplicates = 0
+        self.overflow = 0
+        self.invalid = 0
+        self.rejected = 0
+        self.recovered = 0
+        self.lost = 0
+        self.resends = 0
+
+    def start(self, stream, seq):
+        """Position from broadcast_channel: broadcasts after seq are expected"""
+        if stream != self.stream:
+            self.stream = stream
+            self.last_seq = self.latest = seq
+            self.held.clear()
+            self.gap_deadline = None
+        elif seq > self.latest:
+            # Rejoined after a disconnect, the broadcasts missed meanwhile
+            # are resent like any other gap
+            self.latest = seq
+            self._advance()
+
+    def feed(self, datagram):
+        """Handle one datagram from the multicast group"""
+        try:
+            stream, seq, sent_at, payload = decode_frame(self.key, datagram)
+        except BroadcastError as e:
+            if not self.invalid:
+                logger.warning(f"Ignoring broadcast frame: {e}")
+            self.invalid += 1
+            return
+        if stream != self.stream or self.server_time() - sent_at > self.max_age:
+            # Another stream's or an old frame: replayed, or sent before a
+            # server restart the seat hasn't heard of over the WS yet
+            if not self.rejected:
+                logger.warning(f"Ignoring broadcast #{seq} from stream {stream:x}, sent at {sent_at:.0f}")
+            self.rejected += 1
+            return
+        if payload is None:
+            self.latest = max(self.latest, seq)
+        else:
+            self._accept(seq, payload, sent_at)
+        self._advance()
+
+    def replay(self, stream, frames):
+        """Handle broadcast_replay: [(seq, payload, sent_at), ...] resent over the WS"""
+        if stream != self.stream:
+            return
+        for seq, payload, sent_at in frames:
+            if seq > self.last_seq and seq not in self.held:
+                self.recovered += 1
+            self._accept(seq, payload, sent_at)
+        self._advance()
+
+    def expire(self):
+        """Give up on a gap the server didn't fill within resend_timeout"""
+        if self.gap_deadline is None or self.clock() < self.gap_deadline:
+            return
+        target = min(self.held) - 1 if self.held else self.latest
+        lost = target - self.last_seq
+        self.lost += lost
+        logger.warning(f"{lost} broadcasts after #{self.last_seq} were not resent and are lost")
+        self.last_seq = target
+        self.gap_deadline = None
+        self._advance()
+
+    def _accept(self, seq, payload, sent_at):
+        if seq <= self.last_seq or seq in self.held:
+            self.duplicates += 1
+            return
+        self.latest = max(self.latest, seq)
+        if len(self.held) >= self.max_held:
+            # Recovered through the resend, or counted lost with the gap
+            self.overflow += 1
+            return
+        self.held[seq] = (payload, sent_at)
+
+    def _advance(self):
+        start = self.last_seq
+        while self.last_seq + 1 in self.held:
+            self.last_seq += 1
+            payload, sent_at = self.held.pop(self.last_seq)
+            self.delivered += 1
+            self.deliver(self.last_seq, payload, sent_at)
+        if self.latest <= self.last_seq or self.last_seq > start:
+            # Caught up, or the gap asked for is filled and any further one
+            # gets its own request
+            self.gap_deadline = None
+        if self.latest <= self.last_seq:
+            return
+        if self.gap_deadline is None:
+            # Ask for everything up to the next frame we already hold; the
+            # rest of a wider gap is asked for once that is filled
+            last = min(self.held) - 1 if self.held else self.latest
+            self.resends += 1
+            self.gap_deadline = self.clock() + self.resend_timeout
+            self.request_resend(self.stream, self.last_seq + 1, last)
+
+
+class MulticastListener(asyncio.DatagramProtocol):
+    """Feeds datagrams from the group to a BroadcastReceiver
+
+    Gap expiry runs on ``timers`` (the client's TimerWheel), or on a wheel
+    of its own.
+    """
+
+    def __init__(self, receiver, timers=None):
+        self.receiver = receiver
+        self.timers = timers if timers is not None else TimerWheel()
+        self.transport = None
+        self._expire_handle = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.receiver.feed(data)
+        self.schedule_expiry()
+
+    def schedule_expiry(self):
+        """Call after replay() too: arms the timer for a newly opened gap"""
+        deadline = self.receiver.gap_deadline
+        if deadline is None or self._expire_handle is not None:
+            return
+        delay = max(0.0, deadline - self.receiver.clock())
+        self._expire_handle = self.timers.call_later(delay, self._expire)
+
+    def _expire(self):
+        self._expire_handle = None
+        self.receiver.expire()
+        self.schedule_expiry()
+
+    def close(self):
+        if self._expire_handle is not None:
+            self._expire_handle.stop()
+            self._expire_handle = None
+        if self.transport is not None:
+            self.transport.close()
+
+
+def multicast_socket(group, port, interface='0.0.0.0'):
+    """UDP socket bound to port and joined to group on interface"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, 'SO_REUSEPORT'):
+        # Lets several listeners share the port, as on a test host
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('', port))
+    membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton(interface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    sock.setblocking(False)
+    return sock
+
+
+async def open_listener(receiver, group, port, interface='0.0.0.0', timers=None):
+    """Join group and start feeding receiver, returns the MulticastListener"""
+    loop = asyncio.get_event_loop()
+    _, listener = await loop.create_datagram_endpoint(
+        lambda: MulticastListener(receiver, timers), sock=multicast_socket(group, port, interface))
+    return listener
+
+
+class MulticastSender:
+    """Server side of the channel: one datagram per broadcast
+
+    Keeps the last history_size broadcasts to answer broadcast_resend.
+    """
+
+    def __init__(self, group, port, key, interface='0.0.0.0', ttl=1, history_size=4096, stream=None):
+        self.group = (group, port)
+        self.key = key
+        self.stream = stream if stream is not None else int.from_bytes(os.urandom(8), 'big')
+        self.seq = 0
+        self.history = deque(maxlen=history_size)
+        self.sent = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+    def channel_info(self):
+        """broadcast_channel message for a seat joining now"""
+        return {'type': 'broadcast_channel', 'group': self.group[0], 'port': self.group[1],
+                'key': self.key.hex(), 'stream': self.stream, 'seq': self.seq}
+
+    def send(self, payload):
+        self.seq += 1
+        sent_at = time.time()
+        self.history.append((self.seq, payload, sent_at))
+        self._send(encode_frame(self.key, self.stream, self.seq, payload, sent_at))
+        return self.seq
+
+    def heartbeat(self):
+        self._send(encode_frame(self.key, self.stream, self.seq, None))
+
+    def replay(self, first, last):
+        """broadcast_replay message for a broadcast_resend request"""
+        frames = [{'seq': seq, 'payload': payload, 'sent_at': sent_at}
+                  for seq, payload, sent_at in self.history if first <= seq <= last]
+        return {'type': 'broadcast_replay', 'stream': self.stream, 'frames': frames}
+
+    def _send(self, frame):
+        self.sock.sendto(frame, self.group)
+        self.sent += 1
+
+    def close(self):
+        self.sock.close()
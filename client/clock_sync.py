@@ -0,0 +1,115 @@
+"""
+NTP-style clock synchronisation with the NetCafe server.
+
+The client sends ``{'type': 'clock_sync', 't0': ...}`` on the WebSocket and the
+server echoes it back with ``t1`` (receive time) and ``t2`` (send time) taken
+from its own clock. From each exchange we get one offset/RTT sample; the
+estimator keeps a small window of samples, drops the noisy ones (high RTT)
+and fits offset + drift so session deadlines sent as absolute server
+timestamps can be turned into a local countdown.
+
+Local timestamps come from the monotonic clock, put on the wall-clock
+scale by one anchor (wall - monotonic) taken when the estimator is made.
+The seat's wall clock being stepped by NTP or by hand then doesn't move
+the samples already in the window or the countdown; only the server's
+clock counts.
+"""
+
+import math
+import time
+from collections import deque
+
+# Quartz oscillators on commodity boards stay well inside this; anything
+# larger comes from jitter in a short sample window, not real drift.
+MAX_DRIFT = 500e-6
+
+
+class ClockSync:
+    """Estimates server clock offset, drift and round-trip time"""
+
+    def __init__(self, window=8, clock=time.monotonic, wall=time.time):
+        self.clock = clock
+        self.anchor = wall() - clock()
+        self.samples = deque(maxlen=window)
+        self.offset = 0.0
+        self.drift = 0.0
+        self.rtt = None
+        self._ref_time = 0.0
+
+    def make_request(self):
+        """Build a clock_sync request stamped with the local send time"""
+        return {'type': 'clock_sync', 't0': self.local_time()}
+
+    def handle_response(self, data):
+        """Feed a clock_sync reply from the server, returns True if accepted"""
+        try:
+            t0 = float(data['t0'])
+            t1 = float(data['t1'])
+            t2 = float(data['t2'])
+        except (KeyError, TypeError, ValueError):
+            return False
+        return self.add_sample(t0, t1, t2)
+
+    def add_sample(self, t0, t1, t2, t3=None):
+        """Add one exchange: t0/t3 are local send/receive, t1/t2 server receive/send"""
+        if t3 is None:
+            t3 = self.local_time()
+
+        rtt = (t3 - t0) - (t2 - t1)
+        if rtt < 0:
+            return False
+
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        self.samples.append((rtt, offset, (t0 + t3) / 2))
+        self._update_estimate()
+        return True
+
+    def _update_estimate(self):
+        # Like NTP's clock filter, trust the low-RTT half of the window: their
+        # offsets carry the least queueing asymmetry.
+        best = sorted(self.samples)[:max(1, (len(self.samples) + 1) // 2)]
+        self.rtt = best[0][0]
+
+        if len(best) < 2:
+            self.offset = best[0][1]
+            self.drift = 0.0
+            self._ref_time = best[0][2]
+            return
+
+        # Least-squares line offset(t) = offset + drift * (t - ref_time)
+        n = len(best)
+        mean_t = sum(s[2] for s in best) / n
+        mean_o = sum(s[1] for s in best) / n
+        var_t = sum((s[2] - mean_t) ** 2 for s in best)
+        if var_t > 0:
+            drift = sum((s[2] - mean_t) * (s[1] - mean_o) for s in best) / var_t
+        else:
+            drift = 0.0
+
+        self.offset = mean_o
+        self.drift = max(-MAX_DRIFT, min(MAX_DRIFT, drift))
+        self._ref_time = mean_t
+
+    def local_time(self):
+        """Monotonic time on the wall-clock scale of the anchor"""
+        return self.clock() + self.anchor
+
+    def offset_at(self, local_time):
+        """Server offset extrapolated to the given local time"""
+        return self.offset + self.drift * (local_time - self._ref_time)
+
+    def server_now(self):
+        """Current time on the server clock"""
+        now = self.local_time()
+        return now + self.offset_at(now)
+
+    def remaining(self, expires_at):
+        """Whole seconds left until an absolute server deadline"""
+        return max(0, math.ceil(expires_at - self.server_now()))
+
+    def reset(self):
+        self.samples.clear()
+        self.offset = 0.0
+        self.drift = 0.0
+        self.rtt = None
+        self._ref_time = 0.0
@@ -0,0 +1,94 @@
+"""
+Sequence-numbered server events.
+
+Every event the server pushes to a seat carries ``seq``, which increases
+by one per event within the server's event stream. The server keeps the
+latest events of each seat in a bounded ring buffer. When the client
+reconnects it presents the stream id and the last seq it processed
+(``stream`` and ``last_seq`` on the WS URL, or in ``standby_promote``),
+and the server replays what it missed. Presenting it also acknowledges
+everything up to it.
+
+The server opens every connection with ``event_stream`` (stream id and
+``since``, the seq the events that follow continue from). A different stream id (server restart, other host) means
+the old numbers don't apply, and ``reset`` means the gap was older than
+the ring buffer; in both cases the client starts counting from there.
+
+Acks are cumulative and batched: ``{'type': 'ack', 'seq': N}`` covers
+everything up to N. One is sent after ack_every events or ack_delay
+seconds after the first unacknowledged one, whichever comes first.
+"""
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class EventSequencer:
+    """Tracks the seat's position in the server event stream"""
+
+    def __init__(self, ack_every=64, ack_delay=0.25, clock=time.monotonic):
+        self.ack_every = ack_every
+        self.ack_delay = ack_delay
+        self.clock = clock
+        self.stream = None
+        self.last_seq = 0
+        self.acked = 0
+        self.duplicates = 0
+        self.missed = 0
+        self._unacked_since = None
+
+    def start_stream(self, stream, seq, reset=False):
+        """Handle the server's event_stream frame"""
+        if stream != self.stream:
+            if self.stream is not None:
+                logger.warning(f"Server event stream changed ({self.stream} -> {stream}), "
+                               f"events after #{self.last_seq} can't be replayed")
+            self.stream = stream
+            self.last_seq = self.acked = seq
+            self._unacked_since = None
+        elif reset and seq > self.last_seq:
+            lost = seq - self.last_seq
+            self.missed += lost
+            logger.warning(f"{lost} server events were no longer buffered and are lost")
+            self.last_seq = self.acked = seq
+            self._unacked_since = None
+
+    def accept(self, seq):
+        """Record an event's seq, returns False for one already processed"""
+        if seq <= self.last_seq:
+            self.duplicates += 1
+            return False
+        if seq > self.last_seq + 1 and self.stream is not None:
+            self.missed += seq - self.last_seq - 1
+            logger.warning(f"Server events #{self.last_seq + 1}-#{seq - 1} missing")
+        self.last_seq = seq
+        if self._unacked_since is None:
+            self._unacked_since = self.clock()
+        return True
+
+    @property
+    def pending(self):
+        return self.last_seq - self.acked
+
+    def ack_due(self):
+        pending = self.pending
+        return pending >= self.ack_every or (
+            pending > 0 and self.clock() - self._unacked_since >= self.ack_delay)
+
+    def make_ack(self):
+        self.acked = self.last_seq
+        self._unacked_since = None
+        return {'type': 'ack', 'seq': self.acked}
+
+    def resume_params(self):
+        """Where to resume after a reconnect, {} before the first event_stream"""
+        if self.stream is None:
+            return {}
+        return {'stream': self.stream, 'last_seq': self.last_seq}
+
+    def connection_lost(self):
+        # The resume parameters acknowledge everything processed so far
+        self.acked = self.last_seq
+        self._unacked_since = None
@@ -0,0 +1,228 @@
+"""
+On-disk HTTP cache for server metadata.
+
+Pricing, announcements, the game list and the lock-screen theme change a
+few times a day but are needed on every boot. Each response is stored on
+disk with its ETag / Last-Modified validators, and the next request for
+it is a conditional GET that usually comes back as an empty 304.
+
+Entries follow the response's Cache-Control (max-age,
+stale-while-revalidate, no-store). While an entry is fresh no request is
+made. While it is stale but within the stale-while-revalidate window, the
+cached body is returned immediately and revalidated in the background,
+so the lock screen can render from disk at boot before the server has
+even been reached. If revalidation fails, the stale body is still used.
+
+Entries are keyed by URL path, not by full URL, so the fallback hosts
+share them.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = 'http_cache'
+
+
+class CacheFetchError(Exception):
+    """Raised when a resource is neither cached nor fetchable"""
+
+
+class CacheEntry:
+    __slots__ = ('key', 'body', 'etag', 'last_modified', 'stored_at', 'max_age', 'stale_while_revalidate')
+
+    def __init__(self, key, body, etag=None, last_modified=None, stored_at=0.0, max_age=0,
+                 stale_while_revalidate=0):
+        self.key = key
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+
+    def fresh(self, now):
+        return now - self.stored_at < self.max_age
+
+    def usable(self, now):
+        """Fresh, or stale but still allowed to be served while revalidating"""
+        return now - self.stored_at < self.max_age + self.stale_while_revalidate
+
+    def json(self):
+        return json.loads(self.body)
+
+    def meta(self):
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'body'}
+
+
+def parse_cache_control(value):
+    """'max-age=60, no-cache' -> {'max-age': '60', 'no-cache': ''}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"')
+    return directives
+
+
+def _seconds(directives, name, default):
+    value = directives.get(name)
+    if value is None or not re.fullmatch(r'\d+', value):
+        return default
+    return int(value)
+
+
+class HTTPCache:
+    """Conditional-request cache in front of an async fetch callable
+
+    ``fetch(key, headers)`` performs a GET and returns
+    ``(status, headers, body)``, where headers supports case-insensitive
+    ``.get``. The client passes one that goes through its aiohttp session
+    and resolves the key against the current server.
+    """
+
+    def __init__(self, fetch, directory=CACHE_DIR, max_age=0, stale_while_revalidate=7 * 24 * 3600,
+                 clock=time.time):
+        self.fetch = fetch
+        self.directory = directory
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.clock = clock
+        self.entries = {}
+        self.stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'requests': 0, 'not_modified': 0,
+                      'errors': 0}
+        self._revalidating = {}
+
+    @classmethod
+    def from_config(cls, config, fetch):
+        return cls(fetch,
+                   directory=config.get('directory', CACHE_DIR),
+                   max_age=config.get('max_age', 0),
+                   stale_while_revalidate=config.get('stale_while_revalidate', 7 * 24 * 3600))
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def peek(self, key):
+        """Cached entry for key regardless of age, without any request"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry
+        path = self._path(key)
+        try:
+            with open(f'{path}.meta', 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(f'{path}.body', 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable cache entry for {key}: {e}")
+            return None
+        if meta.get('key') != key:
+            return None
+        entry = CacheEntry(body=body, **meta)
+        self.entries[key] = entry
+        return entry
+
+    def _store(self, entry):
+        self.entries[entry.key] = entry
+        path = self._path(entry.key)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Body first: a meta file always points at a complete body
+            for suffix, mode, data in (('.body', 'wb', entry.body),
+                                       ('.meta', 'w', json.dumps(entry.meta()))):
+                tmp_path = f'{path}{suffix}.tmp'
+                with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+                    f.write(data)
+                os.replace(tmp_path, f'{path}{suffix}')
+        except OSError as e:
+            logger.error(f"Failed to write cache entry for {entry.key}: {e}")
+
+    def _apply_cache_control(self, entry, headers):
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        entry.max_age = 0 if 'no-cache' in directives else _seconds(directives, 'max-age', self.max_age)
+        entry.stale_while_revalidate = _seconds(directives, 'stale-while-revalidate',
+                                                self.stale_while_revalidate)
+        return 'no-store' not in directives
+
+    async def revalidate(self, key):
+        """Conditional GET for key, returns (entry, changed)"""
+        cached = self.peek(key)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        self.stats['requests'] += 1
+        status, response_headers, body = await self.fetch(key, headers)
+        now = self.clock()
+
+        if status == 304 and cached is not None:
+            self.stats['not_modified'] += 1
+            cached.stored_at = now
+            if self._apply_cache_control(cached, response_headers):
+                self._store(cached)
+            return cached, False
+
+        if status != 200:
+            raise CacheFetchError(f"{key}: HTTP {status}")
+
+        entry = CacheEntry(key, body, response_headers.get('ETag'), response_headers.get('Last-Modified'), now)
+        if self._apply_cache_control(entry, response_headers):
+            self._store(entry)
+        else:
+            self.entries[key] = entry
+        return entry, cached is None or cached.body != body
+
+    async def get(self, key, on_update=None):
+        """Cached entry for key, fetching or revalidating as its age requires
+
+        ``on_update(entry)`` is called when a background revalidation
+        brings back a different body.
+        """
+        entry = self.peek(key)
+        now = self.clock()
+        if entry is not None and entry.fresh(now):
+            self.stats['hits'] += 1
+            return entry
+        if entry is not None and entry.usable(now):
+            self.stats['stale_hits'] += 1
+            if key not in self._revalidating:
+                self._revalidating[key] = asyncio.ensure_future(self._revalidate_in_background(key, on_update))
+            return entry
+
+        self.stats['misses'] += 1
+        try:
+            entry, _ = await self.revalidate(key)
+        except Exception as e:
+            self.stats['errors'] += 1
+            if entry is None:
+                raise CacheFetchError(f"{key}: {e}") from e
+            logger.warning(f"Serving expired {key} from cache: {e}")
+        return entry
+
+    async def _revalidate_in_background(self, key, on_update):
+        try:
+            entry, changed = await self.revalidate(key)
+            if changed and on_update is not None:
+                on_update(entry)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Background revalidation of {key} failed: {e}")
+        finally:
+            self._revalidating.pop(key, None)
+
+    async def drain(self):
+        """Wait for pending background revalidations"""
+        while self._revalidating:
+            await asyncio.gather(*list(self._revalidating.values()), return_exceptions=True)
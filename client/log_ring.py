@@ -0,0 +1,230 @@
+"""
+Recent log records in memory, and remote tails of them.
+
+LogRing is a logging handler that keeps the last ``capacity`` records in
+a deque. It sits on the root logger next to the file handler, so it
+sees records after the level check and before the throttle. It stores
+only the record's raw fields: no formatting, no lock, one tuple and one
+deque append per call. Messages are %-formatted and timestamps rendered
+only when someone asks for them.
+
+An admin asks with ``log_tail`` over the WS: a minimum level, a logger
+name (prefix match on the dotted name), a since/until time range in
+epoch seconds, and a limit. LogTail sends the matching records as
+JSON lines, zlib-compressed and base64'd in ``log_chunk`` frames of at
+most ``chunk_bytes`` raw bytes. With ``follow`` it keeps sending new
+matching records every ``flush_interval`` until the admin stops it, the
+duration runs out or the connection drops. Only then does the ring have
+followers. Without one, emitting a record checks an empty list and
+nothing more.
+"""
+
+import base64
+import json
+import logging
+import time
+import zlib
+from collections import deque
+from datetime import datetime
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+_TIME, _LEVEL, _NAME, _MSG, _ARGS, _EXC = range(6)
+
+
+class LogRing(logging.Handler):
+    """The last capacity log records, unformatted"""
+
+    def __init__(self, capacity=2000):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        self.followers = []
+
+    @property
+    def capacity(self):
+        return self.records.maxlen
+
+    def resize(self, capacity):
+        if capacity != self.records.maxlen:
+            self.records = deque(self.records, maxlen=capacity)
+
+    def handle(self, record):
+        # Instead of Handler.handle: the ring has no filters, and a deque
+        # append needs no lock
+        exc = None
+        if record.exc_info:
+            # Formatted now: the traceback holds frames alive
+            exc = record.exc_text or logging.Formatter().formatException(record.exc_info)
+        entry = (record.created, record.levelno, record.name, record.msg, record.args, exc)
+        self.records.append(entry)
+        if self.followers:
+            for follower in self.followers:
+                follower(entry)
+        return True
+
+    def emit(self, record):
+        self.handle(record)
+
+    def snapshot(self):
+        # deque.copy runs in C without releasing the GIL, so a record
+        # logged from another thread can't interrupt it
+        return self.records.copy()
+
+
+class TailFilter:
+    """Which records a tail wants"""
+
+    def __init__(self, level=logging.NOTSET, name=None, since=None, until=None):
+        self.level = level
+        self.name = name
+        self.prefix = f'{name}.' if name else None
+        self.since = since
+        self.until = until
+
+    def __call__(self, entry):
+        if entry[_LEVEL] < self.level:
+            return False
+        if self.name and entry[_NAME] != self.name and not entry[_NAME].startswith(self.prefix):
+            return False
+        if self.since is not None and entry[_TIME] < self.since:
+            return False
+        return self.until is None or entry[_TIME] <= self.until
+
+    @staticmethod
+    def level_number(level):
+        """'WARNING', 'warning' or 30; unknown names match everything"""
+        if isinstance(level, str):
+            level = logging.getLevelName(level.upper())
+        return level if isinstance(level, int) else logging.NOTSET
+
+
+def render(entry):
+    """One entry as a JSON object, in the shape JSONFormatter writes"""
+    msg = entry[_MSG]
+    if entry[_ARGS]:
+        try:
+            msg = msg % entry[_ARGS]
+        except (TypeError, ValueError):
+            msg = f'{msg} {entry[_ARGS]!r}'
+    line = {
+        'ts': datetime.fromtimestamp(entry[_TIME]).isoformat(timespec='milliseconds'),
+        'level': logging.getLevelName(entry[_LEVEL]),
+        'logger': entry[_NAME],
+        'msg': str(msg),
+    }
+    if entry[_EXC]:
+        line['exc'] = entry[_EXC]
+    return json.dumps(line, ensure_ascii=False, separators=(',', ':'))
+
+
+def encode_chunks(entries, chunk_bytes=32768):
+    """Yield (count, data) per chunk: up to chunk_bytes of JSON lines, deflated and base64'd"""
+    lines, size = [], 0
+    for entry in entries:
+        line = render(entry).encode('utf-8')
+        if lines and size + len(line) + 1 > chunk_bytes:
+            yield len(lines), _pack(lines)
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line) + 1
+    if lines:
+        yield len(lines), _pack(lines)
+
+
+def _pack(lines):
+    return base64.b64encode(zlib.compress(b'\n'.join(lines), 6)).decode('ascii')
+
+
+class LogTail:
+    """One admin's tail: the matching backlog, then new records while following"""
+
+    def __init__(self, ring, request_id, send, level=None, name=None, since=None, until=None,
+                 limit=None, follow=False, duration=300, chunk_bytes=32768, flush_interval=1.0,
+                 max_pending=5000, timers=None):
+        self.ring = ring
+        self.request_id = request_id
+        self.send = send
+        self.filter = TailFilter(TailFilter.level_number(level), name, since, until)
+        self.limit = limit
+        self.follow = follow and until is None
+        self.duration = duration
+        self.chunk_bytes = chunk_bytes
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.timers = timers
+        self.seq = 0
+        self.sent_records = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+        self._pending = []
+
+    def _collect(self, entry):
+        # Runs inside the logging call, possibly on another thread
+        if self.filter(entry):
+            if len(self._pending) < self.max_pending:
+                self._pending.append(entry)
+            else:
+                self.dropped += 1
+
+    async def run(self):
+        if self.follow:
+            # Followed before the snapshot is taken, so no record falls in
+            # between; the snapshot ends where following starts
+            self.ring.followers.append(self._collect)
+        try:
+            backlog = [e for e in self.ring.snapshot() if self.filter(e)]
+            if self.follow:
+                seen = set(map(id, backlog))
+                self._pending = [e for e in self._pending if id(e) not in seen]
+            if self.limit:
+                backlog = backlog[-self.limit:]
+            await self._send_entries(backlog, last=not self.follow)
+            if not self.follow:
+                return
+            if self.timers is None:
+                self.timers = TimerWheel()
+            deadline = time.monotonic() + self.duration
+            while time.monotonic() < deadline:
+                await self.timers.sleep(self.flush_interval, slack=self.flush_interval * 0.1)
+                await self._flush()
+            await self._send_entries([], last=True)
+        finally:
+            if self._collect in self.ring.followers:
+                self.ring.followers.remove(self._collect)
+
+    async def _flush(self):
+        pending, self._pending = self._pending, []
+        if pending:
+            await self._send_entries(pending, last=False)
+
+    async def _send_entries(self, entries, last):
+        # Encoded one chunk ahead of the send, so a big backlog doesn't
+        # hold the event loop for all of its chunks at once
+        chunks = encode_chunks(entries, self.chunk_bytes)
+        chunk = next(chunks, None)
+        if chunk is None and last:
+            chunk = (0, '')
+        while chunk is not None:
+            following = next(chunks, None)
+            count, data = chunk
+            frame = {'type': 'log_chunk', 'request_id': self.request_id, 'seq': self.seq,
+                     'count': count, 'data': data}
+            if last and following is None:
+                frame['last'] = True
+                if self.dropped:
+                    frame['dropped'] = self.dropped
+            self.seq += 1
+            self.sent_records += count
+            self.sent_bytes += len(data)
+            await self.send(frame)
+            chunk = following
+
+
+def decode_chunk(data):
+    """The JSON objects in a log_chunk's data, for the admin side and tests"""
+    if not data:
+        return []
+    text = zlib.decompress(base64.b64decode(data)).decode('utf-8')
+    return [json.loads(line) for line in text.split('\n')]
@@ -0,0 +1,185 @@
+"""
+Event-loop stall detection with the blocking stack.
+
+The session timer, the WebSocket and the UI all run on the one qasync
+loop. Anything that blocks it freezes them all: a QMessageBox or
+dialog.exec() from a coroutine, a slow synchronous file write, a long
+computation. LoopWatchdog finds out what it was.
+
+- On the loop, a beat callback runs every ``interval`` seconds. It
+  records how late it ran (the loop lag) and when.
+- A daemon helper thread checks the time since the last beat. Once it
+  exceeds ``threshold``, the thread takes the loop thread's current
+  stack with sys._current_frames(). The loop thread is stuck in that
+  stack right then.
+- The next beat ends the stall and passes a Stall to ``on_stall`` on
+  the loop thread. The Stall has the duration (the beat's lag, so up
+  to one interval short of the whole stall), the stack, the innermost
+  frame (where it blocked) and the innermost frame outside the standard
+  library and site-packages (the client code that called it).
+
+The stack is taken once per stall, at ``threshold``. A stall that moves
+on to something else after that is reported with its first blocker. A C
+call that holds the GIL also keeps the helper thread from running. Its
+stack is then taken as soon as the call returns, which is still inside
+the stalled callback in most cases.
+"""
+
+import logging
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_LIBRARY_PATHS = tuple({p for p in (sysconfig.get_paths().get(k) for k in ('stdlib', 'platstdlib', 'purelib',
+                                                                       'platlib')) if p})
+
+
+def _is_library(filename):
+    return filename.startswith(_LIBRARY_PATHS) or filename.startswith('<')
+
+
+class Stall:
+    __slots__ = ('duration', 'started', 'stack')
+
+    def __init__(self, duration, started, stack):
+        self.duration = duration
+        self.started = started
+        self.stack = stack
+
+    @property
+    def blocked_in(self):
+        """Innermost frame: the call that was blocking"""
+        return self.stack[-1] if self.stack else None
+
+    @property
+    def origin(self):
+        """Innermost frame in the client's own code"""
+        for frame in reversed(self.stack):
+            if not _is_library(frame.filename):
+                return frame
+        return self.blocked_in
+
+    @staticmethod
+    def where(frame):
+        return f'{frame.filename}:{frame.lineno} in {frame.name}' if frame else '?'
+
+    def to_dict(self, depth=12):
+        return {
+            'type': 'loop_stall',
+            'duration_ms': round(self.duration * 1000),
+            'started': self.started,
+            'blocked_in': self.where(self.blocked_in),
+            'origin': self.where(self.origin),
+            'stack': [f'{self.where(f)}: {f.line}' for f in self.stack[-depth:]],
+        }
+
+
+class LoopWatchdog:
+    """Loop lag and stall stacks for the event loop it is started on"""
+
+    def __init__(self, threshold=0.25, interval=0.1, on_stall=None, clock=time.monotonic, max_depth=40):
+        self.threshold = threshold
+        self.interval = interval
+        self.on_stall = on_stall
+        self.clock = clock
+        self.max_depth = max_depth
+        self.stalls = 0
+        self.stalled_seconds = 0.0
+        self.max_lag = 0.0
+        self._loop = None
+        self._handle = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._loop_thread = None
+        self._beats = 0
+        self._last_beat = None
+        self._due = None
+        # (beat number, wall time the stall began, stack) from the helper thread
+        self._captured = None
+
+    @classmethod
+    def from_config(cls, config, on_stall=None):
+        """Build from the 'loop_watchdog' config section, None if disabled"""
+        if not config.get('enabled', True):
+            return None
+        return cls(config.get('threshold', 0.25), config.get('interval', 0.1), on_stall)
+
+    def start(self, loop):
+        """Start watching loop; call from the loop's thread"""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._last_beat = self.clock()
+        self._schedule()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+    def take_max_lag(self):
+        """Worst loop lag in seconds since the last call"""
+        lag, self.max_lag = self.max_lag, 0.0
+        return lag
+
+    def _schedule(self):
+        self._due = self.clock() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def _beat(self):
+        now = self.clock()
+        self.max_lag = max(self.max_lag, now - self._due)
+        captured, self._captured = self._captured, None
+        if captured is not None and captured[0] == self._beats:
+            duration = now - self._due
+            self.stalls += 1
+            self.stalled_seconds += duration
+            self._report(Stall(duration, captured[1], captured[2]))
+        self._beats += 1
+        self._last_beat = now
+        self._schedule()
+
+    def _watch(self):
+        check = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(check):
+            beats = self._beats
+            if self._captured is not None or self.clock() - self._last_beat < self.threshold + self.interval:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=self.max_depth)
+            del frame
+            # A beat that ran meanwhile has ended the stall already
+            if beats == self._beats:
+                started = time.time() - (self.clock() - self._due)
+                self._captured = (beats, started, stack)
+
+    def _report(self, stall):
+        origin = stall.origin
+        blocked = stall.blocked_in
+        detail = Stall.where(origin)
+        if blocked is not origin:
+            detail += f' (blocked in {Stall.where(blocked)})'
+        logger.warning(f"Event loop stalled {stall.duration * 1000:.0f}ms at "
+                       f"{datetime.fromtimestamp(stall.started).isoformat(timespec='seconds')}: {detail}",
+                       extra={'log_key': f'loop_stall:{detail}'})
+        if self.on_stall:
+            try:
+                self.on_stall(stall)
+            except Exception as e:
+                logger.error(f"Stall handler failed: {e}")
+
+    def summary(self):
+        return f"{self.stalls} stalls, {self.stalled_seconds:.1f}s stalled in total"
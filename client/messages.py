@@ -0,0 +1,498 @@
+"""
+Typed WebSocket messages shared by every NetCafe client variant.
+
+Each server message type is a small ``__slots__`` dataclass registered under
+its ``type`` string. Frames are validated once, when they are decoded, so
+handlers receive well-formed objects instead of raw dicts. A
+MessageDispatcher maps message classes to handlers with a single dict
+lookup and keeps counters for unknown, invalid and unhandled messages
+instead of silently dropping them.
+"""
+
+import asyncio
+import json
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_TYPES = {}
+
+
+class MessageError(ValueError):
+    """Raised when a frame is well-formed JSON but not a valid message"""
+
+
+def message(type_name):
+    """Class decorator registering a message class under its wire type"""
+    def register(cls):
+        cls.type = type_name
+        MESSAGE_TYPES[type_name] = cls
+        return cls
+    return register
+
+
+def _number(data, key, default=None, cast=float):
+    value = data.get(key, default)
+    if value is None:
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        raise MessageError(f"{key} must be a number, got {value!r}")
+
+
+def _required(data, key, cast=float):
+    if key not in data:
+        raise MessageError(f"missing {key}")
+    return _number(data, key, cast=cast)
+
+
+@message('force_logout')
+@dataclass
+class ForceLogout:
+    __slots__ = ('message',)
+    message: str
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(str(data.get('message') or 'Your session was ended by administrator.'))
+
+
+@message('time_update')
+@dataclass
+class TimeUpdate:
+    __slots__ = ('minutes', 'expires_at')
+    minutes: int
+    expires_at: Optional[float]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(_number(data, 'minutes', 0, int), _number(data, 'expires_at'))
+
+
+@message('session_deadline')
+@dataclass
+class SessionDeadline:
+    __slots__ = ('expires_at', 'minutes')
+    expires_at: float
+    minutes: int
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(_required(data, 'expires_at'), _number(data, 'minutes', 0, int))
+
+
+@dataclass
+class SessionInfo:
+    __slots__ = ('computer_id', 'duration_minutes')
+    computer_id: str
+    duration_minutes: int
+
+
+@message('session_update')
+@dataclass
+class SessionUpdate:
+    __slots__ = ('sessions',)
+    sessions: Tuple[SessionInfo, ...]
+
+    @classmethod
+    def from_dict(cls, data):
+        sessions = data.get('sessions') or []
+        if not isinstance(sessions, list):
+            raise MessageError('sessions must be a list')
+        try:
+            return cls(tuple(
+                SessionInfo(str(s['computer_id']), int(s.get('duration_minutes') or 0))
+                for s in sessions
+            ))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            raise MessageError(f"bad session entry: {e!r}")
+
+    def for_computer(self, computer_id):
+        for session in self.sessions:
+            if session.computer_id == computer_id:
+                return session
+        return None
+
+
+@message('clock_sync')
+@dataclass
+class ClockSyncReply:
+    __slots__ = ('t0', 't1', 't2')
+    t0: float
+    t1: float
+    t2: float
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(_required(data, 't0'), _required(data, 't1'), _required(data, 't2'))
+
+
+@message('telemetry_watch')
+@dataclass
+class TelemetryWatch:
+    __slots__ = ('active', 'interval')
+    active: bool
+    interval: Optional[float]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(bool(data.get('active')), _number(data, 'interval'))
+
+
+@message('process_policy')
+@dataclass
+class ProcessPolicyUpdate:
+    __slots__ = ('mode', 'names', 'interval')
+    mode: str
+    names: Tuple[str, ...]
+    interval: Optional[float]
+
+    @classmethod
+    def from_dict(cls, data):
+        mode = data.get('mode', 'off')
+        if mode not in ('off', 'blacklist', 'whitelist'):
+            raise MessageError(f"unknown policy mode {mode!r}")
+        names = data.get('names') or []
+        if not isinstance(names, list):
+            raise MessageError('names must be a list')
+        return cls(mode, tuple(str(n) for n in names), _number(data, 'interval'))
+
+
+@message('thumbnail_request')
+@dataclass
+class ThumbnailRequest:
+    __slots__ = ('active', 'interval', 'max_bytes_per_sec')
+    active: bool
+    interval: Optional[float]
+    max_bytes_per_sec: Optional[int]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(bool(data.get('active')), _number(data, 'interval'),
+                   _number(data, 'max_bytes_per_sec', cast=int))
+
+
+@message('event_stream')
+@dataclass
+class EventStreamInfo:
+    # 'since', not 'seq': a seq would make this frame an event itself
+    __slots__ = ('stream', 'since', 'reset')
+    stream: str
+    since: int
+    reset: bool
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data.get('stream'):
+            raise MessageError('missing stream')
+        return cls(str(data['stream']), _required(data, 'since', int), bool(data.get('reset')))
+
+
+@dataclass
+class SessionState:
+    __slots__ = ('session_id', 'minutes', 'expires_at')
+    session_id: str
+    minutes: int
+    expires_at: Optional[float]
+
+
+@message('welcome')
+@dataclass
+class Welcome:
+    """First frame of the combined connect handshake"""
+    __slots__ = ('status', 'server_time', 'session', 'resume_token', 'client_acks')
+    status: str
+    server_time: Optional[float]
+    session: Optional[SessionState]
+    resume_token: Optional[str]
+    client_acks: bool
+
+    @classmethod
+    def from_dict(cls, data):
+        session = data.get('session')
+        if session is not None:
+            if not isinstance(session, dict):
+                raise MessageError('session must be an object')
+            session = SessionState(str(session.get('session_id') or ''), _number(session, 'minutes', 0, int),
+                                   _number(session, 'expires_at'))
+        token = data.get('resume_token')
+        return cls(str(data.get('status') or 'ok'), _number(data, 'server_time'), session,
+                   str(token) if token else None, bool(data.get('client_acks')))
+
+
+@message('client_ack')
+@dataclass
+class ClientAck:
+    """The server has every client message up to cseq, see standby.py"""
+    __slots__ = ('cseq',)
+    cseq: int
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(_required(data, 'cseq', int))
+
+
+@message('broadcast_channel')
+@dataclass
+class BroadcastChannel:
+    """Multicast group to join for cafe-wide broadcasts, see broadcast.py"""
+    __slots__ = ('group', 'port', 'key', 'stream', 'seq', 'resend_timeout')
+    group: str
+    port: int
+    key: bytes
+    stream: int
+    seq: int
+    resend_timeout: Optional[float]
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            key = bytes.fromhex(str(data.get('key') or ''))
+        except ValueError:
+            raise MessageError('key must be hex')
+        if not key:
+            raise MessageError('missing key')
+        return cls(str(data.get('group') or ''), _required(data, 'port', int), key,
+                   _required(data, 'stream', int), _number(data, 'seq', 0, int), _number(data, 'resend_timeout'))
+
+
+@message('broadcast_replay')
+@dataclass
+class BroadcastReplay:
+    """Broadcasts resent over the WS after a gap on the multicast channel"""
+    __slots__ = ('stream', 'frames')
+    stream: int
+    frames: Tuple[Tuple[int, dict, float], ...]
+
+    @classmethod
+    def from_dict(cls, data):
+        frames = data.get('frames') or []
+        if not isinstance(frames, list):
+            raise MessageError('frames must be a list')
+        parsed = []
+        for frame in frames:
+            if not isinstance(frame, dict) or not isinstance(frame.get('payload'), dict):
+                raise MessageError('frame must be an object with a payload object')
+            parsed.append((_required(frame, 'seq', int), frame['payload'], _number(frame, 'sent_at', 0.0)))
+        return cls(_required(data, 'stream', int), tuple(parsed))
+
+
+@message('peer_config')
+@dataclass
+class PeerConfig:
+    """Key and seeds for LAN peer mode, see peer_mode.py"""
+    __slots__ = ('key', 'port', 'seeds')
+    key: bytes
+    port: Optional[int]
+    seeds: Tuple[Tuple[str, str, int], ...]
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            key = bytes.fromhex(str(data.get('key') or ''))
+        except ValueError:
+            raise MessageError('key must be hex')
+        if not key:
+            raise MessageError('missing key')
+        seeds = data.get('seeds') or []
+        if not isinstance(seeds, list) or not all(isinstance(s, list) and len(s) == 3 for s in seeds):
+            raise MessageError('seeds must be a list of [id, host, port]')
+        try:
+            seeds = tuple((str(i), str(h), int(p)) for i, h, p in seeds)
+        except (TypeError, ValueError):
+            raise MessageError('seed port must be a number')
+        return cls(key, _number(data, 'port', None, int), seeds)
+
+
+@message('log_tail')
+@dataclass
+class LogTailRequest:
+    """Admin request for the seat's recent log records, see log_ring.py"""
+    __slots__ = ('request_id', 'active', 'level', 'logger', 'since', 'until', 'limit', 'follow', 'duration')
+    request_id: str
+    active: bool
+    level: Optional[str]
+    logger: Optional[str]
+    since: Optional[float]
+    until: Optional[float]
+    limit: Optional[int]
+    follow: bool
+    duration: Optional[float]
+
+    @classmethod
+    def from_dict(cls, data):
+        if not data.get('request_id'):
+            raise MessageError('missing request_id')
+        level = data.get('level')
+        return cls(str(data['request_id']), bool(data.get('active', True)),
+                   str(level) if level is not None else None, data.get('logger') or None,
+                   _number(data, 'since'), _number(data, 'until'), _number(data, 'limit', cast=int),
+                   bool(data.get('follow')), _number(data, 'duration'))
+
+
+@message('profile')
+@dataclass
+class ProfileCommand:
+    """Admin start/stop of a profiling session, see profiler.py"""
+    __slots__ = ('action', 'duration', 'upload', 'request_id')
+    action: str
+    duration: Optional[float]
+    upload: Optional[bool]
+    request_id: Optional[str]
+
+    @classmethod
+    def from_dict(cls, data):
+        action = data.get('action', 'start')
+        if action not in ('start', 'stop'):
+            raise MessageError(f"unknown profile action {action!r}")
+        upload = data.get('upload')
+        request_id = data.get('request_id')
+        return cls(action, _number(data, 'duration'), bool(upload) if upload is not None else None,
+                   str(request_id) if request_id else None)
+
+
+@message('announcement')
+@dataclass
+class Announcement:
+    __slots__ = ('text', 'level')
+    text: str
+    level: str
+
+    @classmethod
+    def from_dict(cls, data):
+        level = data.get('level', 'info')
+        if level not in ('info', 'warning', 'critical'):
+            raise MessageError(f"unknown level {level!r}")
+        return cls(str(data.get('text') or ''), level)
+
+
+class TrafficStats:
+    """Per message type frame and payload byte counters for both directions
+
+    Sizes are of the JSON text, before permessage-deflate on the way out and
+    after inflation on the way in: what the handlers deal with, not what
+    went over the wire.
+    """
+
+    def __init__(self):
+        self.frames_in = Counter()
+        self.payload_in = Counter()
+        self.frames_out = Counter()
+        self.payload_out = Counter()
+
+    def record_in(self, msg_type, size):
+        self.frames_in[msg_type] += 1
+        self.payload_in[msg_type] += size
+
+    def record_out(self, msg_type, size):
+        self.frames_out[msg_type] += 1
+        self.payload_out[msg_type] += size
+
+    def summary(self, top=5):
+        """One-line summary of the heaviest message types, inbound first"""
+        total_in = sum(self.payload_in.values())
+        total_out = sum(self.payload_out.values())
+        heaviest = ', '.join(
+            f"{msg_type}={size}B/{self.frames_in[msg_type]}"
+            for msg_type, size in self.payload_in.most_common(top)
+        )
+        return f"payload in {total_in}B [{heaviest}], out {total_out}B (uncompressed)"
+
+    def as_dict(self):
+        return {
+            'in': {t: {'frames': self.frames_in[t], 'payload_bytes': b} for t, b in self.payload_in.items()},
+            'out': {t: {'frames': self.frames_out[t], 'payload_bytes': b} for t, b in self.payload_out.items()},
+        }
+
+
+class MessageDispatcher:
+    """Decodes frames into message objects and routes them to handlers"""
+
+    def __init__(self, handlers=None):
+        self.handlers = {}
+        self.traffic = TrafficStats()
+        self.unknown = Counter()
+        self.invalid = Counter()
+        self.unhandled = Counter()
+        # Optional EventSequencer: drops events replayed after a reconnect
+        # that were already processed
+        self.sequencer = None
+        for cls, handler in (handlers or {}).items():
+            self.on(cls, handler)
+
+    def on(self, cls, handler):
+        self.handlers[cls] = (handler, asyncio.iscoroutinefunction(handler))
+
+    def parse(self, data):
+        """Validate a decoded dict, returns a message object or None"""
+        if not isinstance(data, dict):
+            self.invalid['<not an object>'] += 1
+            return None
+
+        seq = data.get('seq')
+        if seq is not None and self.sequencer is not None:
+            # bool is an int subclass, and "seq": true would read as 1
+            if not isinstance(seq, int) or isinstance(seq, bool):
+                self.invalid['<bad seq>'] += 1
+                return None
+            if not self.sequencer.accept(seq):
+                return None
+
+        msg_type = data.get('type')
+        cls = MESSAGE_TYPES.get(msg_type)
+        if cls is None:
+            if not self.unknown[msg_type]:
+                logger.warning(f"Unknown message type: {msg_type!r}")
+            self.unknown[msg_type] += 1
+            return None
+
+        try:
+            return cls.from_dict(data)
+        except MessageError as e:
+            self.invalid[msg_type] += 1
+            logger.error(f"Invalid {msg_type} message: {e}")
+            return None
+
+    def decode(self, text):
+        """Parse a raw text frame, returns a message object or None"""
+        try:
+            data = json.loads(text)
+        except (TypeError, ValueError):
+            self.invalid['<bad json>'] += 1
+            self.traffic.record_in('<bad json>', len(text or ''))
+            logger.error("Invalid WebSocket message")
+            return None
+        # Payload size after permessage-deflate inflation; JSON from the
+        # server is ASCII-escaped so characters == bytes
+        msg_type = data.get('type') if isinstance(data, dict) else None
+        self.traffic.record_in(msg_type if msg_type in MESSAGE_TYPES else '<unknown>', len(text))
+        return self.parse(data)
+
+    async def dispatch(self, msg):
+        entry = self.handlers.get(type(msg))
+        if entry is None:
+            self.unhandled[msg.type] += 1
+            return
+        handler, is_async = entry
+        if is_async:
+            await handler(msg)
+        else:
+            handler(msg)
+
+    async def handle(self, data):
+        """Parse and dispatch an already decoded dict"""
+        msg = self.parse(data)
+        if msg is not None:
+            await self.dispatch(msg)
+
+    def stats(self):
+        return {
+            'unknown': dict(self.unknown),
+            'invalid': dict(self.invalid),
+            'unhandled': dict(self.unhandled),
+            'traffic': self.traffic.as_dict(),
+        }
@@ -5,8 +5,10 @@ import json
 import logging
 from datetime import datetime
 import socket
+import time
 import uuid
 import traceback
+from urllib.parse import urlencode
 import ctypes
 import threading
 
@@ -14,25 +16,55 @@ from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QSystemTrayIcon, 
     QMenu, QPushButton, QLineEdit, QMessageBox, QDialog, QHBoxLayout
 )
-from PySide6.QtCore import Qt, QTimer, Signal, Slot
+from PySide6.QtCore import Qt, Signal, Slot
 from PySide6.QtGui import QIcon, QAction, QPixmap, QPainter
 import qasync
 import aiohttp
-import win32con
-import win32api
-import win32gui
+try:
+    import win32con
+    import win32api
+    import win32gui
+except ImportError:  # Non-Windows hosts (CI, replay harness)
+    win32con = win32api = win32gui = None
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('client.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+from clock_sync import ClockSync
+from ws_recorder import WSRecorder, INBOUND, OUTBOUND
+from seat_identity import load_computer_id
+from telemetry import TelemetryStreamer
+from process_watchdog import ProcessWatchdog, ProcessPolicy
+from screen_stream import ThumbnailStreamer, QtScreenSource
+from http_cache import HTTPCache, CacheFetchError
+from structured_log import setup_logging, log_ring
+from log_ring import LogTail
+from startup import StartupTimeline
+from standby import WarmStandby, Outbox
+from event_seq import EventSequencer
+from broadcast import BROADCAST_TYPES, BroadcastReceiver, open_listener
+from peer_mode import PeerNode
+from loop_watchdog import LoopWatchdog
+from profiler import Profiler
+from timer_wheel import TimerWheel
+from perf_ring import PerfSampler, DISCONNECTED, CONNECTING, CONNECTED, PEER, FLAG_SESSION, FLAG_STANDBY
+import tls
+from messages import (
+    MessageDispatcher, ClientAck, ForceLogout, TimeUpdate, SessionDeadline, SessionUpdate, ClockSyncReply,
+    MessageError, TelemetryWatch, ProcessPolicyUpdate, ThumbnailRequest, EventStreamInfo, Welcome,
+    BroadcastChannel, BroadcastReplay, Announcement, PeerConfig, LogTailRequest, ProfileCommand
 )
+
+# Configure logging (defaults until config.json is loaded)
+setup_logging()
 logger = logging.getLogger(__name__)
 
+# Announced in the WS upgrade so the server only sends what this client handles
+CAPABILITIES = ('welcome', 'event_seq', 'standby', 'telemetry', 'process_policy', 'thumbnails', 'client_ack')
+
+# Tray warnings by seconds left in the session
+SESSION_WARNINGS = (
+    (300, '⚠️ Time Warning', 'Your gaming session will end in 5 minutes!', QSystemTrayIcon.Warning),
+    (60, '🚨 Final Warning', 'Your gaming session will end in 1 minute!', QSystemTrayIcon.Critical),
+)
+
 class TimerOverlay(QWidget):
     def __init__(self):
         super().__init__()
@@ -127,7 +159,7 @@ class LockScreen(QWidget):
         layout = QVBoxLayout(self)
         
         # Logo
-        logo_label = QLabel('🎮 NetCafe Pro 2.0', self)
+        self.logo_label = logo_label = QLabel('🎮 NetCafe Pro 2.0', self)
         logo_label.setStyleSheet('''
             color: #00FF88; 
             font-size: 56px; 
@@ -165,6 +197,18 @@ class LockScreen(QWidget):
         self.details_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.details_label)
         
+        # Announcements (from the server, cached between boots)
+        self.announcement_label = QLabel('', self)
+        self.announcement_label.setStyleSheet('''
+            color: #FFD166;
+            font-size: 20px;
+            margin-top: 16px;
+        ''')
+        self.announcement_label.setAlignment(Qt.AlignCenter)
+        self.announcement_label.setWordWrap(True)
+        self.announcement_label.hide()
+        layout.addWidget(self.announcement_label)
+        
         # Connection indicator
         self.connection_label = QLabel('🔴 Connecting to server...', self)
         self.connection_label.setStyleSheet('''
@@ -188,6 +232,26 @@ class LockScreen(QWidget):
     def hide_lock(self):
         self.hide()
     
+    def apply_theme(self, theme):
+        if theme.get('title'):
+            self.logo_label.setText(theme['title'])
+        if theme.get('details'):
+            self.details_label.setText(theme['details'])
+        background = theme.get('background')
+        if background:
+            # A single color or a [start, end] gradient
+            start, end = (background[0], background[-1]) if isinstance(background, list) else (background, background)
+            self.setStyleSheet(f'''
+            background: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+                stop:0 {start}, stop:1 {end});
+        ''')
+    
+    def set_announcements(self, announcements):
+        lines = [a.get('text', '') if isinstance(a, dict) else str(a) for a in announcements]
+        lines = [line for line in lines if line]
+        self.announcement_label.setText('\n'.join(f'📢 {line}' for line in lines))
+        self.announcement_label.setVisible(bool(lines))
+    
     def set_connection_status(self, status, connected=False):
         if connected:
             self.connection_label.setText(f'🟢 {status}')
@@ -338,7 +402,7 @@ class KeyboardBlocker:
         self.enabled = False
     
     def install(self):
-        if self.hooked or not ctypes.windll.kernel32.GetModuleHandleW:
+        if self.hooked or win32api is None or not ctypes.windll.kernel32.GetModuleHandleW:
             return
         
         try:
@@ -377,57 +441,106 @@ class KeyboardBlocker:
                 logger.error(f"Failed to uninstall keyboard blocker: {e}")
 
 class NetCafeClient:
-    def __init__(self):
-        self.app = QApplication(sys.argv)
-        self.loop = qasync.QEventLoop(self.app)
-        asyncio.set_event_loop(self.loop)
+    def __init__(self, headless=False):
+        # Headless: no modal dialogs or keyboard hook (replays, benchmarks)
+        self.headless = headless
+        self.startup = StartupTimeline()
         
-        # Load configuration
-        self.config = self._load_config()
+        # Lock the seat before doing anything else
+        with self.startup.stage('lock'):
+            self.app = QApplication.instance() or QApplication(sys.argv)
+            self.loop = qasync.QEventLoop(self.app)
+            asyncio.set_event_loop(self.loop)
+            self.lock_screen = LockScreen()
+            self.keyboard_blocker = KeyboardBlocker()
+            self._show_lock_screen()
+            self.app.processEvents()
+        self.startup.mark('locked')
         
         # Components
         self.timer_overlay = TimerOverlay()
-        self.lock_screen = LockScreen()
-        self.keyboard_blocker = KeyboardBlocker()
         
         # State
         self.session_active = False
         self.remaining_time = 0
         self.session_id = None
-        self.computer_id = self._get_computer_id()
-        
-        # Server configuration
-        self.server_hosts = [self.config['server']['host']] + self.config['server'].get('fallback_hosts', [])
-        self.server_port = self.config['server']['port']
+        self.session_deadline = None
+        self.computer_id = None
+        self.clock_sync = ClockSync()
+        self.dispatcher = MessageDispatcher({
+            ForceLogout: self._on_force_logout,
+            TimeUpdate: self._on_time_update,
+            SessionDeadline: self._on_session_deadline,
+            SessionUpdate: self._on_session_update,
+            ClockSyncReply: self._on_clock_sync,
+            TelemetryWatch: self._on_telemetry_watch,
+            ProcessPolicyUpdate: self._on_process_policy,
+            ThumbnailRequest: self._on_thumbnail_request,
+            EventStreamInfo: self._on_event_stream,
+            Welcome: self._on_welcome,
+            ClientAck: self._on_client_ack,
+            BroadcastChannel: self._on_broadcast_channel,
+            BroadcastReplay: self._on_broadcast_replay,
+            Announcement: self._on_announcement,
+            PeerConfig: self._on_peer_config,
+            LogTailRequest: self._on_log_tail,
+            ProfileCommand: self._on_profile,
+        })
+        self.sequencer = EventSequencer()
+        self.dispatcher.sequencer = self.sequencer
+        self._ack_handle = None
+        self.process_watchdog = ProcessWatchdog.create()
+        self.thumbnails = None
+        self.metadata = {}
         self.current_host_index = 0
         
         # Network
         self.session = None
         self.ws = None
+        self.ws_recorder = None
         self.reconnect_attempts = 0
-        self.max_reconnect_attempts = self.config['server']['max_reconnect_attempts']
+        self._connecting = False
+        self.outbox = Outbox()
+        self.standby = None
+        self.resume_token = None
+        self._welcome_waiter = None
+        self.broadcast = None
+        self.log_tails = {}
+        self.perf_sampler = None
+        self.loop_watchdog = None
+        self.profiler = None
+        self._last_tick = None
+        self._tick_late_ms = 0.0
+        self.broadcast_receiver = None
+        self.peers = None
+        self.peer_seeds = ()
         
-        # Timers
-        self.session_timer = QTimer()
-        self.session_timer.timeout.connect(self._tick)
-        self.reconnect_timer = QTimer()
-        self.reconnect_timer.timeout.connect(self._try_reconnect)
+        # Timers, all on one wheel so their wakeups coalesce
+        self.timers = TimerWheel(self.loop)
+        # The countdown display updates on the second, without slack
+        self.session_timer = self.timers.timer(self._tick, slack=0)
+        self.reconnect_timer = self.timers.timer(self._try_reconnect, slack=1)
+        self.heartbeat_timer = self.timers.timer(self._send_heartbeat)
+        self.telemetry_timer = self.timers.timer(self._sample_telemetry)
+        self.process_timer = self.timers.timer(self._scan_processes)
+        self.thumbnail_timer = self.timers.timer(self._send_thumbnail)
         
-        # Notifications
-        self._notified_5min = False
-        self._notified_1min = False
+        self._last_status = None
         
-        # Initialize system tray and UI
-        self._init_tray()
+        # Notifications: one-shot timers, started with each session
+        self.session_warnings = [(seconds, self.timers.timer(self._show_warning, title, text, icon, slack=0.5))
+                                 for seconds, title, text, icon in SESSION_WARNINGS]
         
         # Connect overlay button signals
         self.timer_overlay.minimize_btn.clicked.connect(self._minimize_overlay)
         self.timer_overlay.end_btn.clicked.connect(lambda: asyncio.create_task(self._end_session()))
         
-        # Start with lock screen
-        self._show_lock_screen()
+        # Config, identity, tray and network warm-up; the loop keeps the
+        # lock screen painted meanwhile
+        self.loop.run_until_complete(self._startup())
         
         logger.info(f"NetCafe Client initialized. Computer ID: {self.computer_id}")
+        logger.info(f"Startup: {self.startup.summary()}")
         
         # Set initial status
         self.set_status('Initializing...', False)
@@ -445,22 +558,124 @@ class NetCafeClient:
                     "port": 8080,
                     "websocket_endpoint": "/ws",
                     "max_reconnect_attempts": 10,
+                    "heartbeat_interval": 15,
                     "fallback_hosts": ["127.0.0.1"]
                 }
             }
     
+    def _apply_config(self):
+        setup_logging(self.config.get('logging'))
+        self.logging_config = self.config.get('logging', {})
+        self.telemetry = TelemetryStreamer.from_config(self.config.get('telemetry', {}))
+        self.process_scan_interval = self.config.get('process_watchdog', {}).get('interval', 5)
+        cache_config = self.config.get('cache', {})
+        self.metadata_endpoints = cache_config.get('endpoints', {})
+        self.http_cache = HTTPCache.from_config(cache_config, self._http_fetch)
+        self.broadcast_config = self.config.get('broadcast', {})
+        self.peer_config = self.config.get('peer', {})
+        self.peer_port = self.peer_config.get('port', 47800)
+        self.peer_key = self._load_peer_key()
+        if self.loop_watchdog is None:
+            self.loop_watchdog = LoopWatchdog.from_config(self.config.get('loop_watchdog', {}), self._on_loop_stall)
+            if self.loop_watchdog:
+                self.loop_watchdog.start(asyncio.get_event_loop())
+        self.timers.default_slack = self.config.get('timers', {}).get('slack', 0.1)
+        if self.perf_sampler is None:
+            self.perf_sampler = PerfSampler.from_config(
+                self.config.get('perf_ring', {}), self._perf_probe,
+                self.loop_watchdog.take_max_lag if self.loop_watchdog else None)
+            if self.perf_sampler:
+                self.perf_sampler.start()
+        
+        # Server configuration
+        self.server_hosts = [self.config['server']['host']] + self.config['server'].get('fallback_hosts', [])
+        self.server_port = self.config['server']['port']
+        self.max_reconnect_attempts = self.config['server']['max_reconnect_attempts']
+        self.heartbeat_interval = self.config['server'].get('heartbeat_interval', 15)
+        self.compression = self.config['server'].get('compression', True)
+        self.compress_min_bytes = self.config['server'].get('compress_min_bytes', 256)
+        self.reconnect_interval = self.config['server'].get('reconnect_interval', 5)
+        self.handshake_timeout = self.config['server'].get('handshake_timeout', 2)
+        self.tls_context = tls.from_config(self.config['server'].get('tls', {}))
+        self.sequencer.ack_every = self.config['server'].get('ack_every', 64)
+        self.sequencer.ack_delay = self.config['server'].get('ack_delay', 0.25)
+        self.standby_heartbeat = self.config['server'].get('standby_heartbeat', 5)
+        if self.config['server'].get('warm_standby') and len(self.server_hosts) > 1:
+            self.standby = WarmStandby(lambda index: self._open_ws(index, standby=True),
+                                       self.config['server'].get('standby_retry_interval', 5), self.timers)
+        
+        # Theme the lock screen from the last boot's metadata
+        self._render_cached_metadata()
+    
+    async def _startup(self):
+        config_task = asyncio.ensure_future(self.startup.in_thread('config', self._load_config))
+        # One pass of the loop starts the task, which hands the read to the
+        # executor; without it the job is only submitted once the tray is done
+        await asyncio.sleep(0)
+        # The tray paints its icon with QPainter, so it has to stay on the GUI
+        # thread; it runs while config.json is read in a worker
+        with self.startup.stage('tray'):
+            self._init_tray()
+        self.config = await config_task
+        with self.startup.stage('apply_config'):
+            self._apply_config()
+        
+        async def identity():
+            self.computer_id = await self.startup.in_thread('identity', self._get_computer_id)
+        await asyncio.gather(identity(), self.startup.timed('network', self._warm_up_network()))
+        self.startup.mark('ready')
+    
+    async def _warm_up_network(self):
+        """Open the HTTP session and resolve the server hosts before connecting"""
+        self.session = self._new_http_session()
+        loop = asyncio.get_event_loop()
+        results = await asyncio.gather(
+            *(asyncio.wait_for(loop.getaddrinfo(host, self.server_port), 2) for host in self.server_hosts),
+            return_exceptions=True)
+        for host, result in zip(self.server_hosts, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Cannot resolve server host {host}: {result!r}")
+    
+    def _new_http_session(self):
+        """HTTP session for the API calls and the WebSocket"""
+        # One connector for both, so with TLS on the WebSocket resumes the
+        # session of the warm-up or login request instead of a full handshake
+        connector = aiohttp.TCPConnector(ssl=self.tls_context or False)
+        return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=10))
+    
+    def _on_loop_stall(self, stall):
+        # Queued while disconnected, so stalls during an outage reach the server too
+        asyncio.create_task(self._ws_send(stall.to_dict()))
+    
+    def _perf_probe(self):
+        """Client-side fields of a perf ring sample"""
+        tick_late, self._tick_late_ms = self._tick_late_ms, 0.0
+        if self.peers is not None:
+            state = PEER
+        elif self.ws is not None and not self.ws.closed:
+            state = CONNECTED
+        elif self._connecting:
+            state = CONNECTING
+        else:
+            state = DISCONNECTED
+        flags = (FLAG_SESSION if self.session_active else 0) | (
+            FLAG_STANDBY if self.standby and self.standby.healthy else 0)
+        rtt = self.clock_sync.rtt
+        return tick_late, rtt * 1000 if rtt is not None else 0.0, len(self.outbox), state, flags
+    
     def _get_current_server_url(self):
         """Get current server URL based on host index"""
+        scheme = 'https' if self.tls_context else 'http'
         if self.current_host_index < len(self.server_hosts):
             host = self.server_hosts[self.current_host_index]
-            return f"http://{host}:{self.server_port}"
-        return f"http://{self.server_hosts[0]}:{self.server_port}"
+            return f"{scheme}://{host}:{self.server_port}"
+        return f"{scheme}://{self.server_hosts[0]}:{self.server_port}"
     
     def _get_computer_id(self):
         try:
-            hostname = socket.gethostname()
-            mac = uuid.getnode()
-            return f"{hostname}_{mac}"
+            client_config = self.config.get('client', {})
+            return load_computer_id(client_config.get('identity_file', 'seat_identity.json'),
+                                    client_config.get('computer_id'))
         except Exception:
             return f"client_{uuid.uuid4().hex[:8]}"
     
@@ -498,6 +713,10 @@ class NetCafeClient:
             reconnect_action.triggered.connect(self._manual_reconnect)
             menu.addAction(reconnect_action)
             
+            self.profile_action = QAction('📊 Start Profiling')
+            self.profile_action.triggered.connect(self._toggle_profiling)
+            menu.addAction(self.profile_action)
+            
             menu.addSeparator()
             
             exit_action = QAction('❌ Exit')
@@ -519,9 +738,45 @@ class NetCafeClient:
             else:
                 self._show_lock_screen()
     
+    async def _http_fetch(self, path, headers):
+        if self.session is None:
+            raise CacheFetchError('Not connected')
+        async with self.session.get(f'{self._get_current_server_url()}{path}', headers=headers) as response:
+            return response.status, response.headers, await response.read()
+    
+    def _apply_metadata(self, entry):
+        name = next((n for n, path in self.metadata_endpoints.items() if path == entry.key), None)
+        if name is None:
+            return
+        try:
+            data = entry.json()
+        except ValueError as e:
+            logger.error(f"Bad {name} metadata: {e}")
+            return
+        self.metadata[name] = data
+        if name == 'lock_screen' and isinstance(data, dict):
+            self.lock_screen.apply_theme(data)
+        elif name == 'announcements' and isinstance(data, list):
+            self.lock_screen.set_announcements(data)
+    
+    def _render_cached_metadata(self):
+        for path in self.metadata_endpoints.values():
+            entry = self.http_cache.peek(path)
+            if entry is not None:
+                self._apply_metadata(entry)
+    
+    async def _refresh_metadata(self):
+        async def refresh(name, path):
+            try:
+                self._apply_metadata(await self.http_cache.get(path, on_update=self._apply_metadata))
+            except CacheFetchError as e:
+                logger.warning(f"Metadata {name} unavailable: {e}")
+        await asyncio.gather(*(refresh(name, path) for name, path in self.metadata_endpoints.items()))
+    
     def _show_lock_screen(self):
         self.lock_screen.show_lock()
-        self.keyboard_blocker.install()
+        if not self.headless:
+            self.keyboard_blocker.install()
     
     def _hide_lock_screen(self):
         self.lock_screen.hide_lock()
@@ -554,72 +809,184 @@ class NetCafeClient:
     
     def _cleanup(self):
         try:
-            self.session_timer.stop()
-            self.reconnect_timer.stop()
+            self.timers.close()
+            logger.info(f"Timers: {self.timers.summary()}")
+            if self.telemetry:
+                self.telemetry.close()
             self.keyboard_blocker.uninstall()
+            if self.standby:
+                self.standby.stop()
+            self._close_broadcast()
+            self._stop_log_tails()
+            if self.perf_sampler:
+                self.perf_sampler.stop()
+            if self.profiler:
+                self.profiler.stop()
+            if self.loop_watchdog:
+                self.loop_watchdog.stop()
+                logger.info(f"Loop watchdog: {self.loop_watchdog.summary()}")
+            if self.peers:
+                self.peers.stop()
             if self.session:
-                asyncio.create_task(self.session.close())
+                # Also called after run_forever has returned, when a task
+                # would never run
+                if self.loop.is_running():
+                    asyncio.create_task(self.session.close())
+                elif not self.loop.is_closed():
+                    self.loop.run_until_complete(self.session.close())
             self.tray.hide()
             logger.info("Cleanup completed")
         except Exception as e:
             logger.error(f"Cleanup error: {e}")
     
     async def connect_to_server(self):
-        if self.reconnect_attempts >= self.max_reconnect_attempts:
+        # In peer mode the server keeps being retried, slowly
+        if self.reconnect_attempts >= self.max_reconnect_attempts and self.peers is None:
             self.set_status('Max reconnect attempts reached', False)
             return
         
+        self._connecting = True
         try:
             server_url = self._get_current_server_url()
-            logger.info(f"Connecting to server: {server_url}")
-            self.set_status('Connecting to server...', False)
-            
-            if self.session:
-                await self.session.close()
-            
-            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+            logger.info(f"Connecting to server: {server_url}", extra={'log_key': 'connect_to'})
+            self.set_status('Connecting to server...', False, log_key='reconnect_status')
             
-            # Test connection
-            async with self.session.get(f'{server_url}/api/status') as response:
-                if response.status == 200:
-                    logger.info("Server is reachable")
-                else:
-                    raise Exception(f"Server status: {response.status}")
+            # Reuse the session opened by the start-up warm-up
+            if self.session is None or self.session.closed:
+                self.session = self._new_http_session()
             
-            # Connect WebSocket
-            host = self.server_hosts[self.current_host_index]
-            ws_url = f"ws://{host}:{self.server_port}/ws?computer_id={self.computer_id}"
-            self.ws = await self.session.ws_connect(ws_url)
-            logger.info("WebSocket connected")
+            # One round trip: the upgrade carries identity, capabilities and
+            # resume token, the server's first frame carries status and session
+            self._welcome_waiter = asyncio.get_event_loop().create_future()
+            try:
+                self.ws = await self._open_ws(self.current_host_index)
+            except aiohttp.WSServerHandshakeError as e:
+                logger.warning(f"WebSocket upgrade refused: {e.status} {e.message}")
+                await self._probe_status(server_url)
+                raise
+            logger.info(f"WebSocket connected (permessage-deflate: {'on' if self.ws.compress else 'off'})")
+            await self._ws_ready()
             
-            asyncio.create_task(self._handle_ws_messages())
+            try:
+                await asyncio.wait_for(asyncio.shield(self._welcome_waiter), self.handshake_timeout)
+            except asyncio.TimeoutError:
+                logger.info("No welcome frame (older server), checking status over HTTP")
+                await self._probe_status(server_url)
             
             self.set_status('Connected - Ready for gaming!', True)
             self.reconnect_attempts = 0
+            # The login dialog below can stay up for as long as the seat is idle
+            self._connecting = False
+            self.startup.mark('connected')
+            asyncio.create_task(self._refresh_metadata())
+            if self.peers is not None:
+                await self._leave_peer_mode(server_url)
             
-            # Show login
-            await self.show_login()
+            # Show login unless the welcome frame resumed a running session
+            if not self.session_active:
+                await self.show_login()
             
         except Exception as e:
-            logger.error(f"Connection error: {e}")
+            # Repeats on every attempt while the server is down
+            logger.error(f"Connection error: {e}", extra={'log_key': 'connection_error'})
             self.reconnect_attempts += 1
             
             # Try next host if available
             if self.current_host_index < len(self.server_hosts) - 1:
                 self.current_host_index += 1
-                logger.info(f"Trying next host: {self.server_hosts[self.current_host_index]}")
+                logger.info(f"Trying next host: {self.server_hosts[self.current_host_index]}",
+                            extra={'log_key': 'next_host'})
             else:
                 self.current_host_index = 0  # Reset to first host
             
-            self.set_status(f'Connection failed (attempt {self.reconnect_attempts})', False)
+            self.set_status(f'Connection failed (attempt {self.reconnect_attempts})', False,
+                            log_key='reconnect_status')
             
             if self.session:
                 await self.session.close()
                 self.session = None
             
             self._start_reconnect_timer()
+        finally:
+            self._connecting = False
+    
+    async def _probe_status(self, server_url):
+        async with self.session.get(f'{server_url}/api/status') as response:
+            if response.status == 200:
+                logger.info("Server is reachable")
+            else:
+                raise Exception(f"Server status: {response.status}")
+    
+    async def _open_ws(self, host_index, standby=False):
+        host = self.server_hosts[host_index]
+        caps = CAPABILITIES + (('broadcast',) if self.broadcast_config.get('enabled') else ())
+        if self.peer_config.get('enabled'):
+            caps += ('peer',)
+        params = {'computer_id': self.computer_id, 'caps': ','.join(caps), 'out_stream': self.outbox.stream}
+        if self.compression:
+            # Small frames cost more to deflate than they save; the server
+            # only compresses the large ones (session lists etc.). The
+            # threshold is the server's only: aiohttp deflates every frame
+            # once the extension is negotiated, compress=0 on send_str
+            # doesn't turn it off, so the client's own frames are all deflated.
+            params['compress_min'] = self.compress_min_bytes
+        if standby:
+            params['standby'] = 1
+        else:
+            # Server replays the events missed since then
+            params.update(self.sequencer.resume_params())
+            if self.resume_token:
+                params['resume'] = self.resume_token
+        scheme = 'wss' if self.tls_context else 'ws'
+        ws_url = f"{scheme}://{host}:{self.server_port}/ws?{urlencode(params)}"
+        # With a standby to fail over to, protocol pings detect a dead host
+        # that never closes the TCP connection
+        return await self.session.ws_connect(ws_url, compress=15 if self.compression else 0,
+                                             heartbeat=self.standby_heartbeat if self.standby else None)
+    
+    async def _ws_ready(self):
+        """Start reading and the periodic senders on a freshly connected self.ws"""
+        self._start_ws_recording()
+        asyncio.create_task(self._handle_ws_messages(self.ws))
+        
+        # Estimate server clock offset before any deadline arrives
+        for _ in range(4):
+            await self._ws_send(self.clock_sync.make_request())
+        self.heartbeat_timer.start(self.heartbeat_interval)
+        if self.telemetry:
+            self.telemetry_timer.start(self.telemetry.interval)
+        
+        # Everything not acked yet, also what the old connection swallowed
+        pending = self.outbox.pending()
+        if pending:
+            logger.info(f"Replaying {len(pending)} unacknowledged messages")
+        for data in pending:
+            await self._ws_send(data, replay=True)
+        
+        if self.standby:
+            self.standby.start((self.current_host_index + 1) % len(self.server_hosts))
+    
+    def _promote_standby(self):
+        taken = self.standby.take() if self.standby else None
+        if taken is None:
+            return False
+        self.ws, self.current_host_index = taken
+        logger.warning(f"Primary connection lost, promoted warm standby "
+                       f"{self.server_hosts[self.current_host_index]}")
+        # Another server, another clock
+        self.clock_sync.reset()
+        asyncio.create_task(self._on_standby_promoted())
+        return True
+    
+    async def _on_standby_promoted(self):
+        await self._ws_send({'type': 'standby_promote', **self.sequencer.resume_params()})
+        await self._ws_ready()
+        self.set_status('Connected - Ready for gaming!', True)
     
     async def show_login(self):
+        if self.headless:
+            logger.info("Headless: login dialog skipped")
+            return
         try:
             dialog = LoginDialog()
             if dialog.exec() and dialog.accepted_login:
@@ -641,37 +1008,56 @@ class NetCafeClient:
             logger.info(f"Authenticating user: {username}")
             
             server_url = self._get_current_server_url()
-            async with self.session.post(f'{server_url}/api/login', json=login_data) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    if data.get('success'):
-                        self.session_id = data.get('session_id')
-                        minutes = data.get('minutes', 0)
-                        
-                        logger.info(f"Login successful: {username}, {minutes} minutes")
-                        
-                        if minutes > 0:
-                            await self.start_session(minutes)
-                        else:
-                            QMessageBox.warning(None, '⚠️ No Time', 'No time available!')
+            # login_start also returns the seat's process policy, so it is
+            # enforced before the screen unlocks; older servers only have login
+            status, data = await self._post_json(f'{server_url}/api/session/login_start', login_data)
+            if status == 404:
+                status, data = await self._post_json(f'{server_url}/api/login', login_data)
+            if status == 200:
+                if data.get('success'):
+                    self.session_id = data.get('session_id')
+                    self.resume_token = data.get('resume_token') or self.resume_token
+                    if data.get('policy'):
+                        try:
+                            self._on_process_policy(ProcessPolicyUpdate.from_dict(data['policy']))
+                        except MessageError as e:
+                            logger.warning(f"Ignoring invalid process policy: {e}")
+                    minutes = data.get('minutes', 0)
+                    
+                    logger.info(f"Login successful: {username}, {minutes} minutes")
+                    
+                    if minutes > 0:
+                        await self.start_session(minutes, data.get('expires_at'))
                     else:
-                        QMessageBox.critical(None, '❌ Login Failed', data.get('message', 'Login failed'))
+                        self._show_message('warning', '⚠️ No Time', 'No time available!')
                 else:
-                    QMessageBox.critical(None, '❌ Error', f'Server error: {response.status}')
+                    self._show_message('critical', '❌ Login Failed', data.get('message', 'Login failed'))
+            else:
+                self._show_message('critical', '❌ Error', f'Server error: {status}')
                     
         except Exception as e:
             logger.error(f"Authentication error: {e}")
-            QMessageBox.critical(None, '❌ Error', f'Authentication failed: {str(e)}')
+            self._show_message('critical', '❌ Error', f'Authentication failed: {str(e)}')
+    
+    async def _post_json(self, url, payload):
+        async with self.session.post(url, json=payload) as response:
+            if response.status != 200:
+                return response.status, None
+            return response.status, await response.json()
     
-    async def start_session(self, minutes):
+    async def start_session(self, minutes, expires_at=None):
         try:
             logger.info(f"Starting session: {minutes} minutes")
             
             self.session_active = True
-            self.remaining_time = minutes * 60
-            self.session_timer.start(1000)
-            self._notified_5min = False
-            self._notified_1min = False
+            self.session_deadline = expires_at
+            if expires_at is not None:
+                self.remaining_time = self.clock_sync.remaining(expires_at)
+            else:
+                self.remaining_time = minutes * 60
+            self.session_timer.start(1)
+            self._last_tick = None
+            self._arm_warnings(fresh=True)
             
             self._hide_lock_screen()
             self._show_overlay()
@@ -689,11 +1075,12 @@ class NetCafeClient:
         except Exception as e:
             logger.error(f"Start session error: {e}")
     
-    async def _end_session(self):
+    async def _end_session(self, local_only=False):
         try:
             logger.info("Ending session")
             
-            if self.session_id:
+            # In peer mode the ledger carries the end to the other seats
+            if self.session_id and self.peers is None:
                 minutes_used = (self.remaining_time // 60) if self.remaining_time else 0
                 logout_data = {
                     'session_id': self.session_id,
@@ -712,7 +1099,12 @@ class NetCafeClient:
             
             # Force end locally
             self.session_active = False
+            self.session_deadline = None
+            if self.peers is not None and not local_only:
+                self.peers.record('end', self.computer_id)
             self.session_timer.stop()
+            for _, timer in self.session_warnings:
+                timer.stop()
             self.timer_overlay.hide()
             self._show_lock_screen()
             
@@ -729,36 +1121,41 @@ class NetCafeClient:
             logger.error(f"End session error: {e}")
     
     def _tick(self):
+        now = time.monotonic()
+        if self._last_tick is not None:
+            self._tick_late_ms = max(self._tick_late_ms, (now - self._last_tick - 1) * 1000)
+        self._last_tick = now
         if not self.session_active:
             return
         
-        self.remaining_time -= 1
-        
-        # Warnings
-        if self.remaining_time <= 300 and not self._notified_5min:
-            self._notified_5min = True
-            self.tray.showMessage(
-                '⚠️ Time Warning',
-                'Your gaming session will end in 5 minutes!',
-                QSystemTrayIcon.Warning,
-                5000
-            )
-        
-        if self.remaining_time <= 60 and not self._notified_1min:
-            self._notified_1min = True
-            self.tray.showMessage(
-                '🚨 Final Warning',
-                'Your gaming session will end in 1 minute!',
-                QSystemTrayIcon.Critical,
-                5000
-            )
+        if self.session_deadline is not None:
+            self.remaining_time = self.clock_sync.remaining(self.session_deadline)
+        else:
+            self.remaining_time -= 1
         
         if self.remaining_time <= 0:
             asyncio.create_task(self._end_session())
             return
         
+        # The deadline may have moved (top-up, peer ledger, clock sync)
+        self._arm_warnings()
         self._update_timer()
     
+    def _arm_warnings(self, fresh=False):
+        """Start each warning's timer for when its time is left"""
+        for seconds, timer in self.session_warnings:
+            delay = max(0, self.remaining_time - seconds)
+            if timer.active:
+                if abs(timer.remaining() - delay) <= 2:
+                    continue
+            elif not fresh and self.remaining_time <= seconds:
+                # Shown already for this deadline
+                continue
+            timer.start(delay, single_shot=True)
+    
+    def _show_warning(self, title, text, icon):
+        self.tray.showMessage(title, text, icon, 5000)
+    
     def _update_timer(self):
         minutes = self.remaining_time // 60
         seconds = self.remaining_time % 60
@@ -767,26 +1164,72 @@ class NetCafeClient:
         self.timer_overlay.set_time(time_str)
         self.tray.setToolTip(f'🎮 NetCafe Pro 2.0 - Time: {time_str}')
     
-    def set_status(self, status, connected=False):
+    def set_status(self, status, connected=False, log_key=None):
+        """Show status everywhere; log_key throttles the line in a retry loop"""
         self.lock_screen.set_connection_status(status, connected)
         self.timer_overlay.set_status(f'{"🟢" if connected else "🔴"} {status}')
         
         if hasattr(self, 'status_action'):
             self.status_action.setText(f'{"🟢" if connected else "🔴"} {status}')
         
-        logger.info(f"Status: {status} (Connected: {connected})")
+        # Ticks and retries set the same status over and over
+        if (status, connected) != self._last_status:
+            self._last_status = (status, connected)
+            logger.info(f"Status: {status} (Connected: {connected})",
+                        extra={'log_key': log_key} if log_key else None)
+    
+    def _show_message(self, level, title, text):
+        """Modal message box, or only a log line when running headless"""
+        if self.headless:
+            logger.info(f"{title}: {text}")
+            return
+        getattr(QMessageBox, level)(None, title, text)
     
-    async def _handle_ws_messages(self):
+    def _start_ws_recording(self):
+        client_config = self.config.get('client', {})
+        if not client_config.get('record_ws'):
+            return
+        try:
+            self.ws_recorder = WSRecorder.for_directory(
+                client_config.get('record_dir', 'recordings'), self.computer_id)
+            logger.info(f"Recording WebSocket traffic to {self.ws_recorder.path}")
+        except OSError as e:
+            logger.error(f"Failed to start WS recording: {e}")
+    
+    async def _ws_send(self, data, replay=False):
+        if not replay:
+            data = self.outbox.add(data)
+        ws = self.ws
+        if ws is None or ws.closed:
+            if 'cseq' not in data:
+                self.outbox.dropped += 1
+            return
+        text = json.dumps(data)
+        self.dispatcher.traffic.record_out(data.get('type'), len(text))
+        if self.ws_recorder:
+            self.ws_recorder.record(OUTBOUND, text)
         try:
-            async for msg in self.ws:
+            await ws.send_str(text)
+        except (ConnectionError, RuntimeError) as e:
+            if 'cseq' in data:
+                logger.warning(f"Send failed ({e}), {data.get('type')} kept for the next connection")
+            else:
+                self.outbox.dropped += 1
+            return
+        self.outbox.written(data)
+    
+    async def _handle_ws_messages(self, ws):
+        try:
+            async for msg in ws:
                 if msg.type == aiohttp.WSMsgType.TEXT:
-                    try:
-                        data = json.loads(msg.data)
-                        await self._process_ws_message(data)
-                    except json.JSONDecodeError:
-                        logger.error("Invalid WebSocket message")
+                    if self.ws_recorder:
+                        self.ws_recorder.record(INBOUND, msg.data)
+                    message = self.dispatcher.decode(msg.data)
+                    if message is not None:
+                        await self.dispatcher.dispatch(message)
+                    self._maybe_ack()
                 elif msg.type == aiohttp.WSMsgType.ERROR:
-                    logger.error(f"WebSocket error: {self.ws.exception()}")
+                    logger.error(f"WebSocket error: {ws.exception()}")
                     break
                 elif msg.type == aiohttp.WSMsgType.CLOSE:
                     logger.info("WebSocket closed")
@@ -794,31 +1237,411 @@ class NetCafeClient:
         except Exception as e:
             logger.error(f"WebSocket handler error: {e}")
         finally:
-            self.ws = None
-            self.set_status('Disconnected', False)
-            self._start_reconnect_timer()
+            # A promoted standby may have replaced this connection already
+            if self.ws is ws:
+                self._on_ws_closed()
+    
+    def _maybe_ack(self):
+        if self.sequencer.ack_due():
+            self._send_ack()
+        elif self.sequencer.pending and self._ack_handle is None:
+            self._ack_handle = asyncio.get_event_loop().call_later(self.sequencer.ack_delay, self._send_ack)
+    
+    def _send_ack(self):
+        if self._ack_handle is not None:
+            self._ack_handle.cancel()
+            self._ack_handle = None
+        if self.sequencer.pending and self.ws is not None and not self.ws.closed:
+            asyncio.create_task(self._ws_send(self.sequencer.make_ack()))
+    
+    def _on_ws_closed(self):
+        self.ws = None
+        self.sequencer.connection_lost()
+        if self._ack_handle is not None:
+            self._ack_handle.cancel()
+            self._ack_handle = None
+        self.heartbeat_timer.stop()
+        self.telemetry_timer.stop()
+        self.thumbnail_timer.stop()
+        self._stop_log_tails()
+        logger.info(f"WebSocket traffic: {self.dispatcher.traffic.summary()}")
+        if self.ws_recorder:
+            self.ws_recorder.close()
+            self.ws_recorder = None
+        if self._promote_standby():
+            return
+        self.set_status('Disconnected', False)
+        self._start_reconnect_timer()
     
     async def _process_ws_message(self, data):
-        msg_type = data.get('type')
-        
-        if msg_type == 'force_logout':
-            QMessageBox.information(None, '⚠️ Session Ended', 
-                                    data.get('message', 'Your session was ended by administrator.'))
-            await self._end_session()
-        
-        elif msg_type == 'time_update':
-            minutes = data.get('minutes', 0)
-            if minutes > 0 and not self.session_active:
-                await self.start_session(minutes)
+        await self.dispatcher.handle(data)
+    
+    async def _on_force_logout(self, msg):
+        self._show_message('information', '⚠️ Session Ended', msg.message)
+        await self._end_session()
+    
+    async def _on_time_update(self, msg):
+        if msg.minutes > 0 and not self.session_active:
+            await self.start_session(msg.minutes, msg.expires_at)
+    
+    async def _on_session_deadline(self, msg):
+        # Absolute server timestamp, also sent again on top-ups
+        if self.session_active:
+            self.session_deadline = msg.expires_at
+            self.remaining_time = self.clock_sync.remaining(msg.expires_at)
+            self._arm_warnings()
+            self._update_timer()
+        else:
+            await self.start_session(msg.minutes, msg.expires_at)
+    
+    async def _on_session_update(self, msg):
+        session = msg.for_computer(self.computer_id)
+        if session and session.duration_minutes > 0 and not self.session_active:
+            await self.start_session(session.duration_minutes)
+    
+    async def _on_welcome(self, msg):
+        self.outbox.set_acks(msg.client_acks)
+        if msg.resume_token:
+            self.resume_token = msg.resume_token
+        session = msg.session
+        if session and not self.session_active and (session.minutes > 0 or session.expires_at):
+            logger.info(f"Resuming session {session.session_id or '?'} from the handshake")
+            self.session_id = session.session_id or self.session_id
+            await self.start_session(session.minutes, session.expires_at)
+        if self._welcome_waiter is not None and not self._welcome_waiter.done():
+            self._welcome_waiter.set_result(msg)
+    
+    def _on_client_ack(self, msg):
+        self.outbox.ack(msg.cseq)
+    
+    def _on_event_stream(self, msg):
+        self.sequencer.start_stream(msg.stream, msg.since, msg.reset)
+    
+    async def _on_broadcast_channel(self, msg):
+        receiver = self.broadcast_receiver
+        if receiver is not None and receiver.key == msg.key:
+            # Reconnected to the same server: stay joined, resume from here
+            receiver.start(msg.stream, msg.seq)
+            self.broadcast.schedule_expiry()
+            return
+        self._close_broadcast()
+        receiver = BroadcastReceiver(msg.key, self._on_broadcast, self._request_broadcast_resend,
+                                     msg.resend_timeout or self.broadcast_config.get('resend_timeout', 2.0),
+                                     server_time=self.clock_sync.server_now,
+                                     max_age=self.broadcast_config.get('max_age', 60.0))
+        receiver.start(msg.stream, msg.seq)
+        try:
+            self.broadcast = await open_listener(receiver, msg.group, msg.port,
+                                                 self.broadcast_config.get('interface', '0.0.0.0'), self.timers)
+        except OSError as e:
+            # The server then keeps sending this seat's broadcasts over the WS
+            logger.warning(f"Can't join broadcast group {msg.group}:{msg.port}: {e}")
+            await self._ws_send({'type': 'broadcast_leave'})
+            return
+        self.broadcast_receiver = receiver
+        logger.info(f"Joined broadcast group {msg.group}:{msg.port} at #{msg.seq}")
+    
+    def _close_broadcast(self):
+        if self.broadcast is not None:
+            self.broadcast.close()
+        self.broadcast = None
+        self.broadcast_receiver = None
+    
+    def _on_broadcast(self, seq, payload, sent_at):
+        if payload.get('type') not in BROADCAST_TYPES:
+            logger.warning(f"Ignoring broadcast #{seq} of type {payload.get('type')!r}")
+            return
+        # The seq of a broadcast is its own, not the seat's event stream's
+        payload.pop('seq', None)
+        asyncio.create_task(self.dispatcher.handle(payload))
+    
+    def _request_broadcast_resend(self, stream, first, last):
+        logger.info(f"Broadcasts #{first}-#{last} missing, asking for a resend")
+        asyncio.create_task(self._ws_send({'type': 'broadcast_resend', 'stream': stream,
+                                           'from': first, 'to': last}))
+    
+    def _on_broadcast_replay(self, msg):
+        if self.broadcast_receiver is None:
+            return
+        self.broadcast_receiver.replay(msg.stream, msg.frames)
+        self.broadcast.schedule_expiry()
+    
+    def _load_peer_key(self):
+        try:
+            with open(self.peer_config.get('key_file', 'peer_key'), encoding='utf-8') as f:
+                return bytes.fromhex(f.read().strip())
+        except (OSError, ValueError):
+            return None
+    
+    def _on_peer_config(self, msg):
+        self.peer_seeds = msg.seeds
+        if msg.port:
+            self.peer_port = msg.port
+        if msg.key == self.peer_key:
+            return
+        self.peer_key = msg.key
+        # Kept on disk: peer mode is for when the server can't hand it out
+        path = self.peer_config.get('key_file', 'peer_key')
+        try:
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                f.write(msg.key.hex())
+            os.replace(path + '.tmp', path)
+        except OSError as e:
+            logger.warning(f"Can't store the peer key: {e}")
+    
+    def _enter_peer_mode(self):
+        if self.peers is not None or not self.peer_config.get('enabled'):
+            return
+        if not self.peer_key:
+            logger.warning("Server unreachable and no peer key yet, staying locked")
+            return
+        self.peers = PeerNode(self.computer_id, self.peer_key, self.peer_port, seeds=self.peer_seeds,
+                              interval=self.peer_config.get('interval', 1.0),
+                              fanout=self.peer_config.get('fanout', 3),
+                              peer_timeout=self.peer_config.get('peer_timeout', 10),
+                              on_change=self._on_peer_ledger, wall=self.clock_sync.server_now, timers=self.timers)
+        asyncio.create_task(self._start_peers(self.peers))
+    
+    async def _start_peers(self, node):
+        try:
+            await node.start()
+        except OSError as e:
+            logger.error(f"Peer mode unavailable: {e}")
+            if self.peers is node:
+                self.peers = None
+            return
+        if self.session_active:
+            # Let the other seats, and the leader's staff, see this session
+            deadline = self.session_deadline or self.clock_sync.server_now() + self.remaining_time
+            node.record('start', self.computer_id, self.remaining_time // 60, deadline)
+        self.set_status('Server unreachable - LAN peer mode', False)
+    
+    def _on_peer_ledger(self):
+        state = self.peers.seat_state(self.computer_id) if self.peers else None
+        if state is None:
+            return
+        if state['active'] and self.session_active:
+            if state['expires_at'] != self.session_deadline:
+                logger.info(f"Session deadline moved by the peer ledger, {state['minutes']} minutes left")
+                self.session_deadline = state['expires_at']
+        elif state['active']:
+            asyncio.create_task(self.start_session(state['minutes'], state['expires_at']))
+        elif self.session_active:
+            asyncio.create_task(self._end_session(local_only=True))
+    
+    async def _leave_peer_mode(self, server_url):
+        node, self.peers = self.peers, None
+        is_leader = node.is_leader
+        node.stop()
+        entries = node.unreconciled()
+        if not is_leader or not entries:
+            return
+        # Ids are unique, so entries another leader already sent are ignored
+        try:
+            status, data = await self._post_json(f'{server_url}/api/peer/reconcile', {'entries': entries})
+        except Exception as e:
+            logger.error(f"Peer ledger reconciliation failed: {e}")
+            return
+        if status == 200:
+            node.mark_reconciled(data.get('accepted', []))
+            logger.info(f"Reconciled {len(entries)} peer ledger entries with the server")
+        else:
+            logger.warning(f"Peer ledger reconciliation failed: {status}")
+    
+    def _on_announcement(self, msg):
+        icon = {'info': QSystemTrayIcon.Information, 'warning': QSystemTrayIcon.Warning,
+                'critical': QSystemTrayIcon.Critical}[msg.level]
+        logger.info(f"Announcement: {msg.text}")
+        self.tray.showMessage('📢 NetCafe Pro 2.0', msg.text, icon, 10000)
+    
+    def _on_log_tail(self, msg):
+        task = self.log_tails.pop(msg.request_id, None)
+        if task is not None:
+            task.cancel()
+        if not msg.active:
+            return
+        ring = log_ring()
+        if ring is None:
+            asyncio.create_task(self._ws_send({'type': 'log_chunk', 'request_id': msg.request_id, 'seq': 0,
+                                               'count': 0, 'data': '', 'last': True,
+                                               'error': 'log ring disabled'}))
+            return
+        max_duration = self.logging_config.get('tail_max_duration', 600)
+        tail = LogTail(ring, msg.request_id, self._ws_send, level=msg.level, name=msg.logger,
+                       since=msg.since, until=msg.until, limit=msg.limit, follow=msg.follow,
+                       duration=min(msg.duration or max_duration, max_duration),
+                       chunk_bytes=self.logging_config.get('tail_chunk_bytes', 32768), timers=self.timers)
+        task = asyncio.create_task(tail.run())
+        self.log_tails[msg.request_id] = task
+        task.add_done_callback(lambda t, rid=msg.request_id: self._log_tail_done(rid, t, tail))
+    
+    def _log_tail_done(self, request_id, task, tail):
+        if self.log_tails.get(request_id) is task:
+            del self.log_tails[request_id]
+        if not task.cancelled() and task.exception():
+            logger.error(f"Log tail {request_id} failed: {task.exception()!r}")
+        else:
+            logger.info(f"Log tail {request_id}: {tail.sent_records} records in {tail.seq} chunks, "
+                        f"{tail.sent_bytes} bytes")
+    
+    def _stop_log_tails(self):
+        for task in self.log_tails.values():
+            task.cancel()
+        self.log_tails.clear()
+    
+    def _toggle_profiling(self):
+        if self.profiler is not None and self.profiler.active:
+            self.profiler.stop()
+        else:
+            self._start_profiling()
+    
+    def _on_profile(self, msg):
+        if msg.action == 'stop':
+            if self.profiler is None or not self.profiler.stop():
+                logger.info("Profile stop requested, but no profile is running")
+            return
+        self._start_profiling(msg.duration, msg.upload, msg.request_id)
+    
+    def _start_profiling(self, duration=None, upload=None, request_id=None):
+        config = self.config.get('profiler', {})
+        if self.profiler is None:
+            self.profiler = Profiler.from_config(config)
+        if upload is None:
+            upload = config.get('upload', False)
+        on_done = lambda summary: self._on_profile_done(summary, upload, request_id)
+        if not self.profiler.start(self.computer_id or 'seat', duration, on_done):
+            logger.info("A profile is already running")
+            return
+        self.profile_action.setText('📊 Stop Profiling')
+    
+    def _on_profile_done(self, summary, upload, request_id):
+        self.profile_action.setText('📊 Start Profiling')
+        self.tray.showMessage('📊 Profile saved', summary['files']['summary'], QSystemTrayIcon.Information, 5000)
+        result = {'type': 'profile_result', 'request_id': request_id, 'seconds': summary['seconds'],
+                  'samples': summary['samples'], 'task_share': summary['task_share'],
+                  'top_cumulative': summary['top_cumulative'][:10]}
+        asyncio.create_task(self._ws_send(result))
+        if upload:
+            asyncio.create_task(self._upload_profile(summary['files']))
+    
+    async def _upload_profile(self, files):
+        if self.session is None or self.session.closed:
+            return
+        form = aiohttp.FormData()
+        form.add_field('computer_id', self.computer_id or '')
+        handles = []
+        try:
+            for kind, path in files.items():
+                handle = open(path, 'rb')
+                handles.append(handle)
+                form.add_field(kind, handle, filename=os.path.basename(path))
+            url = f'{self._get_current_server_url()}/api/profile'
+            async with self.session.post(url, data=form) as response:
+                if response.status != 200:
+                    logger.warning(f"Profile upload failed: {response.status}")
+                    return
+            logger.info(f"Profile uploaded: {files['summary']}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+            logger.warning(f"Profile upload failed: {e}")
+        finally:
+            for handle in handles:
+                handle.close()
+    
+    def _on_clock_sync(self, msg):
+        if self.clock_sync.add_sample(msg.t0, msg.t1, msg.t2):
+            logger.debug(f"Clock offset {self.clock_sync.offset:+.3f}s, "
+                         f"RTT {self.clock_sync.rtt * 1000:.1f}ms")
+    
+    def _on_telemetry_watch(self, msg):
+        if not self.telemetry:
+            return
+        pending = self.telemetry.set_watching(msg.active, msg.interval)
+        if pending and self.ws is not None:
+            asyncio.create_task(self._ws_send(pending))
+        if self.telemetry_timer.active:
+            self.telemetry_timer.start(self.telemetry.interval)
+        logger.info(f"Telemetry interval now {self.telemetry.interval}s")
+    
+    def _sample_telemetry(self):
+        try:
+            batch = self.telemetry.sample()
+        except Exception as e:
+            logger.error(f"Telemetry sample failed: {e}")
+            return
+        if batch:
+            # Queued for replay while disconnected
+            asyncio.create_task(self._ws_send(batch))
+    
+    def _on_process_policy(self, msg):
+        if not self.process_watchdog:
+            return
+        self.process_watchdog.set_policy(ProcessPolicy(msg.mode, msg.names))
+        if msg.interval:
+            self.process_scan_interval = msg.interval
+        if self.process_watchdog.enabled:
+            self.process_timer.start(self.process_scan_interval)
+            self._scan_processes()
+        else:
+            self.process_timer.stop()
+    
+    def _scan_processes(self):
+        try:
+            violations = self.process_watchdog.scan()
+        except Exception as e:
+            logger.error(f"Process scan failed: {e}")
+            return
+        if not violations:
+            return
+        for violation in violations:
+            logger.warning(f"Process policy violation: {violation['name']} (pid {violation['pid']})")
+        asyncio.create_task(self._ws_send({'type': 'process_violations', 'violations': violations}))
+    
+    def _on_thumbnail_request(self, msg):
+        if not msg.active:
+            self.thumbnail_timer.stop()
+            return
+        thumb_config = self.config.get('thumbnails', {})
+        if self.thumbnails is None:
+            try:
+                source = QtScreenSource(thumb_config.get('width', 480), thumb_config.get('quality', 60))
+                self.thumbnails = ThumbnailStreamer.from_config(thumb_config, source)
+            except Exception as e:
+                logger.error(f"Screen thumbnails unavailable: {e}")
+                return
+        self.thumbnails.configure(msg.max_bytes_per_sec)
+        self.thumbnails.start()
+        interval = msg.interval or thumb_config.get('interval', 2)
+        self.thumbnail_timer.start(interval)
+        self._send_thumbnail()
+    
+    def _send_thumbnail(self):
+        if self.ws is None or self.ws.closed:
+            return
+        try:
+            update = self.thumbnails.tick()
+        except Exception as e:
+            logger.error(f"Thumbnail capture failed: {e}")
+            return
+        if update:
+            asyncio.create_task(self._ws_send(update))
+    
+    def _send_heartbeat(self):
+        if self.ws is not None and not self.ws.closed:
+            asyncio.create_task(self._ws_send(self.clock_sync.make_request()))
     
     def _start_reconnect_timer(self):
-        if not self.reconnect_timer.isActive() and self.reconnect_attempts < self.max_reconnect_attempts:
-            delay = min(5000 + (self.reconnect_attempts * 3000), 20000)
-            self.reconnect_timer.start(delay)
-            logger.info(f"Reconnecting in {delay/1000}s")
+        if self.reconnect_attempts >= self.max_reconnect_attempts:
+            self._enter_peer_mode()
+            if self.peers is not None and not self.reconnect_timer.active:
+                self.reconnect_timer.start(self.peer_config.get('server_retry', 30), single_shot=True)
+            return
+        if not self.reconnect_timer.active:
+            delay = min(self.reconnect_interval + self.reconnect_attempts * 3, 20)
+            self.reconnect_timer.start(delay, single_shot=True)
+            logger.info(f"Reconnecting in {delay}s", extra={'log_key': 'reconnect_delay'})
     
     def _try_reconnect(self):
-        logger.info("Attempting reconnection...")
+        logger.info("Attempting reconnection...", extra={'log_key': 'reconnect_attempt'})
         asyncio.create_task(self.connect_to_server())
         self.reconnect_timer.stop()
     
@@ -826,15 +1649,17 @@ class NetCafeClient:
         logger.info("Starting NetCafe Pro 2.0 Gaming Client")
         
         try:
+            # Leaving the with block closes the loop, so cleanup runs inside it
             with self.loop:
                 self.loop.create_task(self.connect_to_server())
-                self.loop.run_forever()
+                try:
+                    self.loop.run_forever()
+                finally:
+                    self._cleanup()
         except KeyboardInterrupt:
             logger.info("Interrupted by user")
         except Exception as e:
             logger.error(f"Application error: {e}")
-        finally:
-            self._cleanup()
 
 def main():
     try:
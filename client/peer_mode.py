@@ -0,0 +1,386 @@
+"""
+LAN peer mode for when the central server is unreachable.
+
+Once a seat has used up its reconnect attempts it joins the other seats
+on the LAN. Each one runs a PeerNode on a UDP port. The nodes gossip a
+small ledger of session starts, ends and top-ups, which stands in for
+the server until it returns:
+
+- Ledger entries are signed (HMAC-SHA256) with the cafe's peer key. The
+  server hands that out in ``peer_config`` while it is up, together with
+  a few other seats to start gossiping with (seeds). An entry's id is
+  ``origin:counter``. The origin is the writing node plus an
+  incarnation, so a restarted seat doesn't reuse ids.
+- Session state is derived by folding a seat's entries in time order.
+  Seats write a ``start`` snapshot of their running session when they
+  enter peer mode, and ``end`` when it ends. Staff commands add
+  ``start``, ``topup`` and ``end`` entries for any seat.
+- The live seat with the lowest id is the leader. Staff commands sent to
+  any node are forwarded to it, so only one node writes them. When the
+  server is back, the leader sends it the ledger to reconcile. Entry ids
+  are unique, so a new leader sending the same entries again is harmless.
+- A staff command carries a random id and the time it was sent, and
+  keeps both when forwarded. Its entry records the id, and a command
+  whose id is already in the ledger, or that was sent more than
+  ``command_max_age`` seconds ago, isn't written again. A captured
+  command datagram, replayed from a seat, adds no time.
+
+Gossip traffic per node is bounded. Every interval, a node sends a digest
+to `fanout` random live peers. The digest is the ledger's hash and size,
+plus a sample of at most `member_sample` membership heartbeats (its own
+and the leader's included). Only when the hashes differ do the two nodes
+swap version vectors and the entries the other lacks, at most
+`max_entries` per datagram. In steady state each node sends `fanout`
+small datagrams per interval, however many seats there are.
+
+Every datagram is signed with the same key. HMAC can't tell nodes apart,
+so any machine holding the key is trusted.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import random
+import socket
+import time
+import uuid
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+KINDS = ('start', 'topup', 'end')
+
+
+def _sign(key, data):
+    return hmac.new(key, data, hashlib.sha256).digest()
+
+
+def seal(key, message):
+    data = json.dumps(message, separators=(',', ':')).encode()
+    return data + _sign(key, data)
+
+
+def unseal(key, datagram):
+    """Verified message dict, or None"""
+    data, signature = datagram[:-SIGNATURE_SIZE], datagram[-SIGNATURE_SIZE:]
+    if len(datagram) <= SIGNATURE_SIZE or not hmac.compare_digest(signature, _sign(key, data)):
+        return None
+    try:
+        message = json.loads(data)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) else None
+
+
+def sign_entry(key, entry):
+    body = json.dumps({k: v for k, v in entry.items() if k != 'sig'}, sort_keys=True, separators=(',', ':'))
+    return _sign(key, body.encode()).hex()
+
+
+def seal_command(key, action, seat, minutes=0):
+    """Signed staff command datagram with a new command id"""
+    if action not in KINDS:
+        raise ValueError(f"unknown action {action!r}")
+    return seal(key, {'t': 'command', 'action': action, 'seat': seat, 'minutes': minutes, 'hops': 1,
+                      'command': uuid.uuid4().hex, 'sent_at': time.time()})
+
+
+def send_command(key, address, action, seat, minutes=0):
+    """Staff command to any peer, which forwards it to the leader"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.sendto(seal_command(key, action, seat, minutes), address)
+
+
+class Ledger:
+    """Signed session entries with an order-independent hash"""
+
+    def __init__(self, key):
+        self.key = key
+        self.entries = {}
+        self.commands = {}
+        self.contiguous = {}
+        self.hash = 0
+        self.rejected = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def digest(self):
+        return [self.hash, len(self.entries)]
+
+    def add(self, entry):
+        """Store a verified entry, returns False for a known or invalid one"""
+        entry_id = entry.get('id')
+        if entry_id in self.entries:
+            return False
+        if (entry.get('kind') not in KINDS or entry_id != f"{entry.get('origin')}:{entry.get('n')}"
+                or not hmac.compare_digest(str(entry.get('sig')), sign_entry(self.key, entry))):
+            self.rejected += 1
+            return False
+        self.entries[entry_id] = entry
+        if entry.get('command'):
+            self.commands[entry['command']] = entry
+        self.hash ^= int.from_bytes(hashlib.sha256(entry_id.encode()).digest()[:8], 'big')
+        origin = entry['origin']
+        n = self.contiguous.get(origin, 0)
+        while f"{origin}:{n + 1}" in self.entries:
+            n += 1
+        self.contiguous[origin] = n
+        return True
+
+    def vector(self):
+        return dict(self.contiguous)
+
+    def missing_from(self, vector, limit):
+        """Entries a peer with this version vector lacks, oldest first per origin"""
+        missing = [e for e in self.entries.values() if e['n'] > vector.get(e['origin'], 0)]
+        missing.sort(key=lambda e: (e['origin'], e['n']))
+        return missing[:limit]
+
+    def seat_state(self, seat, now):
+        """Fold a seat's entries, returns None if the ledger has none"""
+        entries = sorted((e for e in self.entries.values() if e['seat'] == seat),
+                         key=lambda e: (e['at'], e['id']))
+        if not entries:
+            return None
+        expires_at = None
+        for entry in entries:
+            if entry['kind'] == 'start':
+                expires_at = entry.get('expires_at') or entry['at'] + entry['minutes'] * 60
+            elif entry['kind'] == 'topup' and expires_at is not None:
+                expires_at += entry['minutes'] * 60
+            elif entry['kind'] == 'end':
+                expires_at = None
+        active = expires_at is not None and expires_at > now
+        return {'active': active, 'expires_at': expires_at if active else None,
+                'minutes': max(0, int((expires_at - now) // 60)) if active else 0}
+
+
+class _GossipProtocol(asyncio.DatagramProtocol):
+    def __init__(self, node):
+        self.node = node
+
+    def datagram_received(self, data, addr):
+        self.node.datagram_received(data, addr)
+
+    def error_received(self, exc):
+        logger.debug(f"Peer datagram error: {exc}")
+
+
+class PeerNode:
+    """One seat's membership, election and ledger gossip
+
+    ``on_change()`` is called after new ledger entries arrived.
+    """
+
+    def __init__(self, node_id, key, port=0, host='0.0.0.0', seeds=(), interval=1.0, fanout=3,
+                 member_sample=8, peer_timeout=10.0, max_entries=16, command_max_age=60.0, on_change=None,
+                 clock=time.monotonic, wall=time.time, rng=None, timers=None):
+        self.node_id = node_id
+        self.key = key
+        self.bind = (host, port)
+        self.interval = interval
+        self.fanout = fanout
+        self.member_sample = member_sample
+        self.peer_timeout = peer_timeout
+        self.max_entries = max_entries
+        self.command_max_age = command_max_age
+        self.on_change = on_change
+        self.clock = clock
+        self.wall = wall
+        self.rng = rng or random.Random()
+        self.timers = timers
+        self.ledger = Ledger(key)
+        self.origin = f"{node_id}#{int(wall())}"
+        self.counter = 0
+        self.heartbeat = 0
+        # node_id -> [host, port, heartbeat, last update on our clock]
+        self.members = {}
+        for seed_id, seed_host, seed_port in seeds:
+            if seed_id != node_id:
+                self.members[seed_id] = [seed_host, seed_port, 0, clock()]
+        self.reconciled = set()
+        self.address = None
+        self.transport = None
+        self._round_handle = None
+        self.sent = 0
+        self.bytes_sent = 0
+        self.received = 0
+        self.invalid = 0
+        self.stale_commands = 0
+
+    async def start(self):
+        if self.timers is None:
+            self.timers = TimerWheel()
+        loop = asyncio.get_event_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: _GossipProtocol(self), local_addr=self.bind)
+        self.address = self.transport.get_extra_info('sockname')[:2]
+        self._schedule_round()
+        logger.info(f"Peer mode on port {self.address[1]}, {len(self.members)} seeds")
+
+    def stop(self):
+        if self._round_handle is not None:
+            self._round_handle.stop()
+            self._round_handle = None
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    # Membership and election
+
+    def alive(self):
+        now = self.clock()
+        return [node_id for node_id, member in self.members.items() if now - member[3] <= self.peer_timeout]
+
+    @property
+    def leader(self):
+        return min(self.alive() + [self.node_id])
+
+    @property
+    def is_leader(self):
+        return self.leader == self.node_id
+
+    def _member_sample(self):
+        sample = {self.node_id: [self.address[0], self.address[1], self.heartbeat]}
+        leader = self.leader
+        if leader != self.node_id:
+            sample[leader] = self.members[leader][:3]
+        # Freshest heartbeats first, so news travels fast, then random ones
+        # so every member keeps getting refreshed
+        others = sorted((m for m in self.alive() if m not in sample), key=lambda m: -self.members[m][3])
+        room = self.member_sample - len(sample)
+        fresh, rest = others[:room // 2], others[room // 2:]
+        for node_id in fresh + self.rng.sample(rest, min(len(rest), room - len(fresh))):
+            sample[node_id] = self.members[node_id][:3]
+        return sample
+
+    def _merge_members(self, members, source):
+        now = self.clock()
+        for node_id, (host, port, heartbeat) in members.items():
+            if node_id == self.node_id:
+                continue
+            if node_id == source[0]:
+                # The sender's own entry: trust the address we got it from
+                host, port = source[1]
+            known = self.members.get(node_id)
+            if known is None or heartbeat > known[2]:
+                self.members[node_id] = [host, port, heartbeat, now]
+
+    # Ledger
+
+    def record(self, kind, seat, minutes=0, expires_at=None, command=None):
+        """Write an entry of our own and start gossiping it
+
+        For a staff command, the entry already written for its id is
+        returned instead of a second one.
+        """
+        if command is not None and command in self.ledger.commands:
+            return self.ledger.commands[command]
+        self.counter += 1
+        entry = {'id': f"{self.origin}:{self.counter}", 'origin': self.origin, 'n': self.counter,
+                 'kind': kind, 'seat': seat, 'minutes': minutes, 'expires_at': expires_at, 'at': self.wall()}
+        if command is not None:
+            entry['command'] = command
+        entry['sig'] = sign_entry(self.key, entry)
+        self.ledger.add(entry)
+        if self.on_change:
+            self.on_change()
+        return entry
+
+    def submit(self, action, seat, minutes=0, hops=1, command=None, sent_at=None):
+        """Staff command: written by the leader, forwarded by anyone else"""
+        if action not in KINDS:
+            raise ValueError(f"unknown action {action!r}")
+        if command is None:
+            command, sent_at = uuid.uuid4().hex, self.wall()
+        if self.is_leader:
+            return self.record(action, seat, minutes, command=command)
+        if hops <= 0:
+            logger.warning(f"Dropping {action} for {seat}: {self.leader} is not taking commands")
+            return None
+        host, port = self.members[self.leader][:2]
+        self._send((host, port), {'t': 'command', 'action': action, 'seat': seat, 'minutes': minutes,
+                                  'hops': hops - 1, 'command': command, 'sent_at': sent_at})
+        return None
+
+    def seat_state(self, seat):
+        return self.ledger.seat_state(seat, self.wall())
+
+    def unreconciled(self):
+        return [e for e in self.ledger.entries.values() if e['id'] not in self.reconciled]
+
+    def mark_reconciled(self, entry_ids):
+        self.reconciled.update(entry_ids)
+
+    # Gossip
+
+    def _schedule_round(self):
+        # Jitter keeps the seats from sending in lockstep
+        delay = self.interval * self.rng.uniform(0.8, 1.2)
+        self._round_handle = self.timers.call_later(delay, self._round, slack=self.interval * 0.1)
+
+    def _round(self):
+        self.heartbeat += 1
+        alive = self.alive()
+        targets = self.rng.sample(alive, min(self.fanout, len(alive)))
+        if not targets:
+            # Nobody heard from lately: fall back to everyone we know of
+            targets = self.rng.sample(list(self.members), min(self.fanout, len(self.members)))
+        digest = {'t': 'digest', 'from': self.node_id, 'members': self._member_sample(),
+                  'ledger': self.ledger.digest}
+        for node_id in targets:
+            self._send(tuple(self.members[node_id][:2]), digest)
+        self._schedule_round()
+
+    def _send(self, address, message):
+        if self.transport is None:
+            return
+        data = seal(self.key, message)
+        self.transport.sendto(data, address)
+        self.sent += 1
+        self.bytes_sent += len(data)
+
+    def datagram_received(self, data, addr):
+        message = unseal(self.key, data)
+        if message is None:
+            self.invalid += 1
+            return
+        self.received += 1
+        kind = message.get('t')
+        sender = message.get('from')
+        if 'members' in message:
+            self._merge_members(message['members'], (sender, addr))
+        reply = {'from': self.node_id}
+
+        if kind == 'digest':
+            if message.get('ledger') != self.ledger.digest:
+                self._send(addr, dict(reply, t='vector', vector=self.ledger.vector()))
+        elif kind == 'vector':
+            self._send(addr, dict(reply, t='entries', vector=self.ledger.vector(),
+                                  entries=self.ledger.missing_from(message.get('vector') or {}, self.max_entries)))
+        elif kind == 'entries':
+            added = sum(self.ledger.add(entry) for entry in message.get('entries') or [])
+            if 'vector' in message:
+                missing = self.ledger.missing_from(message['vector'], self.max_entries)
+                if missing:
+                    self._send(addr, dict(reply, t='entries', entries=missing))
+            if added and self.on_change:
+                self.on_change()
+        elif kind == 'command':
+            try:
+                command, sent_at = str(message['command']), float(message['sent_at'])
+                if abs(self.wall() - sent_at) > self.command_max_age:
+                    # Replayed, or held up for longer than any staff member waits
+                    self.stale_commands += 1
+                    logger.warning(f"Dropping staff command {command} sent at {sent_at:.0f}")
+                    return
+                self.submit(message.get('action'), str(message.get('seat')), int(message.get('minutes') or 0),
+                            int(message.get('hops') or 0), command, sent_at)
+            except (KeyError, ValueError, TypeError) as e:
+                logger.warning(f"Invalid staff command: {e}")
@@ -0,0 +1,249 @@
+"""
+Performance counters in a memory-mapped ring file, for post-mortems.
+
+When a seat freezes or crashes, the log rarely says why. PerfSampler
+writes one fixed-size sample every ``interval`` seconds (1 s by default)
+into a ring file mapped with mmap:
+
+- loop_lag_ms: how late the sampler's own call_later fired
+- tick_late_ms: worst lateness of the session timer's 1 s tick since the
+  previous sample
+- ws_rtt_ms: the latest clock-sync round trip
+- rss_kb, tasks: resident memory and asyncio tasks
+- queue_depth: outbox messages the server hasn't acknowledged yet
+- conn_state and flags (session active, standby up)
+
+A write is one struct.pack_into straight into the mapping: no file I/O,
+no lock and no bytes object. The client's event loop thread is the only
+writer. Every record carries its sequence number at both ends, so a
+record torn by a crash in the middle of a write is recognized and
+skipped. The pages belong to the OS page cache, so whatever was written
+survives the process crashing or being killed. An OS crash can lose the
+last few seconds.
+
+The ring is reopened, not reset, on start-up. The sequence continues,
+and each record has the writer's pid, so a restart shows up in the
+timeline.
+
+Decode a ring, also a copy taken from a seat:
+
+    python perf_ring.py perf.ring [--last N] [--csv]
+"""
+
+import argparse
+import asyncio
+import csv
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'NCPR'
+VERSION = 1
+# magic, version, record size, capacity, created (wall), padded to 64
+HEADER = struct.Struct('<4sHHId44x')
+# seq, wall, monotonic, loop lag, tick lateness, WS RTT, RSS, tasks,
+# queue depth, pid, conn state, flags, seq again
+RECORD = struct.Struct('<QddfffIIIIBB2xQ')
+FIELDS = ('seq', 'wall', 'mono', 'loop_lag_ms', 'tick_late_ms', 'ws_rtt_ms', 'rss_kb', 'tasks',
+          'queue_depth', 'pid', 'conn_state', 'flags')
+
+CONN_STATES = ('disconnected', 'connecting', 'connected', 'peer')
+DISCONNECTED, CONNECTING, CONNECTED, PEER = range(len(CONN_STATES))
+FLAG_SESSION = 1
+FLAG_STANDBY = 2
+
+
+class PerfRing:
+    """Writer side of the ring file"""
+
+    def __init__(self, path, capacity=3600):
+        self.path = path
+        size = HEADER.size + capacity * RECORD.size
+        # The mapping keeps its own handle, so the file object can go
+        with open(path, 'r+b' if os.path.exists(path) else 'w+b') as f:
+            if not self._compatible(f, capacity):
+                f.truncate(0)
+                f.truncate(size)
+                f.seek(0)
+                f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, time.time()))
+                f.flush()
+            self._mm = mmap.mmap(f.fileno(), size)
+        self.capacity = capacity
+        self.pid = os.getpid()
+        self.seq = max((r[0] for r in _records(self._mm, capacity)), default=0)
+
+    @staticmethod
+    def _compatible(f, capacity):
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return False
+        magic, version, record_size, file_capacity, _ = HEADER.unpack(header)
+        return ((magic, version, record_size, file_capacity) == (MAGIC, VERSION, RECORD.size, capacity)
+                and os.fstat(f.fileno()).st_size == HEADER.size + capacity * RECORD.size)
+
+    def write(self, loop_lag_ms, tick_late_ms, ws_rtt_ms, rss_kb, tasks, queue_depth, conn_state, flags):
+        seq = self.seq = self.seq + 1
+        RECORD.pack_into(self._mm, HEADER.size + seq % self.capacity * RECORD.size,
+                         seq, time.time(), time.monotonic(), loop_lag_ms, tick_late_ms, ws_rtt_ms,
+                         rss_kb, tasks, queue_depth, self.pid, conn_state, flags, seq)
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.flush()
+            self._mm.close()
+
+
+def _records(buf, capacity):
+    for i in range(capacity):
+        record = RECORD.unpack_from(buf, HEADER.size + i * RECORD.size)
+        # seq 0 was never written; differing ends were torn mid-write
+        if record[0] and record[0] == record[-1]:
+            yield record
+
+
+def read_ring(path):
+    """The samples in a ring file, oldest first, as dicts"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, record_size, capacity, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"{path} is not a version {VERSION} perf ring")
+    capacity = min(capacity, (len(data) - HEADER.size) // RECORD.size)
+    samples = [dict(zip(FIELDS, r)) for r in _records(data, capacity)]
+    samples.sort(key=lambda s: s['seq'])
+    return samples
+
+
+def process_rss_kb():
+    """Resident set size of this process in KB, 0 where unknown"""
+    if sys.platform == 'win32':
+        return _windows_rss_kb()
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _windows_rss_kb():
+    import ctypes
+    from ctypes import wintypes
+
+    class Counters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+            (name, ctypes.c_size_t) for name in (
+                'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+    counters = Counters()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+        return 0
+    return counters.WorkingSetSize // 1024
+
+
+class PerfSampler:
+    """Writes a sample every interval from the event loop
+
+    ``probe()`` returns (tick_late_ms, ws_rtt_ms, queue_depth, conn_state,
+    flags) from the client. Loop lag, RSS and the task count are measured
+    here. ``lag_source()``, if given, returns the worst loop lag in seconds
+    since the previous call (LoopWatchdog.take_max_lag), which catches
+    lag between samples too.
+    """
+
+    def __init__(self, ring, probe, interval=1.0, lag_source=None):
+        self.ring = ring
+        self.probe = probe
+        self.interval = interval
+        self.lag_source = lag_source
+        self._handle = None
+        self._due = None
+
+    @classmethod
+    def from_config(cls, config, probe, lag_source=None):
+        """Build from the 'perf_ring' config section, None if disabled or the file can't be mapped"""
+        if not config.get('enabled', True):
+            return None
+        try:
+            ring = PerfRing(config.get('file', 'perf.ring'), config.get('capacity', 3600))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Perf ring unavailable: {e}")
+            return None
+        return cls(ring, probe, config.get('interval', 1.0), lag_source)
+
+    def start(self):
+        if self._handle is None:
+            self._schedule(asyncio.get_event_loop())
+
+    def _schedule(self, loop):
+        self._due = loop.time() + self.interval
+        self._handle = loop.call_at(self._due, self._sample, loop)
+
+    def _sample(self, loop):
+        lag = (loop.time() - self._due) * 1000
+        try:
+            if self.lag_source:
+                lag = max(lag, self.lag_source() * 1000)
+            tick_late, rtt, depth, state, flags = self.probe()
+            self.ring.write(lag, tick_late, rtt, process_rss_kb(), len(asyncio.all_tasks(loop)), depth,
+                            state, flags)
+        except Exception as e:
+            logger.error(f"Perf sample failed: {e}")
+        self._schedule(loop)
+
+    def stop(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self.ring.close()
+
+
+def timeline(samples, interval=1.0):
+    """Text lines, one per sample, with restarts and gaps called out"""
+    previous = None
+    for s in samples:
+        if previous is not None:
+            if s['pid'] != previous['pid']:
+                yield f"--- restart: pid {previous['pid']} -> {s['pid']}"
+            elif s['wall'] - previous['wall'] > interval * 3:
+                yield f"--- gap of {s['wall'] - previous['wall']:.1f}s with no samples"
+        previous = s
+        state = CONN_STATES[s['conn_state']] if s['conn_state'] < len(CONN_STATES) else s['conn_state']
+        flags = ''.join(f for bit, f in ((FLAG_SESSION, 'S'), (FLAG_STANDBY, 'B')) if s['flags'] & bit)
+        yield (f"{datetime.fromtimestamp(s['wall']).isoformat(timespec='milliseconds')} "
+               f"lag {s['loop_lag_ms']:8.1f}ms  tick {s['tick_late_ms']:8.1f}ms  "
+               f"rtt {s['ws_rtt_ms']:7.1f}ms  rss {s['rss_kb'] / 1024:7.1f}MB  tasks {s['tasks']:4d}  "
+               f"queue {s['queue_depth']:4d}  {state:<12} {flags}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Decode a perf ring file into a timeline')
+    parser.add_argument('path')
+    parser.add_argument('--last', type=int, help='only the last N samples')
+    parser.add_argument('--csv', action='store_true', help='CSV instead of the text timeline')
+    parser.add_argument('--interval', type=float, default=1.0, help='sampling interval, to spot gaps')
+    args = parser.parse_args(argv)
+
+    samples = read_ring(args.path)
+    if args.last:
+        samples = samples[-args.last:]
+    if args.csv:
+        writer = csv.DictWriter(sys.stdout, FIELDS)
+        writer.writeheader()
+        writer.writerows(samples)
+    else:
+        for line in timeline(samples, args.interval):
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
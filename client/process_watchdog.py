@@ -0,0 +1,215 @@
+"""
+Process policy watchdog.
+
+Keeps a cached process table ((pid, start time) -> executable name) and
+on every poll only enumerates pids and their start times, diffs them
+against the cache and looks up names for the new ones. The start time is
+part of the key because Windows hands a freed pid to the next process
+straight away, and a game started under a just-freed pid must not
+inherit the name of the process before it. Resolving a process name
+(QueryFullProcessImageName on Windows, reading /proc/<pid>/comm on Linux)
+is the expensive part, and a seat's process list barely changes between
+polls. Processes whose name can't be resolved (access denied) are
+remembered too and not retried while they run. Policies (blacklist or
+whitelist of executable names) are pushed per seat by the server with
+``process_policy`` and only new processes are checked against them,
+except right after a policy change.
+"""
+
+import ctypes
+import logging
+import os
+import sys
+
+try:
+    import win32process
+except ImportError:
+    win32process = None
+
+logger = logging.getLogger(__name__)
+
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+# Never reported in whitelist mode, the seat can't run without them
+SYSTEM_PROCESSES = frozenset({
+    'system', 'idle', 'registry', 'smss.exe', 'csrss.exe', 'wininit.exe', 'winlogon.exe',
+    'services.exe', 'lsass.exe', 'svchost.exe', 'dwm.exe', 'explorer.exe', 'fontdrvhost.exe',
+    'sihost.exe', 'taskhostw.exe', 'ctfmon.exe', 'conhost.exe', 'runtimebroker.exe',
+    'python.exe', 'pythonw.exe',
+})
+
+
+class ProcProcessBackend:
+    """Linux /proc process listing"""
+
+    def __init__(self, root='/proc'):
+        self.root = root
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and os.path.isdir('/proc')
+
+    def list_pids(self):
+        return {int(name) for name in os.listdir(self.root) if name.isdigit()}
+
+    def start_time(self, pid):
+        """Clock ticks since boot at process start, None if it is gone"""
+        # os.read skips the buffered file object, this runs for every pid on every scan
+        try:
+            fd = os.open(f'{self.root}/{pid}/stat', os.O_RDONLY)
+            try:
+                stat = os.read(fd, 1024)
+            finally:
+                os.close(fd)
+        except OSError:
+            return None
+        # comm (field 2) may contain spaces and parentheses, starttime is field 22
+        return int(stat[stat.rindex(b')') + 2:].split()[19])
+
+    def process_name(self, pid):
+        try:
+            with open(f'{self.root}/{pid}/comm', 'rb') as f:
+                return f.read().strip().decode('utf-8', 'replace').lower()
+        except OSError:
+            return None
+
+
+class Win32ProcessBackend:
+    """Windows process listing through pywin32 and kernel32"""
+
+    def __init__(self):
+        self._kernel32 = ctypes.windll.kernel32
+        self._buffer = ctypes.create_unicode_buffer(1024)
+        self._times = [ctypes.c_ulonglong() for _ in range(4)]
+
+    @staticmethod
+    def available():
+        return win32process is not None
+
+    def list_pids(self):
+        return set(win32process.EnumProcesses())
+
+    def start_time(self, pid):
+        """Creation FILETIME, None if the process is gone or protected"""
+        handle = self._kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return None
+        try:
+            if not self._kernel32.GetProcessTimes(handle, *(ctypes.byref(t) for t in self._times)):
+                return None
+            return self._times[0].value
+        finally:
+            self._kernel32.CloseHandle(handle)
+
+    def process_name(self, pid):
+        # Limited access works for other users' processes, which
+        # GetModuleFileNameEx (needs PROCESS_VM_READ) does not
+        handle = self._kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return None
+        try:
+            size = ctypes.c_ulong(len(self._buffer))
+            if not self._kernel32.QueryFullProcessImageNameW(handle, 0, self._buffer, ctypes.byref(size)):
+                return None
+            return os.path.basename(self._buffer.value).lower()
+        finally:
+            self._kernel32.CloseHandle(handle)
+
+
+def select_backend():
+    for backend in (Win32ProcessBackend, ProcProcessBackend):
+        if backend.available():
+            return backend()
+    return None
+
+
+class ProcessTable:
+    """Cached (pid, start time) -> name table updated by diffing key sets"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.processes = {}
+        self.unresolved = set()
+
+    def scan(self):
+        """Returns (started, exited) lists of (pid, name) since the last scan"""
+        start_time = self.backend.start_time
+        keys = {(pid, start_time(pid)) for pid in self.backend.list_pids()}
+        known = self.processes.keys()
+
+        exited = [(key[0], self.processes.pop(key)) for key in known - keys]
+        self.unresolved &= keys
+        started = []
+        for key in keys - known - self.unresolved:
+            name = self.backend.process_name(key[0])
+            if name is None:
+                # Access denied (or gone already): not retried while it runs
+                self.unresolved.add(key)
+                continue
+            self.processes[key] = name
+            started.append((key[0], name))
+        return started, exited
+
+
+class ProcessPolicy:
+    """Blacklist / whitelist of executable names"""
+
+    MODES = ('off', 'blacklist', 'whitelist')
+
+    def __init__(self, mode='off', names=()):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown process policy mode: {mode}")
+        self.mode = mode
+        self.names = frozenset(n.lower() for n in names)
+
+    def violates(self, name):
+        if self.mode == 'blacklist':
+            return name in self.names
+        if self.mode == 'whitelist':
+            return name not in self.names and name not in SYSTEM_PROCESSES
+        return False
+
+
+class ProcessWatchdog:
+    """Checks new processes against the current policy"""
+
+    def __init__(self, backend, policy=None):
+        self.table = ProcessTable(backend)
+        self.policy = policy or ProcessPolicy()
+        self._recheck = True
+
+    @classmethod
+    def create(cls):
+        backend = select_backend()
+        if backend is None:
+            logger.info("No process backend available on this platform")
+            return None
+        return cls(backend)
+
+    @property
+    def enabled(self):
+        return self.policy.mode != 'off'
+
+    def set_policy(self, policy):
+        self.policy = policy
+        self._recheck = True
+        logger.info(f"Process policy: {policy.mode} ({len(policy.names)} names)")
+
+    def scan(self):
+        """Poll the process table, returns a list of violation dicts"""
+        started, exited = self.table.scan()
+        if self._recheck:
+            # New policy: everything running is 'new' to it
+            self._recheck = False
+            candidates = [(pid, name) for (pid, _), name in self.table.processes.items()]
+        else:
+            candidates = started
+
+        if started or exited:
+            logger.debug(f"Processes: +{len(started)} -{len(exited)}")
+
+        return [
+            {'pid': pid, 'name': name, 'policy': self.policy.mode}
+            for pid, name in candidates
+            if self.policy.violates(name)
+        ]
@@ -0,0 +1,204 @@
+"""
+On-demand profiling of a live seat.
+
+Started from the tray menu or by the server's ``profile`` command, a
+ProfileSession runs two profilers on the event loop for a bounded time:
+
+- cProfile, enabled on the loop thread only, for exact call counts and
+  times per function. It is written as a .pstats file, which
+  ``python -m pstats`` and snakeviz can read.
+- A sampler thread that reads the loop thread's stack every
+  ``sample_interval`` seconds together with the asyncio task running at
+  that moment. Samples are written in the folded format (``task;outer;
+  ...;inner count``) that flamegraph tools read. The top of each stack
+  is the task's coroutine, so time spent in the same helper is split by
+  the task that called it. The sampler needs the GIL to look, so it only
+  gets in when the loop thread lets go. With the default 5 ms switch
+  interval, pure-Python work shorter than that is never seen. While a
+  session runs, the interval is lowered to a twentieth of the sampling
+  interval. The sampling interval also gets +-50% jitter, so it can't
+  phase-lock with a periodic task.
+
+A .json summary next to the two files has the top functions by
+cumulative time and each task's share of the samples. When the session
+ends (duration reached or stopped), ``on_done`` gets the summary with
+the file paths.
+
+When no session runs, nothing is installed: no profile hook, no thread
+and no timer. The cost of having this module is the tray menu item and
+one entry in the message table.
+"""
+
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+OTHER = '(other stacks)'
+
+
+def _frame_label(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _task_label(task):
+    if task is None:
+        return '(no task)'
+    coro = task.get_coro()
+    return getattr(coro, '__qualname__', None) or task.get_name()
+
+
+class ProfileSession:
+    """One bounded profiling run on the loop it was started from"""
+
+    def __init__(self, directory, label, duration, sample_interval=0.01, max_stacks=5000, on_done=None):
+        self.directory = directory
+        self.label = label
+        self.duration = duration
+        self.sample_interval = sample_interval
+        self.max_stacks = max_stacks
+        self.on_done = on_done
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started = None
+        self.result = None
+        self._profile = cProfile.Profile()
+        self._loop = None
+        self._loop_thread = None
+        self._timer = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._switch_interval = None
+
+    @property
+    def active(self):
+        return self.started is not None and self.result is None
+
+    def start(self, loop):
+        """Start profiling loop; call from the loop's thread"""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self.started = time.time()
+        self._timer = loop.call_later(self.duration, self.stop)
+        self._thread = threading.Thread(target=self._sample_loop, name='profile-sampler', daemon=True)
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.sample_interval / 20))
+        self._thread.start()
+        self._profile.enable()
+        logger.info(f"Profiling for {self.duration:g}s ({self.label})")
+
+    def stop(self):
+        """End the session, write the files and call on_done; returns the summary"""
+        if not self.active:
+            return self.result
+        self._profile.disable()
+        self._stop.set()
+        self._thread.join(1)
+        sys.setswitchinterval(self._switch_interval)
+        if self._timer is not None:
+            self._timer.cancel()
+        elapsed = time.time() - self.started
+        # Where every task is suspended right now, taken on the loop thread
+        tasks = Counter(_task_label(t) for t in asyncio.all_tasks(self._loop))
+        self.result = self._write(elapsed, tasks)
+        logger.info(f"Profile written: {self.result['files']['summary']}")
+        if self.on_done:
+            try:
+                self.on_done(self.result)
+            except Exception as e:
+                logger.error(f"Profile callback failed: {e}")
+        return self.result
+
+    def _sample_loop(self):
+        current_task = asyncio.current_task
+        jitter = random.Random()
+        while not self._stop.wait(self.sample_interval * jitter.uniform(0.5, 1.5)):
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(_task_label(current_task(self._loop)))
+            stack.reverse()
+            key = ';'.join(stack)
+            if key not in self.samples and len(self.samples) >= self.max_stacks:
+                key = f'{stack[0]};{OTHER}'
+            self.samples[key] += 1
+            self.sample_count += 1
+
+    def _write(self, elapsed, tasks):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, f"profile-{self.label}-{datetime.now():%Y%m%d-%H%M%S}")
+        files = {'pstats': base + '.pstats', 'folded': base + '.folded', 'summary': base + '.json'}
+        self._profile.dump_stats(files['pstats'])
+        with open(files['folded'], 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+
+        per_task = Counter()
+        for stack, count in self.samples.items():
+            per_task[stack.split(';', 1)[0]] += count
+        stats = pstats.Stats(self._profile)
+        functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:25]
+        summary = {
+            'label': self.label,
+            'started': self.started,
+            'seconds': round(elapsed, 3),
+            'samples': self.sample_count,
+            'task_share': {task: round(count / max(self.sample_count, 1), 4)
+                           for task, count in per_task.most_common(20)},
+            'top_cumulative': [
+                {'function': f'{name} ({os.path.basename(filename)}:{line})', 'calls': calls,
+                 'own_ms': round(own * 1000, 2), 'cumulative_ms': round(cumulative * 1000, 2)}
+                for (filename, line, name), (_, calls, own, cumulative, _) in functions],
+            'tasks_at_end': dict(tasks.most_common(20)),
+            'files': files,
+        }
+        with open(files['summary'], 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+
+class Profiler:
+    """Starts and stops sessions; at most one at a time"""
+
+    def __init__(self, directory='profiles', default_duration=30, max_duration=120, sample_interval=0.01):
+        self.directory = directory
+        self.default_duration = default_duration
+        self.max_duration = max_duration
+        self.sample_interval = sample_interval
+        self.session = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('dir', 'profiles'), config.get('default_duration', 30),
+                   config.get('max_duration', 120), config.get('sample_interval', 0.01))
+
+    @property
+    def active(self):
+        return self.session is not None and self.session.active
+
+    def start(self, label, duration=None, on_done=None):
+        """Start a session on the running loop; False if one is running already"""
+        if self.active:
+            return False
+        duration = min(duration or self.default_duration, self.max_duration)
+        self.session = ProfileSession(self.directory, label, duration, self.sample_interval, on_done=on_done)
+        self.session.start(asyncio.get_event_loop())
+        return True
+
+    def stop(self):
+        """Stop the running session early; its summary, or None"""
+        return self.session.stop() if self.active else None
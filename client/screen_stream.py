@@ -0,0 +1,184 @@
+"""
+On-demand screen thumbnails for the admin console.
+
+While the server asks for thumbnails (``thumbnail_request``), the client
+grabs the screen, scales it down and splits it into square tiles. A CRC
+per tile tells which ones changed since the last frame that was actually
+sent. An update goes out only when enough tiles changed, it carries
+only the changed tiles as JPEG, and it must fit the seat's token bucket
+so thumbnails never compete with game traffic. A frame that doesn't fit
+is skipped; its changes stay pending and go out with a later update.
+"""
+
+import base64
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Byte budget refilled at rate bytes/s, holding at most burst bytes"""
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self._last = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def consume(self, amount):
+        """Take amount bytes if available; a full bucket also lends beyond it
+
+        Lending lets an update bigger than the burst go out once and be paid
+        back over the following seconds, so the average stays at rate.
+        """
+        self._refill()
+        if amount > self.tokens and self.tokens < self.burst:
+            return False
+        self.tokens -= amount
+        return True
+
+    def ready(self):
+        """Whether anything could be sent right now"""
+        self._refill()
+        return self.tokens > 0
+
+
+class TileDiffer:
+    """Per-tile CRCs of a raw 32-bit image buffer"""
+
+    def __init__(self, tile=64):
+        self.tile = tile
+        self.crcs = {}
+
+    def checksums(self, buffer, width, height, bytes_per_line, bytes_per_pixel=4):
+        tile = self.tile
+        tile_bytes = tile * bytes_per_pixel
+        view = memoryview(buffer)
+        crcs = {}
+        for ty in range(0, height, tile):
+            row_crcs = [0] * ((width + tile - 1) // tile)
+            for y in range(ty, min(ty + tile, height)):
+                line = y * bytes_per_line
+                for i, x in enumerate(range(0, width * bytes_per_pixel, tile_bytes)):
+                    end = min(x + tile_bytes, width * bytes_per_pixel)
+                    row_crcs[i] = zlib.crc32(view[line + x:line + end], row_crcs[i])
+            for i, crc in enumerate(row_crcs):
+                crcs[(i * tile, ty)] = crc
+        return crcs
+
+    def changed(self, crcs):
+        """Tiles whose checksum differs from the last committed frame"""
+        previous = self.crcs
+        return [pos for pos, crc in crcs.items() if previous.get(pos) != crc]
+
+    def commit(self, crcs):
+        self.crcs = crcs
+
+    def reset(self):
+        self.crcs = {}
+
+
+class QtScreenSource:
+    """Grabs and downscales the primary screen through Qt"""
+
+    def __init__(self, width=480, quality=60):
+        from PySide6.QtCore import QBuffer, QIODevice, Qt
+        from PySide6.QtGui import QGuiApplication, QImage
+        self._QBuffer, self._QIODevice, self._QImage = QBuffer, QIODevice, QImage
+        self._Qt, self._app = Qt, QGuiApplication
+        self.width = width
+        self.quality = quality
+        self.image = None
+
+    def grab(self):
+        """Capture a frame, returns (buffer, width, height, bytes_per_line)"""
+        screen = self._app.primaryScreen()
+        image = screen.grabWindow(0).toImage()
+        self.image = image.scaledToWidth(self.width, self._Qt.SmoothTransformation) \
+            .convertToFormat(self._QImage.Format_RGB32)
+        return (bytes(self.image.constBits()), self.image.width(), self.image.height(),
+                self.image.bytesPerLine())
+
+    def encode(self, x, y, w, h):
+        buffer = self._QBuffer()
+        buffer.open(self._QIODevice.WriteOnly)
+        self.image.copy(x, y, w, h).save(buffer, 'JPG', self.quality)
+        return bytes(buffer.data())
+
+
+class ThumbnailStreamer:
+    """Turns captured frames into rate-limited changed-tile updates"""
+
+    def __init__(self, source, tile=64, threshold=0.02, rate=32768, burst=131072,
+                 clock=time.monotonic):
+        self.source = source
+        self.differ = TileDiffer(tile)
+        self.threshold = threshold
+        self.bucket = TokenBucket(rate, burst, clock)
+        self.sent_updates = 0
+        self.skipped_updates = 0
+        self.sent_bytes = 0
+
+    @classmethod
+    def from_config(cls, config, source):
+        return cls(source,
+                   tile=config.get('tile', 64),
+                   threshold=config.get('threshold', 0.02),
+                   rate=config.get('max_bytes_per_sec', 32768),
+                   burst=config.get('burst_bytes', 131072))
+
+    def configure(self, rate=None):
+        if rate:
+            self.bucket.rate = rate
+            self.bucket.burst = max(self.bucket.burst, rate)
+
+    def start(self):
+        # First update after a request is always a full frame
+        self.differ.reset()
+
+    def tick(self):
+        """Capture and diff one frame, returns a thumbnail message or None"""
+        if not self.bucket.ready():
+            self.skipped_updates += 1
+            return None
+
+        buffer, width, height, bytes_per_line = self.source.grab()
+        crcs = self.differ.checksums(buffer, width, height, bytes_per_line)
+        changed = self.differ.changed(crcs)
+        full = not self.differ.crcs
+        if not full and len(changed) < max(1, self.threshold * len(crcs)):
+            return None
+
+        tile = self.differ.tile
+        tiles = []
+        size = 0
+        for x, y in changed:
+            data = self.source.encode(x, y, min(tile, width - x), min(tile, height - y))
+            size += len(data)
+            tiles.append([x, y, base64.b64encode(data).decode('ascii')])
+
+        # base64 inflates by 4/3, that is what actually crosses the link
+        wire_size = size * 4 // 3
+        if not self.bucket.consume(wire_size):
+            self.skipped_updates += 1
+            return None
+
+        self.differ.commit(crcs)
+        self.sent_updates += 1
+        self.sent_bytes += wire_size
+        return {
+            'type': 'thumbnail',
+            'width': width,
+            'height': height,
+            'tile': tile,
+            'full': full,
+            'tiles': tiles,
+        }
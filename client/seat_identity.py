@@ -0,0 +1,121 @@
+"""
+Persistent seat identity.
+
+The computer_id used to be rebuilt from ``socket.gethostname()`` and
+``uuid.getnode()`` on every start. ``getnode()`` may shell out or walk the
+network interfaces, and when it finds no MAC it returns a random number,
+so the same seat could show up under a new id after a reboot.
+
+Now the id is derived once and stored in a small JSON file together with
+a fingerprint, which is only a hash of the OS install's machine GUID
+(the hostname when there is none). It is not a hardware fingerprint:
+swapping the network card keeps the id, and seats imaged from one disk
+share a GUID until it is regenerated. Later starts re-read the GUID and
+keep the stored id unless it changed.
+
+This is for stability, not start-up time. On Linux the persisted path
+(about 150-190 us: GUID, JSON read and hash) is slower than the
+``getnode()`` it replaces (about 115-130 us), see sim_seat_identity.py.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import sys
+import uuid
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_FILE = 'seat_identity.json'
+
+
+def machine_guid():
+    """Stable per-install machine id, or '' when the OS doesn't expose one"""
+    if sys.platform == 'win32':
+        try:
+            import winreg
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r'SOFTWARE\Microsoft\Cryptography', 0,
+                                winreg.KEY_READ | winreg.KEY_WOW64_64KEY) as key:
+                return str(winreg.QueryValueEx(key, 'MachineGuid')[0])
+        except OSError:
+            return ''
+
+    for path in ('/etc/machine-id', '/var/lib/dbus/machine-id'):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read().strip()
+            if value:
+                return value
+        except OSError:
+            continue
+    return ''
+
+
+def machine_fingerprint(guid=None):
+    """Cheap check for 'is this still the same machine'"""
+    if guid is None:
+        guid = machine_guid()
+    source = guid or socket.gethostname()
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+
+def derive_computer_id(getnode=uuid.getnode):
+    """Build a new id in the '{hostname}_{mac}' format the server already knows"""
+    hostname = socket.gethostname()
+    mac = getnode()
+    # getnode() sets the multicast bit when it had to make up a random value
+    if (mac >> 40) & 1:
+        guid = machine_guid()
+        suffix = guid.replace('-', '')[:12] if guid else uuid.uuid4().hex[:12]
+        logger.warning("No hardware MAC address found, using machine GUID for seat id")
+        return f"{hostname}_{suffix}"
+    return f"{hostname}_{mac}"
+
+
+def derive_pc_id(getnode=uuid.getnode):
+    """Build a new id in the 'PC-<mac hex>' format netcafe_client seats are registered under"""
+    return f"PC-{getnode():012x}"
+
+
+def _write(path, record):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_computer_id(path=IDENTITY_FILE, override=None, getnode=uuid.getnode, derive=derive_computer_id):
+    """Return the persisted seat id, deriving and storing it when needed
+
+    A non-empty override (client.computer_id in config.json) always wins.
+    ``derive(getnode)`` builds a new id, in the format the server knows
+    this client's seats by.
+    """
+    if override:
+        return override
+
+    fingerprint = machine_fingerprint()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            record = json.load(f)
+        if record.get('fingerprint') == fingerprint and record.get('computer_id'):
+            return record['computer_id']
+        logger.info("Machine fingerprint changed, deriving a new seat id")
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unreadable seat identity file {path}: {e}")
+
+    computer_id = derive(getnode)
+    try:
+        _write(path, {
+            'computer_id': computer_id,
+            'fingerprint': fingerprint,
+            'created': datetime.now().isoformat(timespec='seconds'),
+        })
+    except OSError as e:
+        logger.error(f"Failed to save seat identity: {e}")
+    return computer_id
@@ -0,0 +1,177 @@
+"""
+Warm-standby server connection.
+
+Without it, the client only notices a dead server when the WebSocket
+closes, and then walks the reconnect timer and fallback_hosts while the
+seat shows "Disconnected". With ``server.warm_standby`` on, the client
+keeps a second, idle WebSocket open to the next fallback host. It is
+opened with ``standby=1`` so the server doesn't treat it as the seat's
+connection, and aiohttp's protocol-level ping/pong (``heartbeat``) keeps
+checking it. When the primary closes, the standby is promoted in the
+same event-loop turn and the reconnect timer is never started.
+
+A message written into a dying primary's socket buffer counts as sent
+but never arrives, and that is when failover happens. So outbound
+messages are numbered (``cseq``, within the Outbox's random ``stream``,
+passed as ``out_stream`` on the WS URL) and kept in an Outbox until the
+server acknowledges them with ``{'type': 'client_ack', 'cseq': N}``,
+which covers everything up to N. Whichever connection comes up next,
+a promoted standby included, gets the unacknowledged ones again; the
+server drops a cseq it has already seen. Messages that are stale by
+then, like clock sync pings and thumbnails, are neither numbered nor
+kept. A server whose welcome frame doesn't announce ``client_acks``
+never acks, and with it only messages that could not be written at all
+are kept, as before.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import deque
+
+from timer_wheel import TimerWheel
+
+logger = logging.getLogger(__name__)
+
+# Stale by the time they'd be replayed; acks are superseded by the
+# resume parameters of the next connection, and the rest only mean
+# something on the connection they were sent on
+NOT_REPLAYED = frozenset({'clock_sync', 'thumbnail', 'ack', 'standby_promote', 'broadcast_resend',
+                          'broadcast_leave'})
+
+
+class Outbox:
+    """Bounded queue of outbound messages the server hasn't acknowledged"""
+
+    def __init__(self, maxlen=256, skip=NOT_REPLAYED):
+        self.messages = deque(maxlen=maxlen)
+        self.skip = skip
+        self.stream = uuid.uuid4().hex[:16]
+        self.seq = 0
+        # None until the server's welcome says whether it acks
+        self.acks = None
+        self.dropped = 0
+        self.acked = 0
+        self._written = set()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def add(self, data):
+        """Number data and keep it until acked, returns what to send"""
+        if data.get('type') in self.skip:
+            return data
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped += 1
+        self.seq += 1
+        data = dict(data, cseq=self.seq)
+        self.messages.append(data)
+        return data
+
+    def written(self, data):
+        """data went out on the socket; if the server acks, only the ack lets it go"""
+        if 'cseq' not in data:
+            return
+        if self.acks is False:
+            self._remove(data['cseq'])
+        elif self.acks is None:
+            self._written.add(data['cseq'])
+
+    def ack(self, cseq):
+        messages = self.messages
+        while messages and messages[0]['cseq'] <= cseq:
+            self._written.discard(messages.popleft()['cseq'])
+            self.acked += 1
+
+    def set_acks(self, acks):
+        """From the welcome frame; to a server that doesn't ack, the messages
+        written so far are as delivered as they will get"""
+        self.acks = acks
+        if not acks:
+            for cseq in self._written:
+                self._remove(cseq)
+        self._written.clear()
+
+    def pending(self):
+        """Messages to send again on a new connection; they stay until acked"""
+        return list(self.messages)
+
+    def _remove(self, cseq):
+        for i, data in enumerate(self.messages):
+            if data['cseq'] == cseq:
+                del self.messages[i]
+                return
+
+
+class WarmStandby:
+    """Idle, health-checked WebSocket to a fallback host
+
+    ``open_ws(host_index)`` is the client's connect coroutine; it must
+    return a connected aiohttp ClientWebSocketResponse. Retries wait on
+    ``timers``, the client's TimerWheel, or a wheel of its own.
+    """
+
+    def __init__(self, open_ws, retry_interval=5.0, timers=None):
+        self.open_ws = open_ws
+        self.retry_interval = retry_interval
+        self.timers = timers
+        self.ws = None
+        self.host_index = None
+        self.promotions = 0
+        self._task = None
+
+    @property
+    def healthy(self):
+        return self.ws is not None and not self.ws.closed
+
+    def start(self, host_index):
+        """(Re)target the standby at host_index and keep it connected"""
+        if self._task is not None and self.host_index == host_index:
+            return
+        self.stop()
+        self.host_index = host_index
+        if self.timers is None:
+            self.timers = TimerWheel()
+        self._task = asyncio.ensure_future(self._maintain(host_index))
+
+    async def _maintain(self, host_index):
+        while True:
+            try:
+                ws = await self.open_ws(host_index)
+            except Exception as e:
+                logger.debug(f"Standby connection to host #{host_index} failed: {e}")
+                await self._retry_wait()
+                continue
+            self.ws = ws
+            logger.info(f"Warm standby connected to host #{host_index}")
+            # Nothing is expected on a standby; reading keeps the pings answered
+            # and ends when the heartbeat declares the connection dead
+            async for _ in ws:
+                pass
+            self.ws = None
+            logger.warning(f"Warm standby to host #{host_index} lost")
+            await self._retry_wait()
+
+    def _retry_wait(self):
+        return self.timers.sleep(self.retry_interval, slack=self.retry_interval * 0.2)
+
+    def take(self):
+        """Hand over the standby connection, returns (ws, host_index) or None"""
+        if not self.healthy:
+            return None
+        ws, host_index = self.ws, self.host_index
+        self._task.cancel()
+        self._task = None
+        self.ws = None
+        self.host_index = None
+        self.promotions += 1
+        return ws, host_index
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.ws is not None:
+            asyncio.ensure_future(self.ws.close())
+            self.ws = None
+        self.host_index = None
@@ -0,0 +1,65 @@
+"""
+Start-up timeline.
+
+The client locks the seat first (lock screen painted, keyboard hook
+installed) and only then loads config, reads the seat identity, builds
+the tray and warms up the network, overlapping whatever doesn't depend on
+each other. StartupTimeline records when each stage started and ended,
+relative to the moment the client was constructed, so a slow boot can be
+pinned on a stage and time-to-lock can be checked against a budget.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class StartupTimeline:
+    """Stage start/end offsets and point marks, in seconds since t0"""
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.t0 = clock()
+        self.stages = {}
+        self.marks = {}
+
+    def _now(self):
+        return self.clock() - self.t0
+
+    def mark(self, name):
+        self.marks.setdefault(name, self._now())
+
+    @contextmanager
+    def stage(self, name):
+        start = self._now()
+        try:
+            yield
+        finally:
+            self.stages[name] = (start, self._now())
+
+    async def timed(self, name, awaitable):
+        start = self._now()
+        try:
+            return await awaitable
+        finally:
+            self.stages[name] = (start, self._now())
+
+    async def in_thread(self, name, fn, *args):
+        """Run a blocking stage in the default executor"""
+        return await self.timed(name, asyncio.get_event_loop().run_in_executor(None, fn, *args))
+
+    def as_dict(self):
+        return {
+            'stages': {name: {'start_ms': round(start * 1000, 2), 'end_ms': round(end * 1000, 2)}
+                       for name, (start, end) in self.stages.items()},
+            'marks': {name: round(at * 1000, 2) for name, at in self.marks.items()},
+        }
+
+    def summary(self):
+        stages = ' | '.join(f'{name} {start * 1000:.0f}-{end * 1000:.0f}ms'
+                            for name, (start, end) in sorted(self.stages.items(), key=lambda s: s[1]))
+        marks = ', '.join(f'{name} at {at * 1000:.0f}ms' for name, at in self.marks.items())
+        return f'{stages} ({marks})'
@@ -0,0 +1,231 @@
+"""
+Rate-limited JSON-lines logging.
+
+A seat that can't reach the server used to write the same handful of
+lines (``Connection error``, ``Reconnecting in``, ``Status: ...``) on
+every attempt, forever. Over a weekend outage that is hundreds of MB on
+slow disks.
+
+- LogThrottle is a handler filter with state per key. Only calls that
+  pass ``extra={'log_key': ...}`` are throttled, under that key: the
+  lines a retry loop writes on every attempt. Anything else, a status
+  change back to an earlier state included, is always written. A
+  message that matches one of the last few messages from the same key
+  is dropped and counted. Digits are ignored
+  when matching, so "attempt 7" repeats "attempt 6", and messages that
+  alternate between fallback hosts still match. The count is reported as
+  ``repeated`` on the next record from that key that gets through, at
+  the latest after ``summary_interval``. Different messages from the same key share a
+  token bucket (``burst`` records, then ``rate`` per minute), and the
+  ones dropped by it are reported as ``suppressed``. CRITICAL records
+  are never dropped.
+- JSONFormatter writes one JSON object per line.
+- GzipRotatingFileHandler caps the log at ``max_bytes`` times
+  ``backup_count + 1`` on disk and gzips the rotated files.
+- A LogRing (see log_ring.py) keeps the last ``ring_size`` records in
+  memory for remote tails. It survives reconfiguration.
+"""
+
+import atexit
+import gzip
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from log_ring import LogRing
+
+LOG_FILE = 'client.log'
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+RECENT_MESSAGES = 4
+
+_DIGITS = re.compile(r'\d+')
+
+
+class _KeyState:
+    __slots__ = ('tokens', 'updated', 'recent', 'last_emit', 'repeated', 'suppressed')
+
+    def __init__(self, burst, now):
+        self.tokens = burst
+        self.updated = now
+        self.recent = []
+        self.last_emit = now
+        self.repeated = 0
+        self.suppressed = 0
+
+
+class LogThrottle(logging.Filter):
+    """Per-key deduplication and rate limiting of log records"""
+
+    def __init__(self, rate=1, burst=5, summary_interval=600, clock=time.monotonic):
+        super().__init__()
+        self.rate = rate / 60.0
+        self.burst = burst
+        self.summary_interval = summary_interval
+        self.clock = clock
+        self.keys = {}
+
+    def filter(self, record):
+        key = getattr(record, 'log_key', None)
+        if not key or record.levelno >= logging.CRITICAL:
+            return True
+
+        now = self.clock()
+        state = self.keys.get(key)
+        if state is None:
+            state = self.keys[key] = _KeyState(self.burst, now)
+        state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+        state.updated = now
+
+        signature = _DIGITS.sub('#', record.getMessage())
+        seen = signature in state.recent
+        if seen and now - state.last_emit < self.summary_interval:
+            state.repeated += 1
+            return False
+        if not seen:
+            if state.tokens < 1:
+                state.suppressed += 1
+                return False
+            state.tokens -= 1
+            state.recent.append(signature)
+            del state.recent[:-RECENT_MESSAGES]
+
+        record.repeated, state.repeated = state.repeated, 0
+        record.suppressed, state.suppressed = state.suppressed, 0
+        state.last_emit = now
+        return True
+
+    def pending(self):
+        """Keys with dropped records not reported yet: {key: (repeated, suppressed)}"""
+        return {key: (s.repeated, s.suppressed) for key, s in self.keys.items() if s.repeated or s.suppressed}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for name in ('log_key', 'repeated', 'suppressed'):
+            value = getattr(record, name, None)
+            if value:
+                entry[name] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class TextFormatter(logging.Formatter):
+    """The classic console format plus the throttle's counters"""
+
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, 'repeated', 0):
+            text += f' (message repeated {record.repeated} times)'
+        if getattr(record, 'suppressed', 0):
+            text += f' ({record.suppressed} similar messages suppressed)'
+        return text
+
+
+class GzipRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that gzips client.log.1, .2, ... as client.log.1.gz"""
+
+    def __init__(self, filename, max_bytes, backup_count, encoding='utf-8'):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding=encoding)
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self._gzip
+
+    @staticmethod
+    def _gzip(source, dest):
+        with open(source, 'rb') as src, gzip.open(dest, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(source)
+
+
+_installed = []
+_ring = None
+
+
+def log_ring():
+    """The installed LogRing, or None with ring_size 0"""
+    return _ring
+
+
+def setup_logging(config=None, clock=time.monotonic):
+    """(Re)configure the root logger from the ``logging`` config section"""
+    config = config or {}
+    root = logging.getLogger()
+    for handler in _installed:
+        root.removeHandler(handler)
+        handler.close()
+    _installed.clear()
+
+    def throttle():
+        return LogThrottle(config.get('rate_per_minute', 1), config.get('burst', 5),
+                           config.get('summary_interval', 600), clock)
+
+    file_handler = GzipRotatingFileHandler(config.get('file', LOG_FILE),
+                                           config.get('max_bytes', 5 * 1024 * 1024),
+                                           config.get('backup_count', 3))
+    file_handler.setFormatter(JSONFormatter() if config.get('format', 'json') == 'json'
+                              else TextFormatter(TEXT_FORMAT))
+    file_handler.addFilter(throttle())
+    _installed.append(file_handler)
+
+    if config.get('console', True):
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(TextFormatter(TEXT_FORMAT))
+        console_handler.addFilter(throttle())
+        _installed.append(console_handler)
+
+    for handler in _installed:
+        root.addHandler(handler)
+
+    global _ring
+    ring_size = config.get('ring_size', 2000)
+    if _ring is not None and not ring_size:
+        root.removeHandler(_ring)
+        _ring = None
+    elif ring_size:
+        if _ring is None:
+            _ring = LogRing(ring_size)
+            root.addHandler(_ring)
+        else:
+            _ring.resize(ring_size)
+    root.setLevel(getattr(logging, str(config.get('level', 'INFO')).upper(), logging.INFO))
+    return file_handler
+
+
+def _report_pending():
+    # Runs before logging's own atexit shutdown (atexit is LIFO)
+    for handler in _installed:
+        for flt in handler.filters:
+            if isinstance(flt, LogThrottle):
+                for key, (repeated, suppressed) in flt.pending().items():
+                    # emit(), not handle(): the throttle would reset the counters
+                    handler.emit(logging.makeLogRecord({
+                        'name': __name__, 'levelno': logging.INFO, 'levelname': 'INFO',
+                        'msg': f'Unreported at exit for {key}', 'log_key': f'exit:{key}',
+                        'repeated': repeated, 'suppressed': suppressed,
+                    }))
+
+
+atexit.register(_report_pending)
+
+
+def shutdown_logging():
+    """Report what is pending, then remove and close the installed handlers"""
+    _report_pending()
+    root = logging.getLogger()
+    for handler in _installed:
+        root.removeHandler(handler)
+        handler.close()
+    _installed.clear()
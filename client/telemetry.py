@@ -0,0 +1,237 @@
+"""
+Seat resource telemetry: CPU, RAM, disk and network load.
+
+A backend reads raw OS counters. The Linux backend keeps the /proc files
+open and re-reads them with pread, so a sample is a handful of syscalls and
+some string splitting. TelemetryStreamer turns successive counter
+readings into integer rows and batches them. Each batch is sent as one
+delta-encoded ``telemetry`` message over the existing WebSocket. Sampling
+is fast while an admin dashboard is watching the seat (``telemetry_watch``
+message) and slow otherwise.
+"""
+
+import logging
+import os
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('cpu_pct10', 'mem_used_mb', 'mem_total_mb',
+          'disk_read_kbs', 'disk_write_kbs', 'net_rx_kbs', 'net_tx_kbs')
+
+
+class ProcBackend:
+    """Counters from Linux /proc, files held open between samples"""
+
+    name = 'proc'
+
+    def __init__(self, root='/proc', sys_block='/sys/block'):
+        self._stat = os.open(os.path.join(root, 'stat'), os.O_RDONLY)
+        self._meminfo = os.open(os.path.join(root, 'meminfo'), os.O_RDONLY)
+        self._diskstats = os.open(os.path.join(root, 'diskstats'), os.O_RDONLY)
+        self._netdev = os.open(os.path.join(root, 'net', 'dev'), os.O_RDONLY)
+        try:
+            self._disks = {d for d in os.listdir(sys_block) if not d.startswith(('loop', 'ram'))}
+        except OSError:
+            self._disks = None
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith('linux') and os.path.exists('/proc/stat')
+
+    def read(self):
+        """(cpu_busy, cpu_total, mem_used_kb, mem_total_kb, disk_rd, disk_wr, net_rx, net_tx)"""
+        cpu = os.pread(self._stat, 512, 0).split(b'\n', 1)[0].split()[1:9]
+        ticks = [int(v) for v in cpu]
+        total = sum(ticks)
+        busy = total - ticks[3] - ticks[4]
+
+        mem_total = mem_available = 0
+        for line in os.pread(self._meminfo, 4096, 0).split(b'\n', 3)[:3]:
+            if line.startswith(b'MemTotal:'):
+                mem_total = int(line.split()[1])
+            elif line.startswith(b'MemAvailable:'):
+                mem_available = int(line.split()[1])
+
+        disk_read = disk_write = 0
+        for line in os.pread(self._diskstats, 65536, 0).splitlines():
+            parts = line.split()
+            if len(parts) < 10:
+                continue
+            name = parts[2].decode()
+            if self._disks is not None and name not in self._disks:
+                continue
+            disk_read += int(parts[5]) * 512
+            disk_write += int(parts[9]) * 512
+
+        net_rx = net_tx = 0
+        for line in os.pread(self._netdev, 65536, 0).splitlines()[2:]:
+            iface, _, counters = line.partition(b':')
+            if iface.strip() == b'lo':
+                continue
+            parts = counters.split()
+            net_rx += int(parts[0])
+            net_tx += int(parts[8])
+
+        return (busy, total, mem_total - mem_available, mem_total,
+                disk_read, disk_write, net_rx, net_tx)
+
+    def close(self):
+        for fd in (self._stat, self._meminfo, self._diskstats, self._netdev):
+            os.close(fd)
+
+
+class PsutilBackend:
+    """Counters from psutil, a requirement on Windows"""
+
+    name = 'psutil'
+
+    def __init__(self):
+        import psutil
+        self._psutil = psutil
+
+    @staticmethod
+    def available():
+        try:
+            import psutil  # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def read(self):
+        psutil = self._psutil
+        cpu = psutil.cpu_times()
+        total = sum(cpu)
+        busy = total - cpu.idle - getattr(cpu, 'iowait', 0)
+        mem = psutil.virtual_memory()
+        disk = psutil.disk_io_counters()
+        net = psutil.net_io_counters()
+        return (int(busy * 100), int(total * 100),
+                (mem.total - mem.available) // 1024, mem.total // 1024,
+                disk.read_bytes if disk else 0, disk.write_bytes if disk else 0,
+                net.bytes_recv, net.bytes_sent)
+
+    def close(self):
+        pass
+
+
+def select_backend():
+    """Best available counter backend, or None if telemetry can't run here"""
+    for backend in (ProcBackend, PsutilBackend):
+        if backend.available():
+            try:
+                return backend()
+            except Exception as e:
+                logger.warning(f"Telemetry backend {backend.name} failed: {e}")
+    return None
+
+
+def encode_batch(rows, interval, started_at):
+    """First row absolute, every following row as a difference to the previous"""
+    deltas = [[b - a for a, b in zip(prev, row)] for prev, row in zip(rows, rows[1:])]
+    return {
+        'type': 'telemetry',
+        'fields': FIELDS,
+        'started_at': round(started_at, 3),
+        'interval': interval,
+        'base': list(rows[0]),
+        'deltas': deltas,
+    }
+
+
+def decode_batch(message):
+    """Rebuild the absolute rows of a telemetry message"""
+    rows = [list(message['base'])]
+    for delta in message['deltas']:
+        rows.append([a + d for a, d in zip(rows[-1], delta)])
+    return rows
+
+
+class TelemetryStreamer:
+    """Samples a backend and produces delta-encoded telemetry batches"""
+
+    def __init__(self, backend, fast_interval=1.0, slow_interval=30.0,
+                 fast_batch=5, slow_batch=10, clock=time.monotonic, wall_clock=time.time):
+        self.backend = backend
+        self.fast_interval = fast_interval
+        self.slow_interval = slow_interval
+        self.fast_batch = fast_batch
+        self.slow_batch = slow_batch
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.watching = False
+        self._prev = None
+        self._prev_time = None
+        self._rows = []
+        self._started_at = None
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the 'telemetry' config section, None if disabled or unsupported"""
+        if not config.get('enabled', True):
+            return None
+        backend = select_backend()
+        if backend is None:
+            logger.warning("Telemetry is off: no backend on this platform (psutil is needed on Windows)")
+            return None
+        return cls(backend,
+                   fast_interval=config.get('fast_interval', 1.0),
+                   slow_interval=config.get('slow_interval', 30.0),
+                   fast_batch=config.get('fast_batch', 5),
+                   slow_batch=config.get('slow_batch', 10))
+
+    @property
+    def interval(self):
+        return self.fast_interval if self.watching else self.slow_interval
+
+    @property
+    def batch_size(self):
+        return self.fast_batch if self.watching else self.slow_batch
+
+    def set_watching(self, watching, interval=None):
+        """Switch sampling rate, returns the pending batch (if any) to send now"""
+        pending = self.flush()
+        self.watching = watching
+        if watching and interval:
+            self.fast_interval = max(0.2, float(interval))
+        return pending
+
+    def sample(self):
+        """Take one sample, returns a batch message when one is complete"""
+        now = self.clock()
+        counters = self.backend.read()
+        prev, prev_time = self._prev, self._prev_time
+        self._prev, self._prev_time = counters, now
+        if prev is None or now <= prev_time:
+            return None
+
+        dt = now - prev_time
+        busy = counters[0] - prev[0]
+        total = counters[1] - prev[1]
+        row = (
+            int(busy * 1000 / total) if total > 0 else 0,
+            counters[2] // 1024,
+            counters[3] // 1024,
+            int((counters[4] - prev[4]) / dt / 1024),
+            int((counters[5] - prev[5]) / dt / 1024),
+            int((counters[6] - prev[6]) / dt / 1024),
+            int((counters[7] - prev[7]) / dt / 1024),
+        )
+        if not self._rows:
+            self._started_at = self.wall_clock()
+        self._rows.append(row)
+
+        if len(self._rows) >= self.batch_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        if not self._rows:
+            return None
+        batch = encode_batch(self._rows, self.interval, self._started_at)
+        self._rows = []
+        return batch
+
+    def close(self):
+        self.backend.close()
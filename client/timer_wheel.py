@@ -0,0 +1,328 @@
+"""
+One scheduler for the client's periodic and one-shot timers.
+
+The session countdown, reconnect back-off, heartbeat, telemetry, process
+scans and thumbnails each had a QTimer, and so each woke the loop on its
+own. TimerWheel keeps them all in a hierarchical timing wheel on the
+loop's monotonic clock (loop.time()). It keeps one loop.call_at handle
+pending, for the earliest tick that has a timer.
+
+- Time is cut into ticks of ``resolution`` seconds, 1/16 s by default,
+  a power of two so that whole seconds fall exactly on ticks. Level 0
+  has a slot for each of the next 64 ticks. Each level above has 64
+  slots, and each slot spans one whole turn of the level below. Four
+  levels reach about 12 days, which is also the furthest the loop's
+  call_at is ever set. When level 0 wraps, the next slot of
+  level 1 is cascaded down into it, and so on up. Starting and stopping
+  a timer are O(1).
+- Periodic timers start in phase with a grid of ``align`` seconds (or
+  their interval, if shorter) and keep that phase. The 1 s session tick,
+  the 15 s heartbeat and the 5 s process scan then fire on the same
+  whole-second ticks, one wakeup for all of them. A late firing does
+  not shift the next one, and periods missed during a stall are skipped
+  rather than fired in a burst.
+- Each timer has a ``slack``, how late it may fire: 0 for one-shot
+  timers, ``default_slack`` of the interval for periodic ones. It joins
+  a tick that already has a wakeup within that window. Failing that, it
+  goes on the tick in the window with the most trailing zero bits,
+  where other timers with slack meet it.
+- ``stats()`` counts loop wakeups, wakeups that found nothing to fire
+  (their timers were stopped), timers fired and firings that shared a
+  wakeup, and gives the wakeups per minute over the last full minute.
+
+Timers are reusable objects with QTimer-like start/stop/active. One is
+created up front and started and stopped as the connection comes and
+goes. ``call_later`` and ``sleep`` cover one-off delays: gap expiry,
+gossip rounds, retry waits.
+"""
+
+import asyncio
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+BITS = 6
+SLOTS = 1 << BITS
+MASK = SLOTS - 1
+LEVELS = 4
+SPAN = 1 << (BITS * LEVELS)
+
+
+class Timer:
+    """A one-shot or periodic timer on a TimerWheel"""
+
+    __slots__ = ('wheel', 'callback', 'args', 'slack', 'interval', 'due', 'tick', '_slot')
+
+    def __init__(self, wheel, callback, args=(), slack=None):
+        self.wheel = wheel
+        self.callback = callback
+        self.args = args
+        self.slack = slack
+        self.interval = None
+        self.due = None
+        self.tick = None
+        self._slot = None
+
+    @property
+    def active(self):
+        return self._slot is not None
+
+    def start(self, interval, single_shot=False):
+        """(Re)start: fire after interval seconds, then every interval unless single_shot"""
+        wheel = self.wheel
+        wheel._remove(self)
+        due = wheel.time() + interval
+        if single_shot:
+            self.interval = None
+        else:
+            self.interval = max(interval, wheel.resolution)
+            grid = min(self.interval, wheel.align)
+            due = math.ceil(due / grid) * grid
+        self.due = due
+        wheel._add(self)
+
+    def stop(self):
+        self.wheel._remove(self)
+
+    def remaining(self):
+        """Seconds until the tick the timer fires on, None if stopped"""
+        if not self.active:
+            return None
+        return max(0.0, self.tick * self.wheel.resolution - self.wheel.time())
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class TimerWheel:
+    """Hierarchical timing wheel driven by one call_at on the loop"""
+
+    def __init__(self, loop=None, resolution=1 / 16, align=1.0, default_slack=0.1):
+        self.loop = loop or asyncio.get_event_loop()
+        self.resolution = resolution
+        self.align = align
+        self.default_slack = default_slack
+        self.wakeups = 0
+        self.idle_wakeups = 0
+        self.fired = 0
+        self.coalesced = 0
+        self._levels = [[{} for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self._counts = [0] * LEVELS
+        self._tick = int(self.loop.time() / resolution)
+        self._handle = None
+        self._wake_tick = None
+        self._waking = False
+        self._minute_start = self.loop.time()
+        self._minute_wakeups = 0
+        self._last_minute = None
+
+    def __len__(self):
+        return sum(self._counts)
+
+    def time(self):
+        return self.loop.time()
+
+    def timer(self, callback, *args, slack=None):
+        """A stopped timer; start it with Timer.start"""
+        return Timer(self, callback, args, slack)
+
+    def call_later(self, delay, callback, *args, slack=0.0):
+        """Start a one-shot timer, like loop.call_later"""
+        timer = Timer(self, callback, args, slack)
+        timer.start(delay, single_shot=True)
+        return timer
+
+    async def sleep(self, delay, slack=0.0):
+        """Like asyncio.sleep, woken by a one-shot timer"""
+        future = self.loop.create_future()
+        timer = self.call_later(delay, _wake, future, slack=slack)
+        try:
+            await future
+        finally:
+            timer.stop()
+
+    def close(self):
+        """Stop every timer and the pending wakeup"""
+        for level in self._levels:
+            for slot in level:
+                for timer in slot:
+                    timer._slot = None
+                slot.clear()
+        self._counts = [0] * LEVELS
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._wake_tick = None
+
+    def _add(self, timer):
+        if not self._waking and not len(self):
+            # Idle since the last wakeup: nothing can be overdue
+            self._tick = max(self._tick, int(self.time() / self.resolution))
+        slack = timer.slack
+        if slack is None:
+            slack = timer.interval * self.default_slack if timer.interval else 0.0
+        first = max(math.ceil(timer.due / self.resolution), self._tick + 1)
+        last = max(int((timer.due + slack) / self.resolution), first)
+        tick = self._joinable(first, last)
+        if tick is None:
+            shift = ((first - 1) ^ last).bit_length() - 1
+            tick = last >> shift << shift
+        timer.tick = tick
+        self._place(timer)
+        if not self._waking and (self._wake_tick is None or tick < self._wake_tick):
+            self._schedule(tick)
+
+    def _joinable(self, first, last):
+        """The earliest tick in [first, last] that wakes the loop already"""
+        slots = self._levels[0]
+        for tick in range(first, min(last, self._tick + SLOTS - 1) + 1):
+            if slots[tick & MASK]:
+                return tick
+        if self._wake_tick is not None and first <= self._wake_tick <= last:
+            return self._wake_tick
+        return None
+
+    def _place(self, timer):
+        # Beyond the top level, a timer is placed again when its slot cascades
+        tick = min(timer.tick, self._tick + SPAN - 1)
+        delta = tick - self._tick
+        level = 0
+        while delta >= 1 << (BITS * (level + 1)):
+            level += 1
+        slot = self._levels[level][(tick >> (BITS * level)) & MASK]
+        slot[timer] = level
+        timer._slot = slot
+        self._counts[level] += 1
+
+    def _remove(self, timer):
+        slot = timer._slot
+        if slot is not None:
+            self._counts[slot.pop(timer)] -= 1
+            timer._slot = None
+
+    def _cascade(self, level, index):
+        slot = self._levels[level][index]
+        if not slot:
+            return
+        self._levels[level][index] = {}
+        self._counts[level] -= len(slot)
+        for timer in slot:
+            self._place(timer)
+
+    def _schedule(self, tick):
+        if self._handle is not None:
+            self._handle.cancel()
+        # A timer further out than the wheel reaches wakes the loop once per
+        # span and is placed again; loops can't take call_at that far ahead
+        tick = min(tick, self._tick + SPAN - 1)
+        self._wake_tick = tick
+        self._handle = self.loop.call_at(tick * self.resolution, self._wake)
+
+    def _next_tick(self):
+        """Tick of the earliest timer, None if there is none"""
+        best = None
+        if self._counts[0]:
+            slots = self._levels[0]
+            for tick in range(self._tick + 1, self._tick + SLOTS):
+                if slots[tick & MASK]:
+                    best = tick
+                    break
+        for level in range(1, LEVELS):
+            if not self._counts[level]:
+                continue
+            slots = self._levels[level]
+            position = self._tick >> (BITS * level)
+            for step in range(1, SLOTS + 1):
+                slot = slots[(position + step) & MASK]
+                if slot:
+                    earliest = min(timer.tick for timer in slot)
+                    if best is None or earliest < best:
+                        best = earliest
+                    break
+        return best
+
+    def _wake(self):
+        woke_for, self._handle, self._wake_tick = self._wake_tick, None, None
+        now = self.time()
+        self.wakeups += 1
+        self._minute_wakeups += 1
+        if now - self._minute_start >= 60:
+            self._last_minute = round(self._minute_wakeups * 60 / (now - self._minute_start), 1)
+            self._minute_start, self._minute_wakeups = now, 0
+        fired = self.fired
+        self._waking = True
+        try:
+            # The loop may run a call_at a little early; the tick is due anyway
+            self._advance(max(int(now / self.resolution), woke_for or 0))
+        finally:
+            self._waking = False
+        fired = self.fired - fired
+        if not fired:
+            self.idle_wakeups += 1
+        elif fired > 1:
+            self.coalesced += fired - 1
+        tick = self._next_tick()
+        if tick is not None:
+            self._schedule(tick)
+
+    def _advance(self, target):
+        levels0 = self._levels[0]
+        while self._tick < target:
+            lowest = next((level for level in range(LEVELS) if self._counts[level]), None)
+            if lowest is None:
+                self._tick = target
+                break
+            if lowest:
+                # Nothing on the levels below: skip to just before the next cascade
+                self._tick = min(target, self._tick | ((1 << (BITS * lowest)) - 1))
+                if self._tick == target:
+                    break
+            tick = self._tick = self._tick + 1
+            if not tick & MASK:
+                for level in range(1, LEVELS):
+                    index = (tick >> (BITS * level)) & MASK
+                    self._cascade(level, index)
+                    if index:
+                        break
+            slot = levels0[tick & MASK]
+            if slot:
+                levels0[tick & MASK] = {}
+                self._fire(slot)
+
+    def _fire(self, slot):
+        now = self.time()
+        while slot:
+            timer = next(iter(slot))
+            self._counts[slot.pop(timer)] -= 1
+            timer._slot = None
+            if timer.interval:
+                # Rescheduled first, so the callback can stop or restart it
+                timer.due += timer.interval
+                if timer.due <= now:
+                    timer.due += timer.interval * (math.floor((now - timer.due) / timer.interval) + 1)
+                self._add(timer)
+            self.fired += 1
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                logger.error(f"Timer callback {getattr(timer.callback, '__qualname__', timer.callback)} "
+                             f"failed: {e}")
+
+    def wakeups_per_minute(self):
+        """Wakeups per minute over the last full minute, or so far in the first"""
+        if self._last_minute is not None:
+            return self._last_minute
+        elapsed = self.time() - self._minute_start
+        return round(self._minute_wakeups * 60 / elapsed, 1) if elapsed > 1 else None
+
+    def stats(self):
+        return {'timers': len(self), 'wakeups': self.wakeups, 'idle_wakeups': self.idle_wakeups,
+                'fired': self.fired, 'coalesced': self.coalesced,
+                'wakeups_per_minute': self.wakeups_per_minute()}
+
+    def summary(self):
+        return (f"{self.wakeups} wakeups ({self.idle_wakeups} idle) for {self.fired} timers, "
+                f"{self.coalesced} coalesced, {self.wakeups_per_minute()} wakeups/min")
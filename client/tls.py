@@ -0,0 +1,111 @@
+"""
+Client TLS: certificate pinning and session resumption.
+
+With ``server.tls.enabled`` the client talks https:// and wss:// through
+one aiohttp connector built on a ResumingContext, so HTTP requests and
+the WebSocket share a TLS session cache.
+
+A full handshake costs the key exchange, certificate verification and,
+on TLS 1.2, an extra round trip. A resumed one presents a session ticket
+from an earlier connection to the same server instead. asyncio's TLS
+transport never asks for resumption, so ResumingContext does it in
+wrap_bio. It remembers the SSL objects it handed out per server name and
+passes the newest one's session when the next connection to that server
+is wrapped. TLS 1.3 tickets only arrive after the handshake, which is
+why the session is read then and not right after connecting.
+
+Pinning: ``pin_sha256`` lists SHA-256 fingerprints (hex) of the server
+certificates the client accepts. With pins and no ``cafile``, the pins
+replace CA and hostname verification, which suits a cafe server with a
+self-signed certificate. With a cafile, both have to pass. Pins are
+checked on every handshake. A resumed session carries the peer
+certificate of the original handshake, so it is checked too.
+"""
+
+import hashlib
+import logging
+import ssl
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class PinnedSSLObject(ssl.SSLObject):
+    """Checks the peer certificate against the context's pins after the handshake"""
+
+    def do_handshake(self):
+        super().do_handshake()
+        context = self.context
+        if isinstance(context, ResumingContext):
+            context.handshakes += 1
+            context.resumed += self.session_reused
+        pins = getattr(context, 'pins', None)
+        if not pins:
+            return
+        der = self.getpeercert(binary_form=True)
+        fingerprint = hashlib.sha256(der).hexdigest() if der else None
+        if fingerprint not in pins:
+            raise ssl.SSLCertVerificationError(
+                f"server certificate {fingerprint or '(none)'} doesn't match the pinned fingerprints")
+
+
+class ResumingContext(ssl.SSLContext):
+    """Client context that resumes TLS sessions per server name"""
+
+    sslobject_class = PinnedSSLObject
+
+    def __new__(cls, keep=4):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self, keep=4):
+        self.pins = frozenset()
+        self.handshakes = 0
+        self.resumed = 0
+        # server name -> the last few SSL objects, newest last
+        self._recent = {}
+        self._keep = keep
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if session is None and not server_side:
+            session = self._session_for(server_hostname)
+        sslobj = super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+        recent = self._recent.setdefault(server_hostname, deque(maxlen=self._keep))
+        recent.append(sslobj)
+        return sslobj
+
+    def _session_for(self, server_hostname):
+        for sslobj in reversed(self._recent.get(server_hostname, ())):
+            try:
+                session = sslobj.session
+            except (ValueError, ssl.SSLError):
+                continue
+            # TLS 1.3 tickets come after the handshake; a connection that
+            # hasn't received one yet has nothing to resume with
+            if session is not None and (session.has_ticket or session.id):
+                return session
+        return None
+
+
+def create_context(cafile=None, pins=(), minimum_version=ssl.TLSVersion.TLSv1_2):
+    """Client context: CA and/or pin verification, TLS 1.2 or later"""
+    context = ResumingContext()
+    context.minimum_version = minimum_version
+    context.pins = frozenset(pin.lower().replace(':', '') for pin in pins)
+    if cafile:
+        context.load_verify_locations(cafile)
+    elif context.pins:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        context.load_default_certs()
+    return context
+
+
+def from_config(tls_config):
+    """Context for the server.tls config section, or None for plain connections"""
+    if not tls_config.get('enabled'):
+        return None
+    context = create_context(tls_config.get('cafile') or None, tls_config.get('pin_sha256', []))
+    if not tls_config.get('cafile') and not tls_config.get('pin_sha256'):
+        logger.warning("TLS on without cafile or pins: the server certificate must chain to a system CA")
+    return context
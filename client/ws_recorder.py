@@ -0,0 +1,184 @@
+"""
+WebSocket traffic recorder and replayer.
+
+Recordings are gzip-compressed JSON lines. The first line is a header
+object naming the recording seat, then one frame per line:
+
+    {"computer_id": "<seat>", "started": "<iso time>"}
+    [elapsed_ms, "i" | "o", "<raw frame text>"]
+
+Recordings made before the header existed start with a frame.
+
+``elapsed_ms`` comes from the monotonic clock relative to the start of the
+recording, so wall-clock jumps on the seat don't distort the timeline.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+INBOUND = 'i'
+OUTBOUND = 'o'
+
+
+class WSRecorder:
+    """Appends inbound/outbound WS frames to a compressed recording"""
+
+    def __init__(self, path, computer_id=None, flush_every=50):
+        self.path = path
+        self.flush_every = flush_every
+        self.frames = 0
+        self._start = time.monotonic()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        header = {'computer_id': computer_id, 'started': datetime.now().isoformat(timespec='seconds')}
+        self._file.write(json.dumps(header, separators=(',', ':')))
+        self._file.write('\n')
+
+    @classmethod
+    def for_directory(cls, directory, computer_id):
+        """Open a new timestamped recording inside directory"""
+        os.makedirs(directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return cls(os.path.join(directory, f'ws-{computer_id}-{stamp}.ndjson.gz'), computer_id)
+
+    def record(self, direction, text, elapsed_ms=None):
+        if self._file is None:
+            return
+        if elapsed_ms is None:
+            elapsed_ms = round((time.monotonic() - self._start) * 1000, 3)
+        self._file.write(json.dumps([elapsed_ms, direction, text], separators=(',', ':')))
+        self._file.write('\n')
+        self.frames += 1
+        # Flush whole gzip blocks now and then so a crash still leaves a readable file
+        if self.frames % self.flush_every == 0:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            logger.info(f"WS recording saved: {self.path} ({self.frames} frames)")
+
+
+def read_header(path):
+    """The recording's header, or {} for a recording without one"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            entry = json.loads(f.readline() or 'null')
+        except (EOFError, json.JSONDecodeError):
+            return {}
+    return entry if isinstance(entry, dict) else {}
+
+
+def read_recording(path):
+    """Yield (elapsed_ms, direction, text) tuples from a recording"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    if isinstance(entry, dict):
+                        continue
+                    elapsed_ms, direction, text = entry
+                    yield elapsed_ms, direction, text
+        except (EOFError, json.JSONDecodeError):
+            # Truncated tail from a crashed seat - keep what we have
+            logger.warning(f"Recording {path} is truncated")
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class WSReplayer:
+    """Feeds the inbound frames of a recording into a client's message handler
+
+    speed=1.0 keeps the recorded pacing, larger values compress it and
+    speed=0 replays back-to-back as fast as the handler allows.
+    """
+
+    def __init__(self, client, path, speed=1.0):
+        self.client = client
+        self.path = path
+        self.speed = speed
+        self.latencies = {}
+        self.errors = 0
+
+    async def run(self):
+        # Handlers compare against the seat's own id, so replay as the recording seat
+        computer_id = read_header(self.path).get('computer_id')
+        if computer_id:
+            self.client.computer_id = computer_id
+
+        start = time.monotonic()
+        first_ms = None
+
+        for elapsed_ms, direction, text in read_recording(self.path):
+            if direction != INBOUND:
+                continue
+
+            if self.speed > 0:
+                if first_ms is None:
+                    first_ms = elapsed_ms
+                due = start + (elapsed_ms - first_ms) / 1000 / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            t0 = time.perf_counter()
+            try:
+                data = json.loads(text)
+                await self.client._process_ws_message(data)
+                msg_type = data.get('type', '?')
+            except Exception as e:
+                logger.error(f"Replay handler error: {e}")
+                self.errors += 1
+                msg_type = 'error'
+            self.latencies.setdefault(msg_type, []).append(time.perf_counter() - t0)
+
+        return self.report(time.monotonic() - start)
+
+    def report(self, wall_time):
+        all_latencies = [v for values in self.latencies.values() for v in values]
+        by_type = {}
+        for msg_type, values in sorted(self.latencies.items()):
+            by_type[msg_type] = {
+                'count': len(values),
+                'mean_us': round(sum(values) / len(values) * 1e6, 2),
+                'p95_us': round(_percentile(values, 95) * 1e6, 2),
+                'max_us': round(max(values) * 1e6, 2),
+            }
+
+        client = self.client
+        return {
+            'recording': os.path.basename(self.path),
+            'speed': self.speed,
+            'frames': len(all_latencies),
+            'errors': self.errors,
+            'wall_time_s': round(wall_time, 3),
+            'latency': {
+                'mean_us': round(sum(all_latencies) / max(len(all_latencies), 1) * 1e6, 2),
+                'p50_us': round(_percentile(all_latencies, 50) * 1e6, 2),
+                'p95_us': round(_percentile(all_latencies, 95) * 1e6, 2),
+                'p99_us': round(_percentile(all_latencies, 99) * 1e6, 2),
+                'max_us': round(max(all_latencies, default=0) * 1e6, 2),
+            },
+            'by_type': by_type,
+            'end_state': {
+                'computer_id': client.computer_id,
+                'session_active': client.session_active,
+                'session_id': client.session_id,
+                'remaining_time': client.remaining_time,
+                'session_deadline': client.session_deadline,
+            },
+        }
@@ -24,6 +24,13 @@ import threading
 import ctypes
 from qasync import asyncSlot
 
+# Message types are shared with the main client in ../client
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client'))
+from messages import (MessageDispatcher, MessageError, ForceLogout, TimeUpdate, SessionUpdate, ProcessPolicyUpdate,
+                      ClockSyncReply)
+from clock_sync import ClockSync
+from seat_identity import load_computer_id, derive_pc_id
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -209,9 +216,17 @@ class NetCafeClient:
         self.ws = None
         self.user_id = None
         self.session_id = None
+        self.policy = None
         self.computer_id = self._get_computer_id()
+        self.clock_sync = ClockSync()
         self._notified_5min = False
         self._notified_1min = False
+        self.dispatcher = MessageDispatcher({
+            SessionUpdate: self._on_session_update,
+            TimeUpdate: self._on_time_update,
+            ForceLogout: self._on_force_logout,
+            ClockSyncReply: self._on_clock_sync,
+        })
         
         self._init_tray()
         self._show_blank()
@@ -222,9 +237,9 @@ class NetCafeClient:
     
     def _get_computer_id(self):
         try:
-            mac = uuid.getnode()
-            return f"PC-{mac:012x}"
-        except:
+            # This client's seats are registered on the server as PC-<mac hex>
+            return load_computer_id(derive=derive_pc_id)
+        except Exception:
             return f"PC-{socket.gethostname()}"
     
     def _init_tray(self):
@@ -303,6 +318,10 @@ class NetCafeClient:
             
             asyncio.create_task(self._handle_ws_messages())
             
+            # Estimate the server clock offset before login returns a deadline
+            for _ in range(4):
+                await self.ws.send_json(self.clock_sync.make_request())
+            
             self.set_connection_status('Connected - Please login')
             
             # Show login dialog
@@ -321,44 +340,82 @@ class NetCafeClient:
             return False
         
         username, password = dialog.get_credentials()
+        credentials = {
+            'username': username,
+            'password': password,
+            'computer_id': self.computer_id
+        }
         
         try:
             config = self._get_server_config()
-            async with self.session.post(
-                f"http://{config['host']}:{config['port']}/api/login",  # ← Fixed endpoint
-                json={
-                    'username': username, 
-                    'password': password,
-                    'computer_id': self.computer_id  # ← Added computer_id
-                }
-            ) as response:
-                data = await response.json()
-                
-                if not data['success']:
-                    QMessageBox.warning(None, 'Error', data['message'])
-                    return False
-                
-                self.session_id = data.get('session_id')
-                self.remaining_time = data.get('minutes', 0) * 60
-                
-                if self.remaining_time > 0:
-                    await self.start_session(data.get('minutes', 0))
-                else:
-                    QMessageBox.warning(None, 'Error', 'No time available')
-                
-                return True
+            base_url = f"http://{config['host']}:{config['port']}"
+            
+            # Log in and start the session in one request: session id,
+            # deadline and policy come back together, nothing to undo if
+            # the second half of a two-step login fails
+            async with self.session.post(f"{base_url}/api/session/login_start", json=credentials) as response:
+                legacy = response.status == 404
+                data = None if legacy else await response.json()
+            
+            if legacy:
+                logger.info("Server has no login_start, logging in with two requests")
+                return await self._authenticate_two_step(base_url, credentials)
+            
+            if not data['success']:
+                QMessageBox.warning(None, 'Error', data['message'])
+                return False
+            
+            self.user_id = data.get('user_id')
+            self.session_id = data.get('session_id')
+            self._apply_policy(data.get('policy'))
+            
+            if data.get('minutes', 0) > 0:
+                self._activate_session(data['minutes'], data.get('expires_at'))
+            else:
+                QMessageBox.warning(None, 'Error', 'No time available')
+            
+            return True
                 
         except Exception as e:
             logger.error(f"Authentication error: {str(e)}")
             QMessageBox.critical(None, 'Error', 'Failed to connect to server')
             return False
     
+    async def _authenticate_two_step(self, base_url, credentials):
+        async with self.session.post(f"{base_url}/api/login", json=credentials) as response:
+            data = await response.json()
+        
+        if not data['success']:
+            QMessageBox.warning(None, 'Error', data['message'])
+            return False
+        
+        self.user_id = data.get('user_id')
+        self.session_id = data.get('session_id')
+        
+        if data.get('minutes', 0) > 0:
+            await self.start_session(data['minutes'])
+        else:
+            QMessageBox.warning(None, 'Error', 'No time available')
+        
+        return True
+    
+    def _apply_policy(self, policy):
+        if not policy:
+            return
+        try:
+            self.policy = ProcessPolicyUpdate.from_dict(policy)
+        except MessageError as e:
+            logger.warning(f"Ignoring invalid process policy: {e}")
+            return
+        logger.info(f"Process policy: {self.policy.mode} ({len(self.policy.names)} names)")
+    
     async def _handle_ws_messages(self):
         try:
             async for msg in self.ws:
                 if msg.type == aiohttp.WSMsgType.TEXT:
-                    data = json.loads(msg.data)
-                    await self._process_ws_message(data)
+                    message = self.dispatcher.decode(msg.data)
+                    if message is not None:
+                        await self.dispatcher.dispatch(message)
                 elif msg.type == aiohttp.WSMsgType.ERROR:
                     logger.error(f"WebSocket error: {self.ws.exception()}")
                     break
@@ -369,14 +426,26 @@ class NetCafeClient:
             self.set_connection_status('Disconnected')
     
     async def _process_ws_message(self, data):
-        msg_type = data.get('type')
-        
-        if msg_type == 'session_update':
-            sessions = data.get('sessions', [])
-            for session in sessions:
-                if session['computer_id'] == self.computer_id:
-                    self.start_session(session['duration_minutes'])
-                    break
+        await self.dispatcher.handle(data)
+    
+    async def _on_session_update(self, msg):
+        session = msg.for_computer(self.computer_id)
+        if session and not self.session_active and session.duration_minutes > 0:
+            # Already started on the server, only unlock here
+            self._activate_session(session.duration_minutes)
+    
+    async def _on_time_update(self, msg):
+        if msg.minutes > 0 and not self.session_active:
+            self._activate_session(msg.minutes)
+    
+    async def _on_force_logout(self, msg):
+        logger.info(f"Force logout: {msg.message}")
+        await self.end_session()
+    
+    async def _on_clock_sync(self, msg):
+        if self.clock_sync.add_sample(msg.t0, msg.t1, msg.t2):
+            logger.debug(f"Clock offset {self.clock_sync.offset:+.3f}s, "
+                         f"RTT {self.clock_sync.rtt * 1000:.1f}ms")
     
     def _show_blank(self):
         self.blank.show_blank()
@@ -406,20 +475,28 @@ class NetCafeClient:
                     QMessageBox.warning(None, 'Error', data['message'])
                     return
                 
-                self.session_active = True
-                self.remaining_time = duration * 60
-                self.session_timer.start(1000)
-                self._notified_5min = False
-                self._notified_1min = False
-                
-                self.blank.hide_blank()
-                self._show_overlay()
-                self._update_timer()
+                self.session_id = data.get('session_id') or self.session_id
+                self._activate_session(duration, data.get('expires_at'))
                 
         except Exception as e:
             logger.error(f"Start session error: {str(e)}")
             QMessageBox.critical(None, 'Error', 'Failed to start session')
     
+    def _activate_session(self, duration, expires_at=None):
+        self.session_active = True
+        if expires_at and self.clock_sync.rtt is not None:
+            # The deadline is on the server clock, the seat's clock may be off by minutes
+            self.remaining_time = self.clock_sync.remaining(expires_at)
+        else:
+            self.remaining_time = duration * 60
+        self.session_timer.start(1000)
+        self._notified_5min = False
+        self._notified_1min = False
+        
+        self.blank.hide_blank()
+        self._show_overlay()
+        self._update_timer()
+    
     @asyncSlot()
     async def end_session(self):
         if not self.session or not self.user_id:
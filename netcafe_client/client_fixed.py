@@ -24,6 +24,11 @@ import threading
 import ctypes
 from qasync import asyncSlot
 
+# Message types are shared with the main client in ../client
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'client'))
+from messages import MessageDispatcher, ForceLogout, TimeUpdate, SessionUpdate
+from seat_identity import load_computer_id
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -212,6 +217,11 @@ class NetCafeClient:
         self.computer_id = self._get_computer_id()
         self._notified_5min = False
         self._notified_1min = False
+        self.dispatcher = MessageDispatcher({
+            SessionUpdate: self._on_session_update,
+            TimeUpdate: self._on_time_update,
+            ForceLogout: self._on_force_logout,
+        })
         self.reconnect_timer = QTimer()
         self.reconnect_timer.timeout.connect(self._try_reconnect)
         
@@ -223,10 +233,11 @@ class NetCafeClient:
         self.overlay.end_btn.clicked.connect(self.end_session)
         
     def _get_computer_id(self):
-        # Unique computer identifier
-        hostname = socket.gethostname()
-        mac = uuid.getnode()
-        return f"{hostname}_{mac}"
+        # Unique computer identifier, derived once and persisted
+        try:
+            return load_computer_id()
+        except Exception:
+            return f"client_{uuid.uuid4().hex[:8]}"
         
     def _init_tray(self):
         self.tray = QSystemTrayIcon()
@@ -358,8 +369,9 @@ class NetCafeClient:
         try:
             async for msg in self.ws:
                 if msg.type == aiohttp.WSMsgType.TEXT:
-                    data = json.loads(msg.data)
-                    await self._process_ws_message(data)
+                    message = self.dispatcher.decode(msg.data)
+                    if message is not None:
+                        await self.dispatcher.dispatch(message)
                 elif msg.type == aiohttp.WSMsgType.ERROR:
                     logger.error(f"WebSocket error: {self.ws.exception()}")
                     break
@@ -371,15 +383,23 @@ class NetCafeClient:
             self._start_reconnect_timer()
     
     async def _process_ws_message(self, data):
-        msg_type = data.get('type')
-        
-        if msg_type == 'time_update':
-            # Update remaining time from server
-            minutes = data.get('minutes', 0)
-            if minutes > 0 and not self.session_active:
-                await self.start_session(minutes)
-            elif minutes <= 0 and self.session_active:
-                await self.end_session()
+        await self.dispatcher.handle(data)
+    
+    async def _on_time_update(self, msg):
+        # Update remaining time from server
+        if msg.minutes > 0 and not self.session_active:
+            await self.start_session(msg.minutes)
+        elif msg.minutes <= 0 and self.session_active:
+            await self.end_session()
+    
+    async def _on_session_update(self, msg):
+        session = msg.for_computer(self.computer_id)
+        if session and session.duration_minutes > 0 and not self.session_active:
+            await self.start_session(session.duration_minutes)
+    
+    async def _on_force_logout(self, msg):
+        logger.info(f"Force logout: {msg.message}")
+        await self.end_session()
     
     def _show_blank(self):
         self.blank.show_blank()